@@ -1,13 +1,21 @@
 # backend/app.py - FIXED BROADCAST ERROR
+# Selects threading/eventlet/gevent and monkey patches; must stay the first import
+from async_mode import ASYNC_MODE
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO
-from config import close_db
+from config import close_db, db_pool, state_backend, SOCKETIO_MESSAGE_QUEUE
+from models.user import get_user_cache_stats
+from models.group import membership_index
+from models.activity import activity_tracker
+from models.presence import presence
+from models.unread import rebuild_unread_counters
+from models.message import message_writer
 from routes.auth import auth_bp
 from routes.user import user_bp
 from routes.chat import chat_bp
 from routes.group import group_bp
-from sockets.chat_socket import socketio_init
+from sockets.chat_socket import socketio_init, get_db_executor_stats, sessions, admission
 import os
 
 app = Flask(__name__)
@@ -42,7 +50,8 @@ socketio = SocketIO(
     ping_interval=25,
     transports=['websocket', 'polling'],
     allow_upgrades=True,
-    async_mode='threading'
+    async_mode=ASYNC_MODE,
+    message_queue=SOCKETIO_MESSAGE_QUEUE  # shares rooms between workers (e.g. redis://)
 )
 
 # Initialize socket handlers
@@ -61,7 +70,29 @@ def home():
 
 @app.route('/health')
 def health():
-    return {"status": "healthy", "socket_connected": True}
+    return {
+        "status": "healthy",
+        "socket_connected": True,
+        "db_pool": db_pool.stats(),
+        "user_cache": get_user_cache_stats(),
+        "group_membership": membership_index.stats(),
+        "message_writer": message_writer.stats(),
+        "activity": activity_tracker.stats(),
+        "presence": presence.stats(),
+        "state_backend": state_backend.stats(),
+        "socket_executor": get_db_executor_stats(),
+        "sessions": sessions.stats(),
+        "connect_admission": admission.stats()
+    }
+
+@app.cli.command('rebuild-unread-counters')
+def rebuild_unread_counters_command():
+    """Recompute the unread_counters table from messages"""
+    rows = rebuild_unread_counters()
+    if rows is None:
+        print("❌ Failed to rebuild unread counters")
+    else:
+        print(f"✅ Rebuilt {rows} unread counters")
 
 # Enhanced debugging middleware
 @app.before_request
@@ -98,7 +129,7 @@ if __name__ == '__main__':
         app, 
         debug=True, 
         host='0.0.0.0', 
-        port=5000,
+        port=int(os.getenv('PORT', '5000')),
         use_reloader=False,  # Important: prevents socket.io issues
         log_output=True
     )
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""Socket.IO concurrency mode, selected with SOCKETIO_ASYNC_MODE
+
+threading (default) gives every connection an OS thread. eventlet and gevent
+run connections as green threads so one process can hold tens of thousands
+of idle sockets; for those the standard library is monkey patched here, so
+this module must be imported before anything else (app.py does it first).
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading').lower()
+GREEN = ASYNC_MODE in ('eventlet', 'gevent')
+
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+elif ASYNC_MODE != 'threading':
+    raise ValueError(f"Unsupported SOCKETIO_ASYNC_MODE: {ASYNC_MODE}")
+
+if GREEN:
+    # Every socket is a file descriptor; allow as many as the hard limit
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError) as e:
+        print(f"⚠️ Could not raise the open file limit: {e}")
+
+
+def run_blocking(func, *args, **kwargs):
+    """Run CPU-bound or C-extension work without stalling the other green threads
+
+    Green threads only switch on patched I/O, so e.g. a bcrypt hash would
+    freeze every connection of the process for its whole duration. In green
+    modes the call runs on a native worker thread; in threading mode it runs
+    inline.
+    """
+    if ASYNC_MODE == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(func, *args, **kwargs)
+    if ASYNC_MODE == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
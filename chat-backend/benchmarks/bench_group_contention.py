@@ -0,0 +1,133 @@
+# Single busy group: message INSERT throughput with the activity triggers vs.
+# in-memory activity tracking (ACTIVITY_TRACKING=memory)
+#
+# Every writer thread inserts messages into the same group. With triggers each
+# INSERT also updates that group's groups_table row and the sender's users row,
+# so all writers queue on the group row lock. In memory mode the triggers are
+# skipped and one bulk UPDATE per flush interval writes the timestamps.
+# Seeds a scratch database (never the app database); needs MySQL 8.
+#
+#   BENCH_THREADS=16 BENCH_SECONDS=10 python benchmarks/bench_group_contention.py
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DATABASE_CONFIG
+from models.activity import ActivityTracker
+
+BENCH_DB = os.getenv('BENCH_DB', 'chat_bench')
+THREADS = int(os.getenv('BENCH_THREADS', '16'))
+SECONDS = float(os.getenv('BENCH_SECONDS', '10'))
+FLUSH_INTERVAL = float(os.getenv('ACTIVITY_FLUSH_INTERVAL', '5'))
+
+SERVER_CONFIG = {key: value for key, value in DATABASE_CONFIG.items()
+                 if key not in ('database', 'init_command')}
+
+def seed():
+    connection = mysql.connector.connect(**SERVER_CONFIG)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {BENCH_DB}")
+    cursor.execute(f"CREATE DATABASE {BENCH_DB}")
+    cursor.execute(f"USE {BENCH_DB}")
+    cursor.execute("""
+        CREATE TABLE users (
+            id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(100),
+            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP)
+    """)
+    cursor.execute("""
+        CREATE TABLE groups_table (
+            id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(100),
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP)
+    """)
+    cursor.execute("""
+        CREATE TABLE messages (
+            id INT AUTO_INCREMENT PRIMARY KEY, sender_id INT NOT NULL, group_id INT NULL,
+            content TEXT NOT NULL, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (sender_id) REFERENCES users(id), FOREIGN KEY (group_id) REFERENCES groups_table(id),
+            INDEX idx_group_history (group_id, timestamp, id))
+    """)
+    # Same bodies as database_schema.sql
+    cursor.execute("""
+        CREATE TRIGGER update_group_timestamp AFTER INSERT ON messages FOR EACH ROW BEGIN
+            IF NEW.group_id IS NOT NULL AND @skip_activity_triggers IS NULL THEN
+                UPDATE groups_table SET updated_at = NOW() WHERE id = NEW.group_id;
+            END IF;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER update_user_activity AFTER INSERT ON messages FOR EACH ROW BEGIN
+            IF @skip_activity_triggers IS NULL THEN
+                UPDATE users SET last_active = NOW() WHERE id = NEW.sender_id;
+            END IF;
+        END
+    """)
+    cursor.executemany("INSERT INTO users (name) VALUES (%s)", [(f"User {n}",) for n in range(THREADS)])
+    cursor.execute("INSERT INTO groups_table (name) VALUES ('Busy group')")
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+def connect(memory_mode):
+    config = dict(SERVER_CONFIG, database=BENCH_DB)
+    if memory_mode:
+        config['init_command'] = "SET @skip_activity_triggers = 1"
+    return mysql.connector.connect(**config)
+
+def run(memory_mode):
+    # Same bookkeeping and bulk UPDATE as ActivityTracker, on bench connections
+    pending = {'users': {}, 'groups': {}}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + SECONDS
+    counts = [0] * THREADS
+
+    def writer(n):
+        connection = connect(memory_mode)
+        cursor = connection.cursor()
+        sender_id = n + 1
+        while time.monotonic() < stop_at:
+            connection.start_transaction()
+            cursor.execute("INSERT INTO messages (sender_id, group_id, content) VALUES (%s, 1, 'hi')",
+                           (sender_id,))
+            connection.commit()
+            if memory_mode:
+                with lock:
+                    pending['users'][sender_id] = pending['groups'][1] = datetime.now()
+            counts[n] += 1
+        cursor.close()
+        connection.close()
+
+    def flusher():
+        connection = connect(memory_mode)
+        cursor = connection.cursor()
+        while time.monotonic() < stop_at:
+            time.sleep(min(FLUSH_INTERVAL, max(0, stop_at - time.monotonic())))
+            with lock:
+                users, groups = pending['users'], pending['groups']
+                pending['users'], pending['groups'] = {}, {}
+            ActivityTracker._bulk_update(cursor, 'users', 'last_active', users)
+            ActivityTracker._bulk_update(cursor, 'groups_table', 'updated_at', groups)
+            connection.commit()
+        cursor.close()
+        connection.close()
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(THREADS)]
+    if memory_mode:
+        threads.append(threading.Thread(target=flusher))
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.monotonic() - started)
+
+if __name__ == '__main__':
+    print(f"{THREADS} writers, one group, {SECONDS:.0f}s per mode, scratch database {BENCH_DB}")
+    seed()
+    trigger_rate = run(memory_mode=False)
+    print(f"triggers:        {trigger_rate:,.0f} messages/s")
+    memory_rate = run(memory_mode=True)
+    print(f"memory tracking: {memory_rate:,.0f} messages/s ({memory_rate / trigger_rate:.1f}x)")
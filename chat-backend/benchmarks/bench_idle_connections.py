@@ -0,0 +1,172 @@
+# Soak test: idle Socket.IO connections held by one backend process
+#
+# Starts app.py with SOCKETIO_ASYNC_MODE=BENCH_ASYNC_MODE (eventlet by default), opens
+# BENCH_CONNECTIONS websocket connections from BENCH_CLIENT_PROCS client
+# processes (each connection authenticates as a different user), then keeps
+# them idle for BENCH_SECONDS while Engine.IO pings flow. Every
+# BENCH_SAMPLE_INTERVAL seconds it samples the server's RSS and the latency
+# of GET /health, which has to wait its turn behind every socket the
+# process is serving.
+#
+# Fails (exit 1) if not every connection was established, if RSS grows by
+# more than BENCH_MAX_DRIFT_MB while the connections sit idle, or if the
+# /health p99 exceeds BENCH_MAX_P99_MS.
+#
+# Seeds a scratch database (never the app database). Needs MySQL 8, Linux
+# (/proc), `pip install eventlet "python-socketio[asyncio_client]"`, and a
+# hard open-file limit above BENCH_CONNECTIONS for both sides (ulimit -Hn).
+#
+#   BENCH_CONNECTIONS=50000 BENCH_SECONDS=600 python benchmarks/bench_idle_connections.py
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+BENCH_DB = os.getenv('BENCH_DB', 'chat_soak')
+ASYNC_MODE = os.getenv('BENCH_ASYNC_MODE', 'eventlet')
+os.environ['BENCH_DB'] = os.environ['MYSQL_DB'] = BENCH_DB  # must be set before config is imported
+os.environ['SOCKETIO_ASYNC_MODE'] = 'threading'  # only the server runs green; the clients use asyncio
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+import mysql.connector
+from config import DATABASE_CONFIG
+from check_query_plans import load_schema
+
+CONNECTIONS = int(os.getenv('BENCH_CONNECTIONS', '50000'))
+CLIENT_PROCS = int(os.getenv('BENCH_CLIENT_PROCS', '16'))
+CONNECT_CONCURRENCY = int(os.getenv('BENCH_CONNECT_CONCURRENCY', '200'))  # per client process
+SECONDS = float(os.getenv('BENCH_SECONDS', '600'))
+SAMPLE_INTERVAL = float(os.getenv('BENCH_SAMPLE_INTERVAL', '10'))
+MAX_DRIFT_MB = float(os.getenv('BENCH_MAX_DRIFT_MB', '50'))
+MAX_P99_MS = float(os.getenv('BENCH_MAX_P99_MS', '1000'))
+PORT = int(os.getenv('BENCH_PORT', '5200'))
+
+def seed():
+    server_config = {key: value for key, value in DATABASE_CONFIG.items()
+                     if key not in ('database', 'init_command', 'use_pure')}
+    connection = mysql.connector.connect(**server_config)
+    cursor = connection.cursor()
+    load_schema(cursor)
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+def raise_file_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def health():
+    """(latency in ms, users with sockets) from GET /health"""
+    started = time.perf_counter()
+    with urllib.request.urlopen(f"http://127.0.0.1:{PORT}/health", timeout=30) as response:
+        body = response.read()
+    latency = (time.perf_counter() - started) * 1000
+    return latency, json.loads(body)['state_backend'].get('users_with_sockets')
+
+def start_server():
+    env = dict(os.environ, PORT=str(PORT), SOCKETIO_ASYNC_MODE=ASYNC_MODE, STATE_BACKEND_URL='local')
+    server = subprocess.Popen([sys.executable, 'app.py'], cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', PORT), timeout=1).close()
+            return server
+        except OSError:
+            if time.monotonic() > deadline:
+                server.terminate()
+                raise RuntimeError(f"server on port {PORT} did not start")
+            time.sleep(0.2)
+
+def client_process(user_ids, connected, stop):
+    """Hold one idle connection per user id until `stop` is set"""
+    import socketio
+    raise_file_limit()
+
+    async def main():
+        clients = []
+        limit = asyncio.Semaphore(CONNECT_CONCURRENCY)
+
+        async def open_one(user_id):
+            client = socketio.AsyncClient(reconnection=False)
+            async with limit:
+                try:
+                    await client.connect(f"http://127.0.0.1:{PORT}", auth={'token': str(user_id)},
+                                         transports=['websocket'], wait_timeout=30)
+                    clients.append(client)
+                except Exception:
+                    pass
+
+        await asyncio.gather(*(open_one(user_id) for user_id in user_ids))
+        connected.put(len(clients))
+        while not stop.is_set():
+            await asyncio.sleep(1)
+        await asyncio.gather(*(client.disconnect() for client in clients), return_exceptions=True)
+
+    asyncio.run(main())
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+if __name__ == '__main__':
+    raise_file_limit()
+    print(f"Seeding {BENCH_DB}...")
+    seed()
+    server = start_server()
+    try:
+        base_rss = rss_mb(server.pid)
+        print(f"Server ({ASYNC_MODE}) started, RSS {base_rss:.0f} MB; opening {CONNECTIONS:,} connections...")
+
+        connected, stop = multiprocessing.Queue(), multiprocessing.Event()
+        user_ids = list(range(1, CONNECTIONS + 1))
+        procs = [multiprocessing.Process(target=client_process, args=(user_ids[n::CLIENT_PROCS], connected, stop))
+                 for n in range(CLIENT_PROCS)]
+        ramp_started = time.monotonic()
+        for proc in procs:
+            proc.start()
+        total = sum(connected.get() for _ in procs)
+        ramp = time.monotonic() - ramp_started
+        held_rss = rss_mb(server.pid)
+        print(f"{total:,} connected in {ramp:.1f}s, RSS {held_rss:.0f} MB "
+              f"({(held_rss - base_rss) * 1024 / max(total, 1):.1f} KB per connection)")
+
+        rss_samples, latencies = [], []
+        soak_end = time.monotonic() + SECONDS
+        while time.monotonic() < soak_end:
+            time.sleep(SAMPLE_INTERVAL)
+            latency, sockets = health()
+            rss_samples.append(rss_mb(server.pid))
+            latencies.append(latency)
+            print(f"  t+{SECONDS - (soak_end - time.monotonic()):>5.0f}s  RSS {rss_samples[-1]:>7.0f} MB  "
+                  f"/health {latency:>7.1f} ms  sockets {sockets}")
+
+        stop.set()
+        for proc in procs:
+            proc.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    drift = rss_samples[-1] - rss_samples[0] if rss_samples else 0.0
+    p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+    print(f"\nconnections {total:,}/{CONNECTIONS:,}  RSS drift while idle {drift:+.1f} MB  "
+          f"/health p50 {p50:.1f} ms p99 {p99:.1f} ms")
+    failed = total < CONNECTIONS or drift > MAX_DRIFT_MB or p99 > MAX_P99_MS
+    print("FAIL" if failed else "PASS")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,56 @@
+# Read receipt fan-out benchmark: targeted user room vs. the old global broadcast
+#
+# Runs against an in-memory python-socketio server (no network, no MySQL) and
+# reports per-receipt cost and packets sent as the number of connections grows.
+#
+#   python benchmarks/bench_read_receipts.py
+import time
+import socketio
+
+DEVICES_PER_SENDER = 3
+RECEIPTS = 20
+
+def build_server(connections):
+    server = socketio.Server(async_mode='threading')
+    sent = {'packets': 0}
+
+    def count_send(eio_sid, packet):
+        sent['packets'] += 1
+
+    server.eio.send = count_send
+    server.manager.initialize()
+
+    user_sockets = {}
+    for n in range(connections):
+        user_id = n // DEVICES_PER_SENDER
+        sid = server.manager.connect(f"eio_{n}", '/')
+        server.manager.enter_room(sid, '/', f"user_{user_id}")
+        user_sockets.setdefault(user_id, []).append(sid)
+    return server, sent, user_sockets
+
+def old_strategy(server, payload, sender_id, chat_id, user_sockets):
+    server.emit('messages_read', payload, room=f"user_{sender_id}")
+    server.emit('messages_read', payload, room=chat_id)
+    for sid in user_sockets.get(sender_id, []):
+        server.emit('messages_read', payload, room=sid)
+    server.emit('messages_read', payload)
+
+def new_strategy(server, payload, sender_id, chat_id, user_sockets):
+    server.emit('messages_read', payload, room=f"user_{sender_id}")
+
+def measure(strategy, connections):
+    server, sent, user_sockets = build_server(connections)
+    payload = {'sender_id': 1, 'receiver_id': 2, 'reader_id': 2, 'chat_id': '1_2',
+               'count': 1, 'type': 'blue_tick', 'timestamp': time.time()}
+    started = time.perf_counter()
+    for _ in range(RECEIPTS):
+        strategy(server, payload, 1, '1_2', user_sockets)
+    elapsed = time.perf_counter() - started
+    return elapsed / RECEIPTS * 1e6, sent['packets'] / RECEIPTS
+
+if __name__ == '__main__':
+    print(f"{'connections':>12} {'old us/receipt':>15} {'old pkts':>9} {'new us/receipt':>15} {'new pkts':>9}")
+    for connections in (100, 1000, 5000, 20000):
+        old_us, old_packets = measure(old_strategy, connections)
+        new_us, new_packets = measure(new_strategy, connections)
+        print(f"{connections:>12} {old_us:>15.1f} {old_packets:>9.0f} {new_us:>15.1f} {new_packets:>9.0f}")
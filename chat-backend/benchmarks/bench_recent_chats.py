@@ -0,0 +1,144 @@
+# get_recent_chats benchmark: correlated-subquery version vs. unread_counters
+#
+# Seeds a scratch database (never the app database) with synthetic direct
+# messages, builds the unread_counters summary and times the old query
+# against models.message.get_recent_chats itself for a sample of users.
+# Needs a reachable MySQL 8 server.
+#
+#   BENCH_MESSAGES=10000000 BENCH_USERS=50000 python benchmarks/bench_recent_chats.py
+import os
+import random
+import statistics
+import sys
+import time
+
+BENCH_DB = os.getenv('BENCH_DB', 'chat_bench')
+os.environ['MYSQL_DB'] = BENCH_DB  # must be set before config is imported
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mysql.connector
+from config import DATABASE_CONFIG
+from models.message import get_recent_chats
+
+MESSAGES = int(os.getenv('BENCH_MESSAGES', '10000000'))
+USERS = int(os.getenv('BENCH_USERS', '50000'))
+CONTACTS_PER_USER = int(os.getenv('BENCH_CONTACTS', '40'))
+SAMPLE_USERS = int(os.getenv('BENCH_SAMPLE', '50'))
+BATCH = 5000
+
+OLD_QUERY = """
+    SELECT DISTINCT
+        CASE WHEN m.sender_id = %s THEN m.receiver_id ELSE m.sender_id END as other_user_id,
+        u.name as other_user_name,
+        u.username as other_user_username,
+        u.profile_picture as other_user_picture,
+        u.is_online as other_user_online,
+        MAX(m.timestamp) as last_message_time,
+        (SELECT content FROM messages WHERE
+            (sender_id = %s AND receiver_id = other_user_id) OR
+            (sender_id = other_user_id AND receiver_id = %s)
+            ORDER BY timestamp DESC LIMIT 1) as last_message,
+        (SELECT COUNT(*) FROM messages WHERE
+            sender_id = other_user_id AND receiver_id = %s AND is_read = FALSE
+        ) as unread_count
+    FROM messages m
+    JOIN users u ON (u.id = CASE WHEN m.sender_id = %s THEN m.receiver_id ELSE m.sender_id END)
+    WHERE (m.sender_id = %s OR m.receiver_id = %s) AND m.group_id IS NULL
+    GROUP BY other_user_id, u.name, u.username, u.profile_picture, u.is_online
+    ORDER BY last_message_time DESC
+    LIMIT %s
+"""
+
+def seed(cursor):
+    cursor.execute(f"DROP DATABASE IF EXISTS {BENCH_DB}")
+    cursor.execute(f"CREATE DATABASE {BENCH_DB}")
+    cursor.execute(f"USE {BENCH_DB}")
+    cursor.execute("""
+        CREATE TABLE users (
+            id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(100), username VARCHAR(50),
+            profile_picture TEXT NULL, is_online BOOLEAN DEFAULT FALSE)
+    """)
+    cursor.execute("""
+        CREATE TABLE messages (
+            id INT AUTO_INCREMENT PRIMARY KEY, sender_id INT NOT NULL, receiver_id INT NULL,
+            group_id INT NULL, content TEXT NOT NULL, is_read BOOLEAN DEFAULT FALSE,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_sender (sender_id), INDEX idx_receiver (receiver_id),
+            INDEX idx_group (group_id), INDEX idx_timestamp (timestamp))
+    """)
+    cursor.execute("""
+        CREATE TABLE unread_counters (
+            user_id INT NOT NULL, chat_key VARCHAR(64) NOT NULL,
+            unread_count INT NOT NULL DEFAULT 0, last_message_id INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, chat_key),
+            INDEX idx_user_activity (user_id, last_message_id, chat_key))
+    """)
+
+    rows = [(f"User {n}", f"user{n}") for n in range(1, USERS + 1)]
+    for start in range(0, len(rows), BATCH):
+        cursor.executemany("INSERT INTO users (name, username) VALUES (%s, %s)", rows[start:start + BATCH])
+
+    rng = random.Random(42)
+    contacts = {u: [rng.randint(1, USERS) for _ in range(CONTACTS_PER_USER)] for u in range(1, USERS + 1)}
+    started = time.time()
+    base = int(time.time()) - MESSAGES
+    for start in range(0, MESSAGES, BATCH):
+        batch = []
+        for n in range(start, min(start + BATCH, MESSAGES)):
+            sender = rng.randint(1, USERS)
+            receiver = rng.choice(contacts[sender])
+            batch.append((sender, receiver, f"message {n}", rng.random() < 0.9,
+                          time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(base + n))))
+        cursor.executemany("""
+            INSERT INTO messages (sender_id, receiver_id, content, is_read, timestamp)
+            VALUES (%s, %s, %s, %s, %s)
+        """, batch)
+        if start % (BATCH * 200) == 0:
+            print(f"  seeded {start:,} / {MESSAGES:,} messages ({time.time() - started:.0f}s)")
+
+    cursor.execute("""
+        INSERT INTO unread_counters (user_id, chat_key, unread_count, last_message_id)
+        SELECT receiver_id, CONCAT(LEAST(sender_id, receiver_id), '_', GREATEST(sender_id, receiver_id)),
+               SUM(is_read = FALSE), MAX(id)
+        FROM messages WHERE group_id IS NULL
+        GROUP BY receiver_id, LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id)
+    """)
+    cursor.execute("""
+        INSERT INTO unread_counters (user_id, chat_key, unread_count, last_message_id)
+        SELECT sender_id, CONCAT(LEAST(sender_id, receiver_id), '_', GREATEST(sender_id, receiver_id)),
+               0, MAX(id)
+        FROM messages WHERE group_id IS NULL
+        GROUP BY sender_id, LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id)
+        ON DUPLICATE KEY UPDATE last_message_id = GREATEST(last_message_id, VALUES(last_message_id))
+    """)
+
+def time_calls(call, user_ids):
+    timings = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        call(user_id)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), max(timings)
+
+def run_old_query(cursor, user_id, limit):
+    cursor.execute(OLD_QUERY, (user_id, user_id, user_id, user_id, user_id, user_id, user_id, limit))
+    return cursor.fetchall()
+
+if __name__ == '__main__':
+    config = {key: value for key, value in DATABASE_CONFIG.items() if key != 'database'}
+    connection = mysql.connector.connect(**config)
+    cursor = connection.cursor()
+    print(f"Seeding {MESSAGES:,} messages across {USERS:,} users into {BENCH_DB}...")
+    seed(cursor)
+
+    limit = 20
+    sample = random.Random(7).sample(range(1, USERS + 1), SAMPLE_USERS)
+    # The model swallows query errors and returns [], which would time as fast
+    if not any(get_recent_chats(u, limit) for u in sample):
+        sys.exit("get_recent_chats returned no chats for the sample; check the model query")
+    new_median, new_max = time_calls(lambda u: get_recent_chats(u, limit), sample)
+    old_median, old_max = time_calls(lambda u: run_old_query(cursor, u, limit), sample)
+    print(f"old get_recent_chats: median {old_median:.1f} ms, max {old_max:.1f} ms")
+    print(f"new get_recent_chats: median {new_median:.1f} ms, max {new_max:.1f} ms")
+    cursor.close()
+    connection.close()
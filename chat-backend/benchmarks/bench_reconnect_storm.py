@@ -0,0 +1,199 @@
+# Reconnect storm: time-to-recover after a server restart, with and without
+# connect admission control (CONNECT_ADMISSION)
+#
+# Connects BENCH_CLIENTS socket clients (each from one of BENCH_IPS fake
+# addresses via X-Forwarded-For), restarts the server and measures how long
+# it takes until 50% / 99% / 100% of the clients are connected again. Clients
+# behave like the frontend: randomized exponential backoff (1s doubling to
+# 30s, +-50%) and, when a connect is refused, the server's retry_after hint.
+# While the clients come back, GET /health is polled to measure how
+# responsive the server stays.
+#
+# Seeds a scratch database (never the app database). Needs MySQL 8 and
+# `pip install "python-socketio[asyncio_client]"`.
+#
+#   BENCH_CLIENTS=5000 BENCH_MODES=off,on python benchmarks/bench_reconnect_storm.py
+import asyncio
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+BENCH_DB = os.getenv('BENCH_DB', 'chat_storm')
+ASYNC_MODE = os.getenv('BENCH_ASYNC_MODE', 'threading')
+os.environ['BENCH_DB'] = os.environ['MYSQL_DB'] = BENCH_DB  # must be set before config is imported
+os.environ['SOCKETIO_ASYNC_MODE'] = 'threading'  # only the server may run green; the clients use asyncio
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+import mysql.connector
+from config import DATABASE_CONFIG
+from check_query_plans import load_schema
+
+CLIENTS = int(os.getenv('BENCH_CLIENTS', '5000'))
+CLIENT_PROCS = int(os.getenv('BENCH_CLIENT_PROCS', '8'))
+IPS = int(os.getenv('BENCH_IPS', '500'))
+MODES = os.getenv('BENCH_MODES', 'off,on').split(',')
+TIMEOUT = float(os.getenv('BENCH_TIMEOUT', '180'))
+PORT = int(os.getenv('BENCH_PORT', '5300'))
+URL = f"http://127.0.0.1:{PORT}"
+
+def seed():
+    server_config = {key: value for key, value in DATABASE_CONFIG.items()
+                     if key not in ('database', 'init_command', 'use_pure')}
+    connection = mysql.connector.connect(**server_config)
+    cursor = connection.cursor()
+    load_schema(cursor)
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+def start_server(mode):
+    env = dict(os.environ, PORT=str(PORT), SOCKETIO_ASYNC_MODE=ASYNC_MODE, STATE_BACKEND_URL='local',
+               CONNECT_ADMISSION='true' if mode == 'on' else 'false', TRUST_FORWARDED_FOR='true')
+    server = subprocess.Popen([sys.executable, 'app.py'], cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', PORT), timeout=1).close()
+            return server
+        except OSError:
+            if time.monotonic() > deadline:
+                server.terminate()
+                raise RuntimeError(f"server on port {PORT} did not start")
+            time.sleep(0.1)
+
+def health_ms():
+    started = time.perf_counter()
+    try:
+        urllib.request.urlopen(f"{URL}/health", timeout=10).read()
+    except Exception:
+        return 10000.0
+    return (time.perf_counter() - started) * 1000
+
+def client_process(user_ids, ready, connected, stop, results):
+    """Keep one client per user id connected, reconnecting like the frontend does"""
+    import socketio
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    async def main():
+        hints = {}       # {user_id: retry_after from the last refused connect}
+        stats = {}       # {user_id: [reconnected_at, attempts, refused]}
+
+        async def keep_connected(user_id, client, initial):
+            attempt = 0
+            while not stop.is_set():
+                if attempt or not initial:
+                    hint = hints.pop(user_id, None)
+                    delay = hint if hint else min(30, 2 ** attempt) * random.uniform(0.5, 1.5)
+                    await asyncio.sleep(delay)
+                attempt += 1
+                ip = user_id % IPS
+                try:
+                    await client.connect(URL, auth={'token': str(user_id)}, transports=['websocket'],
+                                         headers={'X-Forwarded-For': f"10.0.{ip // 256}.{ip % 256}"},
+                                         wait_timeout=10)
+                except Exception:
+                    continue
+                with connected.get_lock():
+                    connected.value += 1
+                if not initial:
+                    stats[user_id] = [time.time(), attempt, stats.get(user_id, [0, 0, 0])[2]]
+                return
+
+        def make_client(user_id):
+            client = socketio.AsyncClient(reconnection=False)
+
+            @client.on('connect_error')
+            async def on_connect_error(data=None):
+                data = data if isinstance(data, dict) else {}
+                retry_after = data.get('retry_after') or (data.get('data') or {}).get('retry_after')
+                if retry_after:
+                    hints[user_id] = retry_after
+                    stats.setdefault(user_id, [0, 0, 0])[2] += 1
+
+            @client.on('disconnect')
+            async def on_disconnect():
+                if not stop.is_set():
+                    with connected.get_lock():
+                        connected.value -= 1
+                    asyncio.ensure_future(keep_connected(user_id, client, False))
+            return client
+
+        clients = [make_client(user_id) for user_id in user_ids]
+        await asyncio.gather(*(keep_connected(user_id, client, True) for user_id, client in zip(user_ids, clients)))
+        ready.put(len(clients))
+        while not stop.is_set():
+            await asyncio.sleep(0.5)
+        results.put([entry for entry in stats.values() if entry[0]])
+        await asyncio.gather(*(client.disconnect() for client in clients), return_exceptions=True)
+
+    asyncio.run(main())
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+def run(mode):
+    server = start_server(mode)
+    ready, results = multiprocessing.Queue(), multiprocessing.Queue()
+    connected, stop = multiprocessing.Value('i', 0), multiprocessing.Event()
+    user_ids = list(range(1, CLIENTS + 1))
+    procs = [multiprocessing.Process(target=client_process,
+                                     args=(user_ids[n::CLIENT_PROCS], ready, connected, stop, results))
+             for n in range(CLIENT_PROCS)]
+    try:
+        for proc in procs:
+            proc.start()
+        for _ in procs:
+            ready.get()
+
+        # The storm: every client loses its connection at once
+        server.terminate()
+        server.wait()
+        server = start_server(mode)
+        restarted_at = time.time()
+
+        latencies = []
+        while connected.value < CLIENTS and time.time() - restarted_at < TIMEOUT:
+            latencies.append(health_ms())
+            time.sleep(0.25)
+
+        stop.set()
+        entries = [entry for _ in procs for entry in results.get()]
+        for proc in procs:
+            proc.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    recover = [reconnected_at - restarted_at for reconnected_at, _, _ in entries]
+    return {
+        'reconnected': len(entries),
+        't50': percentile(recover, 0.5),
+        't99': percentile(recover, 0.99),
+        't100': max(recover) if len(entries) == CLIENTS else float('inf'),
+        'attempts': sum(attempts for _, attempts, _ in entries) / max(len(entries), 1),
+        'refused': sum(refused for _, _, refused in entries),
+        'health_p99': percentile(latencies, 0.99),
+    }
+
+if __name__ == '__main__':
+    print(f"Seeding {BENCH_DB}...")
+    seed()
+    print(f"{CLIENTS:,} clients, server in {ASYNC_MODE} mode\n")
+    print(f"{'admission':>9} {'back':>7} {'t50 s':>7} {'t99 s':>7} {'t100 s':>7} "
+          f"{'tries/client':>12} {'refused':>8} {'/health p99 ms':>15}")
+    for mode in MODES:
+        result = run(mode)
+        print(f"{mode:>9} {result['reconnected']:>7} {result['t50']:>7.1f} {result['t99']:>7.1f} "
+              f"{result['t100']:>7.1f} {result['attempts']:>12.2f} {result['refused']:>8} "
+              f"{result['health_p99']:>15.1f}")
@@ -0,0 +1,174 @@
+# Group fan-out throughput with 1, 2, 4... backend workers sharing Redis
+#
+# Starts N copies of app.py (each on its own port, all with
+# SOCKETIO_MESSAGE_QUEUE and STATE_BACKEND_URL pointing at the same Redis),
+# connects BENCH_CLIENTS socket clients spread round-robin over the workers
+# (what a sticky load balancer does) and makes them all members of one group.
+# BENCH_SENDERS of them send group messages for BENCH_SECONDS, each waiting
+# for its message_delivered ack before the next send; every other client
+# counts the new_message_notification events it receives.
+#
+# Reported per worker count: messages sent/s, notifications delivered/s,
+# delivery ratio (every member but the sender should get every message
+# exactly once) and scaling efficiency against N x the 1-worker rate.
+# Client processes must not be the bottleneck: raise BENCH_CLIENT_PROCS
+# until the 1-worker numbers stop improving.
+#
+# Seeds a scratch database (never the app database). Needs MySQL 8, Redis,
+# and `pip install redis "python-socketio[client]"`.
+#
+#   REDIS_URL=redis://localhost:6379/0 BENCH_WORKERS=1,2,4 python benchmarks/bench_scale_out.py
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DB = os.getenv('BENCH_DB', 'chat_scale')
+os.environ['BENCH_DB'] = os.environ['MYSQL_DB'] = BENCH_DB  # must be set before config is imported
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+import mysql.connector
+from config import DATABASE_CONFIG
+from check_query_plans import load_schema
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+WORKER_COUNTS = [int(n) for n in os.getenv('BENCH_WORKERS', '1,2,4').split(',')]
+CLIENTS = int(os.getenv('BENCH_CLIENTS', '400'))
+CLIENT_PROCS = int(os.getenv('BENCH_CLIENT_PROCS', '8'))
+SENDERS = int(os.getenv('BENCH_SENDERS', '8'))
+SECONDS = float(os.getenv('BENCH_SECONDS', '10'))
+DRAIN = float(os.getenv('BENCH_DRAIN', '3'))
+BASE_PORT = int(os.getenv('BENCH_BASE_PORT', '5100'))
+GROUP_ID = 1
+
+def seed():
+    server_config = {key: value for key, value in DATABASE_CONFIG.items()
+                     if key not in ('database', 'init_command')}
+    connection = mysql.connector.connect(**server_config)
+    cursor = connection.cursor()
+    load_schema(cursor)
+    cursor.executemany("INSERT INTO users (name, username, email, password) VALUES (%s, %s, %s, %s)",
+                       [(f"User {n}", f"user{n}", f"user{n}@example.com", 'x') for n in range(1, CLIENTS + 1)])
+    cursor.execute("INSERT INTO groups_table (id, name, created_by) VALUES (%s, 'Fan-out group', 1)", (GROUP_ID,))
+    cursor.executemany("INSERT INTO group_members (group_id, user_id, role) VALUES (%s, %s, 'member')",
+                       [(GROUP_ID, user_id) for user_id in range(1, CLIENTS + 1)])
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+def start_workers(count, run):
+    workers = []
+    for n in range(count):
+        env = dict(os.environ,
+                   PORT=str(BASE_PORT + n),
+                   SOCKETIO_MESSAGE_QUEUE=REDIS_URL,
+                   STATE_BACKEND_URL=REDIS_URL,
+                   STATE_BACKEND_PREFIX=f"bench{run}",
+                   MESSAGE_WRITE_BEHIND='true',
+                   MESSAGE_JOURNAL_DIR=tempfile.mkdtemp(prefix=f"journal-{n}-"))
+        workers.append(subprocess.Popen([sys.executable, 'app.py'], cwd=BACKEND_DIR, env=env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    for n in range(count):
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', BASE_PORT + n), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"worker on port {BASE_PORT + n} did not start")
+                time.sleep(0.2)
+    return workers
+
+def run_clients(user_ids, ports, sender_ids, barrier, results):
+    """One client process: connect, wait for everyone, send/receive, report counts"""
+    import socketio
+
+    clients = []
+    seen = {}  # {user_id: [message ids]}
+    for user_id in user_ids:
+        client = socketio.Client(reconnection=False)
+        received = seen.setdefault(user_id, [])
+        client.on('new_message_notification', lambda data, received=received: received.append(data['message_id']))
+        client.connect(f"http://127.0.0.1:{ports[user_id % len(ports)]}",
+                       auth={'token': str(user_id)}, transports=['websocket'])
+        clients.append((user_id, client))
+
+    sent = {}
+    def send_loop(user_id, client, deadline):
+        acked = threading.Event()
+        client.on('message_delivered', lambda data: acked.set())
+        sent[user_id] = 0
+        while time.monotonic() < deadline:
+            acked.clear()
+            client.emit('send_message', {'chat_id': f"group_{GROUP_ID}", 'group_id': GROUP_ID,
+                                         'sender_id': user_id, 'content': 'fan-out'})
+            if acked.wait(5):
+                sent[user_id] += 1
+
+    barrier.wait()
+    deadline = time.monotonic() + SECONDS
+    senders = [threading.Thread(target=send_loop, args=(user_id, client, deadline))
+               for user_id, client in clients if user_id in sender_ids]
+    for thread in senders:
+        thread.start()
+    for thread in senders:
+        thread.join()
+    time.sleep(DRAIN)
+
+    for _, client in clients:
+        client.disconnect()
+    results.put({
+        'sent': sum(sent.values()),
+        'delivered': sum(len(set(received)) for received in seen.values()),
+        'duplicates': sum(len(received) - len(set(received)) for received in seen.values()),
+    })
+
+def run(worker_count, run_number):
+    workers = start_workers(worker_count, run_number)
+    try:
+        ports = [BASE_PORT + n for n in range(worker_count)]
+        user_ids = list(range(1, CLIENTS + 1))
+        sender_ids = set(user_ids[::max(1, CLIENTS // SENDERS)][:SENDERS])
+        barrier = multiprocessing.Barrier(CLIENT_PROCS + 1)
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=run_clients,
+                                         args=(user_ids[n::CLIENT_PROCS], ports, sender_ids, barrier, results))
+                 for n in range(CLIENT_PROCS)]
+        for proc in procs:
+            proc.start()
+        barrier.wait()
+        totals = {'sent': 0, 'delivered': 0, 'duplicates': 0}
+        for _ in procs:
+            for key, value in results.get().items():
+                totals[key] += value
+        for proc in procs:
+            proc.join()
+        return totals
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+
+if __name__ == '__main__':
+    print(f"Seeding {BENCH_DB}: {CLIENTS} members in one group...")
+    seed()
+    baseline = None
+    print(f"{'workers':>7} {'sent/s':>9} {'delivered/s':>12} {'ratio':>7} {'dupes':>6} {'efficiency':>10}")
+    for run_number, worker_count in enumerate(WORKER_COUNTS):
+        totals = run(worker_count, run_number)
+        delivered_rate = totals['delivered'] / SECONDS
+        expected = totals['sent'] * (CLIENTS - 1)
+        ratio = totals['delivered'] / expected if expected else 0.0
+        if baseline is None:
+            baseline = delivered_rate / worker_count
+        efficiency = delivered_rate / (baseline * worker_count) if baseline else 0.0
+        print(f"{worker_count:>7} {totals['sent'] / SECONDS:>9.1f} {delivered_rate:>12.1f} "
+              f"{ratio:>7.3f} {totals['duplicates']:>6} {efficiency:>9.0%}")
@@ -0,0 +1,213 @@
+# Query-plan regression check for the hot model queries
+#
+# Builds a scratch database (never the app database) from database_schema.sql,
+# seeds it with synthetic users, groups and messages, then calls the hot model
+# functions through a connection wrapper that runs EXPLAIN on every statement
+# they issue. Exits non-zero if any statement reads a base table with a full
+# table/index scan, or sorts one with a filesort where the query should be
+# served in index order. Needs a reachable MySQL 8 server.
+#
+#   python benchmarks/check_query_plans.py
+#
+# Cold paths (rebuild_* repair commands, group admin mutations, profile edits)
+# are not checked.
+import os
+import random
+import re
+import sys
+import time
+
+BENCH_DB = os.getenv('BENCH_DB', 'chat_plans')
+os.environ['MYSQL_DB'] = BENCH_DB  # must be set before config is imported
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mysql.connector
+import config
+from config import DATABASE_CONFIG
+from models.message import (create_message, get_message_page, mark_messages_as_read,
+                            mark_group_messages_as_read, get_recent_chats, search_messages)
+from models.unread import get_chat_page, get_unread_counters, rebuild_unread_counters, direct_chat_key
+from models.user import get_user_by_id, get_users_by_ids, user_cache
+from models.group import get_user_groups, get_user_groups_by_ids, get_group_members
+
+USERS = int(os.getenv('BENCH_USERS', '5000'))
+GROUPS = int(os.getenv('BENCH_GROUPS', '200'))
+MEMBERS_PER_GROUP = int(os.getenv('BENCH_MEMBERS', '30'))
+DIRECT_MESSAGES = int(os.getenv('BENCH_DIRECT_MESSAGES', '100000'))
+GROUP_MESSAGES = int(os.getenv('BENCH_GROUP_MESSAGES', '50000'))
+BATCH = 5000
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'database_schema.sql')
+
+class PlanRecorder:
+    """Connection wrapper that EXPLAINs every statement before running it"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.statements = []  # [(query, plan rows)]
+
+    def cursor(self, *args, **kwargs):
+        return ExplainingCursor(self, self.connection.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+class ExplainingCursor:
+    def __init__(self, recorder, cursor):
+        self._recorder = recorder
+        self._cursor = cursor
+
+    def execute(self, query, params=None):
+        verb = query.lstrip().lstrip('(').split(None, 1)[0].upper()
+        if verb in ('SELECT', 'UPDATE', 'DELETE', 'INSERT'):
+            explain = self._recorder.connection.cursor(dictionary=True)
+            explain.execute("EXPLAIN " + query, params)
+            self._recorder.statements.append((query, explain.fetchall()))
+            explain.close()
+        return self._cursor.execute(query, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+def load_schema(cursor):
+    """Create the tables of database_schema.sql (no sample data or triggers) in BENCH_DB"""
+    with open(SCHEMA_FILE) as schema:
+        ddl = schema.read().split('-- Sample data')[0]
+    ddl = '\n'.join(line for line in ddl.splitlines() if not line.strip().startswith('--'))
+    ddl = ddl.replace('chat_app', BENCH_DB)
+    for statement in ddl.split(';'):
+        if statement.strip():
+            cursor.execute(statement)
+
+def seed(cursor):
+    rng = random.Random(42)
+    rows = [(f"User {n}", f"user{n}", f"user{n}@example.com", 'x') for n in range(1, USERS + 1)]
+    for start in range(0, len(rows), BATCH):
+        cursor.executemany("INSERT INTO users (name, username, email, password) VALUES (%s, %s, %s, %s)",
+                           rows[start:start + BATCH])
+
+    cursor.executemany("INSERT INTO groups_table (name, created_by) VALUES (%s, %s)",
+                       [(f"Group {n}", rng.randint(1, USERS)) for n in range(1, GROUPS + 1)])
+    members = {}
+    for group_id in range(1, GROUPS + 1):
+        members[group_id] = rng.sample(range(1, USERS + 1), MEMBERS_PER_GROUP)
+        cursor.executemany("INSERT INTO group_members (group_id, user_id, role) VALUES (%s, %s, %s)",
+                           [(group_id, user_id, 'admin' if n == 0 else 'member')
+                            for n, user_id in enumerate(members[group_id])])
+
+    base = int(time.time()) - DIRECT_MESSAGES - GROUP_MESSAGES
+    stamp = lambda n: time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(base + n))
+    contacts = {u: rng.sample(range(1, USERS + 1), 20) for u in range(1, USERS + 1)}
+    for start in range(0, DIRECT_MESSAGES, BATCH):
+        batch = []
+        for n in range(start, min(start + BATCH, DIRECT_MESSAGES)):
+            sender = rng.randint(1, USERS)
+            receiver = rng.choice(contacts[sender])
+            batch.append((sender, receiver, direct_chat_key(sender, receiver), f"direct message {n}",
+                          rng.random() < 0.9, stamp(n)))
+        cursor.executemany("""
+            INSERT INTO messages (sender_id, receiver_id, conversation_key, content, is_read, timestamp)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, batch)
+    for start in range(0, GROUP_MESSAGES, BATCH):
+        batch = []
+        for n in range(start, min(start + BATCH, GROUP_MESSAGES)):
+            group_id = rng.randint(1, GROUPS)
+            batch.append((rng.choice(members[group_id]), group_id, f"group message {n}",
+                          stamp(DIRECT_MESSAGES + n)))
+        cursor.executemany("""
+            INSERT INTO messages (sender_id, group_id, content, timestamp)
+            VALUES (%s, %s, %s, %s)
+        """, batch)
+    return contacts, members
+
+def plan_problems(plan, allow_filesort):
+    problems = []
+    for row in plan:
+        table = row.get('table') or ''
+        if table.startswith('<'):
+            # Derived tables and UNION results are already bounded by LIMIT
+            continue
+        extra = row.get('Extra') or ''
+        if row.get('type') in ('ALL', 'index'):
+            problems.append(f"full {'table' if row['type'] == 'ALL' else 'index'} scan on {table}")
+        if 'Using filesort' in extra and not allow_filesort:
+            problems.append(f"filesort on {table}")
+    return problems
+
+if __name__ == '__main__':
+    server_config = {key: value for key, value in DATABASE_CONFIG.items() if key != 'database'}
+    connection = mysql.connector.connect(**server_config)
+    cursor = connection.cursor()
+    print(f"Building {BENCH_DB}: {USERS:,} users, {GROUPS:,} groups, "
+          f"{DIRECT_MESSAGES + GROUP_MESSAGES:,} messages...")
+    load_schema(cursor)
+    contacts, members = seed(cursor)
+    cursor.close()
+    connection.close()
+
+    rebuild_unread_counters()
+    db = config.get_db()
+    analyze = db.cursor()
+    for table in ('users', 'groups_table', 'group_members', 'messages', 'unread_counters'):
+        analyze.execute(f"ANALYZE TABLE {table}")
+        analyze.fetchall()
+    analyze.close()
+
+    # Every model call below goes through the recorder
+    recorder = config._thread_db.db = PlanRecorder(db)
+
+    user_id = 1
+    other_id = contacts[user_id][0]
+    group_id = next(g for g, group_members in members.items() if group_members[0] != user_id)
+    member_id = members[group_id][1]
+    direct_page = get_message_page(user_id, other_id, limit=20)
+    group_page = get_message_page(group_id=group_id, limit=20)
+    chat_page = get_chat_page(user_id, limit=5)
+
+    # (name, call, filesort allowed) - filesort is only tolerated where the
+    # result is a small per-user set sorted for display
+    scenarios = [
+        ('create_message direct', lambda: create_message(user_id, other_id, 'plan check'), False),
+        ('create_message group', lambda: create_message(member_id, group_id=group_id, content='plan check'), False),
+        ('direct history newest', lambda: get_message_page(user_id, other_id, limit=20), False),
+        ('direct history before', lambda: get_message_page(user_id, other_id, limit=20,
+                                                           before=direct_page['before']), False),
+        ('direct history after', lambda: get_message_page(user_id, other_id, limit=20,
+                                                          after=direct_page['before']), False),
+        ('group history newest', lambda: get_message_page(group_id=group_id, limit=20), False),
+        ('group history before', lambda: get_message_page(group_id=group_id, limit=20,
+                                                          before=group_page['before']), False),
+        ('mark_messages_as_read', lambda: mark_messages_as_read(other_id, user_id, user_id), False),
+        ('mark_group_messages_as_read', lambda: mark_group_messages_as_read(group_id, member_id), False),
+        ('get_recent_chats', lambda: get_recent_chats(user_id), True),
+        ('chat list first page', lambda: get_chat_page(user_id, limit=5), False),
+        ('chat list next page', lambda: get_chat_page(user_id, limit=5, cursor=chat_page['next_cursor']), False),
+        ('get_unread_counters', lambda: get_unread_counters(user_id), False),
+        ('get_user_by_id', lambda: (user_cache.clear(), get_user_by_id(other_id)), False),
+        ('get_users_by_ids', lambda: get_users_by_ids(members[group_id]), False),
+        ('get_user_groups', lambda: get_user_groups(member_id), True),
+        ('get_user_groups_by_ids', lambda: get_user_groups_by_ids(member_id, [group_id]), False),
+        ('get_group_members', lambda: get_group_members(group_id), True),
+        ('search_messages', lambda: search_messages(user_id, 'message'), True),
+    ]
+
+    failures = 0
+    for name, call, allow_filesort in scenarios:
+        start = len(recorder.statements)
+        call()
+        statements = recorder.statements[start:]
+        problems = [(query, problem) for query, plan in statements
+                    for problem in plan_problems(plan, allow_filesort)]
+        print(f"{'FAIL' if problems else 'ok  '} {name} ({len(statements)} statements)")
+        for query, problem in problems:
+            query = re.sub(r'\s+', ' ', query).strip()
+            print(f"       {problem}: {query[:160]}")
+        failures += bool(problems)
+
+    config._thread_db.db = db
+    config.close_db()
+    print(f"\n{failures} of {len(scenarios)} scenarios use a bad plan" if failures
+          else f"\nAll {len(scenarios)} scenarios use index plans")
+    sys.exit(1 if failures else 0)
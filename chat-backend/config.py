@@ -1,7 +1,11 @@
-import mysql.connector
-from flask import g
+from flask import g, has_app_context
+from contextlib import contextmanager
 import os
+import threading
 from dotenv import load_dotenv
+from db_pool import ConnectionPool
+from state_backend import create_state_backend
+from async_mode import GREEN
 
 load_dotenv()
 
@@ -13,12 +17,134 @@ DATABASE_CONFIG = {
     'autocommit': True
 }
 
+if GREEN:
+    # The C extension does its socket I/O outside Python, where a blocked
+    # query would stall every green thread; the pure driver uses the patched socket
+    DATABASE_CONFIG['use_pure'] = True
+
+# 'memory' batches users.last_active / groups_table.updated_at writes in
+# models/activity.py; 'trigger' keeps the per-insert database triggers
+ACTIVITY_TRACKING = os.getenv('ACTIVITY_TRACKING', 'memory').lower()
+
+ACTIVITY_CONFIG = {
+    'enabled': ACTIVITY_TRACKING == 'memory',
+    'flush_interval': float(os.getenv('ACTIVITY_FLUSH_INTERVAL', '5'))
+}
+
+if ACTIVITY_CONFIG['enabled']:
+    # The activity triggers check this session variable and skip their UPDATEs
+    DATABASE_CONFIG['init_command'] = "SET @skip_activity_triggers = 1"
+
+PRESENCE_CONFIG = {
+    'grace_period': float(os.getenv('PRESENCE_GRACE_PERIOD', '5')),
+    'flush_interval': float(os.getenv('PRESENCE_FLUSH_INTERVAL', '2')),
+    'last_active_resolution': float(os.getenv('PRESENCE_LAST_ACTIVE_RESOLUTION', '60'))
+}
+
+PRESENCE_FANOUT_CONFIG = {
+    'interval': float(os.getenv('PRESENCE_DIFF_INTERVAL', '1')),
+    'max_watched': int(os.getenv('PRESENCE_MAX_WATCHED', '1000'))
+}
+
+# Scale-out: workers behind a sticky load balancer share Socket.IO rooms through
+# the message queue and sockets/presence/cache events through the state backend
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE') or None
+
+STATE_BACKEND_CONFIG = {
+    'url': os.getenv('STATE_BACKEND_URL', 'local'),
+    'prefix': os.getenv('STATE_BACKEND_PREFIX', 'chat'),
+    'socket_ttl': float(os.getenv('STATE_SOCKET_TTL', '90'))
+}
+
+POOL_CONFIG = {
+    'size': int(os.getenv('MYSQL_POOL_SIZE', '10')),
+    'timeout': float(os.getenv('MYSQL_POOL_TIMEOUT', '5')),
+    'recycle': int(os.getenv('MYSQL_POOL_RECYCLE', '1800')),
+    'pre_ping': os.getenv('MYSQL_POOL_PRE_PING', 'true').lower() == 'true'
+}
+
+# Bounded worker pool for the database work of socket handlers (sockets/db_executor.py)
+SOCKET_EXECUTOR_CONFIG = {
+    'workers': int(os.getenv('SOCKET_DB_WORKERS', os.getenv('MYSQL_POOL_SIZE', '10'))),
+    'queue_limit': int(os.getenv('SOCKET_QUEUE_LIMIT', '1000')),
+    'shed_threshold': int(os.getenv('SOCKET_SHED_THRESHOLD', '200'))
+}
+
+# Admission control for Socket.IO connects (sockets/admission.py)
+CONNECT_ADMISSION_CONFIG = {
+    'enabled': os.getenv('CONNECT_ADMISSION', 'true').lower() == 'true',
+    'ip_rate': float(os.getenv('CONNECT_IP_RATE', '5')),
+    'ip_burst': int(os.getenv('CONNECT_IP_BURST', '20')),
+    'user_rate': float(os.getenv('CONNECT_USER_RATE', '1')),
+    'user_burst': int(os.getenv('CONNECT_USER_BURST', '5')),
+    'max_concurrent': int(os.getenv('CONNECT_MAX_CONCURRENT', '50')),
+    'queue_timeout': float(os.getenv('CONNECT_QUEUE_TIMEOUT', '2')),
+    'retry_jitter': float(os.getenv('CONNECT_RETRY_JITTER', '10'))
+}
+
+# Take the client IP from X-Forwarded-For (only behind a proxy that sets it)
+TRUST_FORWARDED_FOR = os.getenv('TRUST_FORWARDED_FOR', 'false').lower() == 'true'
+
+# Addresses of load balancers/proxies in front of the backend; they are never
+# treated as the client, so connects through them skip the per-IP bucket
+TRUSTED_PROXIES = {ip.strip() for ip in os.getenv('CONNECT_TRUSTED_PROXIES', '').split(',') if ip.strip()}
+
+USER_CACHE_CONFIG = {
+    'max_size': int(os.getenv('USER_CACHE_SIZE', '10000')),
+    'ttl': float(os.getenv('USER_CACHE_TTL', '60'))
+}
+
+# Optional write-behind pipeline for send_message (see write_behind.py)
+MESSAGE_WRITE_BEHIND_CONFIG = {
+    'enabled': os.getenv('MESSAGE_WRITE_BEHIND', 'false').lower() == 'true',
+    'batch_size': int(os.getenv('MESSAGE_BATCH_SIZE', '200')),
+    'flush_interval': float(os.getenv('MESSAGE_FLUSH_INTERVAL', '0.05')),
+    'max_pending': int(os.getenv('MESSAGE_MAX_PENDING', '10000')),
+    'enqueue_timeout': float(os.getenv('MESSAGE_ENQUEUE_TIMEOUT', '2')),
+    'journal_dir': os.getenv('MESSAGE_JOURNAL_DIR', 'message_journal'),
+    'journal_fsync': os.getenv('MESSAGE_JOURNAL_FSYNC', 'false').lower() == 'true'
+}
+
+if MESSAGE_WRITE_BEHIND_CONFIG['enabled'] and STATE_BACKEND_CONFIG['url'] != 'local':
+    # Every process reserves its own blocks of message ids, so across processes
+    # ids would stop following send time (read cursors and chat order rely on it)
+    raise ValueError("MESSAGE_WRITE_BEHIND needs a single backend process (STATE_BACKEND_URL=local)")
+
+db_pool = ConnectionPool(DATABASE_CONFIG, **POOL_CONFIG)
+state_backend = create_state_backend(**STATE_BACKEND_CONFIG)
+
+# Connections borrowed by code running outside a Flask app context
+# (background threads, timers); returned by close_db()
+_thread_db = threading.local()
+
 def get_db():
-    if 'db' not in g:
-        g.db = mysql.connector.connect(**DATABASE_CONFIG)
-    return g.db
+    if has_app_context():
+        if 'db' not in g:
+            g.db = db_pool.acquire()
+        return g.db
 
-def close_db(error):
-    db = g.pop('db', None)
+    db = getattr(_thread_db, 'db', None)
+    if db is None:
+        db = _thread_db.db = db_pool.acquire()
+    return db
+
+def close_db(error=None):
+    if has_app_context():
+        db = g.pop('db', None)
+    else:
+        db = _thread_db.__dict__.pop('db', None)
     if db is not None:
-        db.close()
\ No newline at end of file
+        db_pool.release(db)
+
+@contextmanager
+def db_session():
+    """Borrow a dedicated pooled connection for background work
+
+    It is never the connection get_db() hands out, so using it inside a
+    request or socket job cannot return the caller's connection to the pool.
+    """
+    db = db_pool.acquire()
+    try:
+        yield db
+    finally:
+        db_pool.release(db)
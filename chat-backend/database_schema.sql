@@ -4,6 +4,9 @@ CREATE DATABASE chat_app;
 USE chat_app;
 
 -- Drop existing tables
+DROP TABLE IF EXISTS message_id_sequence;
+DROP TABLE IF EXISTS conversations;
+DROP TABLE IF EXISTS unread_counters;
 DROP TABLE IF EXISTS message_read_status;
 DROP TABLE IF EXISTS group_members;
 DROP TABLE IF EXISTS messages;
@@ -89,6 +92,7 @@ CREATE TABLE messages (
     sender_id INT NOT NULL,
     receiver_id INT NULL,
     group_id INT NULL,
+    conversation_key VARCHAR(32) NULL,  -- 'a_b' (a < b) for direct messages, NULL for groups
     content TEXT NOT NULL,
     message_type ENUM('text', 'image', 'file', 'audio', 'video') DEFAULT 'text',
     file_url TEXT NULL,
@@ -106,14 +110,17 @@ CREATE TABLE messages (
     FOREIGN KEY (receiver_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (group_id) REFERENCES groups_table(id) ON DELETE CASCADE,
     FOREIGN KEY (reply_to_message_id) REFERENCES messages(id) ON DELETE SET NULL,
-    INDEX idx_sender (sender_id),
     INDEX idx_receiver (receiver_id),
     INDEX idx_group (group_id),
+    INDEX idx_conversation_history (conversation_key, timestamp, id),
+    INDEX idx_direct_unread (sender_id, receiver_id, is_read),
+    INDEX idx_group_history (group_id, timestamp, id),
     INDEX idx_timestamp (timestamp),
     INDEX idx_read_status (is_read),
     INDEX idx_delivered_status (is_delivered),
     INDEX idx_deleted (is_deleted),
     INDEX idx_type (message_type),
+    FULLTEXT INDEX ft_content (content),
     CHECK ((receiver_id IS NOT NULL AND group_id IS NULL) OR (receiver_id IS NULL AND group_id IS NOT NULL))
 );
 
@@ -131,8 +138,34 @@ CREATE TABLE message_read_status (
     INDEX idx_read_at (read_at)
 );
 
--- Link last_read_message_id
-ALTER TABLE group_members ADD CONSTRAINT fk_last_read_message FOREIGN KEY (last_read_message_id) REFERENCES messages(id) ON DELETE SET NULL;
+-- Materialized unread badges per (user, chat); chat_key is 'a_b' (a < b) for
+-- direct chats and 'group_<id>' for groups, matching the socket chat ids.
+-- Doubles as the per-user chat list, ordered by last_message_id (0 = no messages).
+-- Maintained by models/unread.py; rebuild with `flask rebuild-unread-counters`
+CREATE TABLE unread_counters (
+    user_id INT NOT NULL,
+    chat_key VARCHAR(64) NOT NULL,
+    unread_count INT NOT NULL DEFAULT 0,
+    last_message_id INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, chat_key),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_chat_key (chat_key),
+    INDEX idx_user_activity (user_id, last_message_id, chat_key)
+);
+
+-- Message id blocks handed out to the optional write-behind queue
+-- (MESSAGE_WRITE_BEHIND=true), which assigns ids before the rows are inserted
+CREATE TABLE message_id_sequence (
+    name VARCHAR(32) PRIMARY KEY,
+    next_id BIGINT NOT NULL
+);
+
+INSERT INTO message_id_sequence (name, next_id) VALUES ('messages', 1);
+
+-- group_members.last_read_message_id is a per-member read cursor for group
+-- chats. It deliberately has no foreign key: deleting the message it points
+-- at must not reset the cursor (ON DELETE SET NULL would mark everything unread).
 
 -- Sample data (users, groups, members, messages)
 INSERT INTO users (name, username, email, password, phone, is_online) VALUES 
@@ -159,10 +192,10 @@ INSERT INTO group_members (group_id, user_id, role, added_by) VALUES
 (4, 2, 'member', 3), (4, 6, 'member', 3), (5, 4, 'admin', NULL),
 (5, 5, 'member', 4), (5, 6, 'member', 4);
 
-INSERT INTO messages (sender_id, receiver_id, content, is_delivered, timestamp) VALUES
-(1, 2, 'Hey John! How are you?', TRUE, NOW() - INTERVAL 2 HOUR),
-(2, 1, 'I am great! You?', TRUE, NOW() - INTERVAL 90 MINUTE),
-(1, 2, 'All good here.', TRUE, NOW() - INTERVAL 60 MINUTE);
+INSERT INTO messages (sender_id, receiver_id, conversation_key, content, is_delivered, timestamp) VALUES
+(1, 2, '1_2', 'Hey John! How are you?', TRUE, NOW() - INTERVAL 2 HOUR),
+(2, 1, '1_2', 'I am great! You?', TRUE, NOW() - INTERVAL 90 MINUTE),
+(1, 2, '1_2', 'All good here.', TRUE, NOW() - INTERVAL 60 MINUTE);
 
 INSERT INTO messages (sender_id, group_id, content, is_delivered, timestamp) VALUES
 (1, 1, 'Welcome to General Chat!', TRUE, NOW() - INTERVAL 3 HOUR),
@@ -175,8 +208,10 @@ UPDATE messages SET is_read = TRUE, read_at = NOW() WHERE id IN (1, 2, 4);
 -- Trigger setup
 DELIMITER //
 
+-- The two activity triggers are skipped on connections that set
+-- @skip_activity_triggers (ACTIVITY_TRACKING=memory, see models/activity.py)
 CREATE TRIGGER update_group_timestamp AFTER INSERT ON messages FOR EACH ROW BEGIN
-    IF NEW.group_id IS NOT NULL THEN
+    IF NEW.group_id IS NOT NULL AND @skip_activity_triggers IS NULL THEN
         UPDATE groups_table SET updated_at = NOW() WHERE id = NEW.group_id;
     END IF;
 END//
@@ -187,7 +222,9 @@ CREATE TRIGGER set_message_delivered BEFORE INSERT ON messages FOR EACH ROW BEGI
 END//
 
 CREATE TRIGGER update_user_activity AFTER INSERT ON messages FOR EACH ROW BEGIN
-    UPDATE users SET last_active = NOW() WHERE id = NEW.sender_id;
+    IF @skip_activity_triggers IS NULL THEN
+        UPDATE users SET last_active = NOW() WHERE id = NEW.sender_id;
+    END IF;
 END//
 
 CREATE TRIGGER cleanup_user_sessions AFTER DELETE ON users FOR EACH ROW BEGIN
@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import deque
+import mysql.connector
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection became free within the wait timeout"""
+
+
+class ConnectionPool:
+    """Bounded MySQL connection pool shared by every model and socket handler"""
+
+    def __init__(self, db_config, size=10, timeout=5.0, recycle=1800, pre_ping=True):
+        self.db_config = db_config
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = deque()       # [(connection, created_at)]
+        self._created_at = {}      # {id(connection): created_at}
+        self._open = 0             # connections currently alive (idle + in use)
+        self._cond = threading.Condition()
+
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'exhausted': 0,
+            'created': 0,
+            'recycled': 0,
+            'discarded': 0,
+            'rolled_back': 0,
+            'wait_time_total': 0.0,
+        }
+
+    def _connect(self):
+        connection = mysql.connector.connect(**self.db_config)
+        with self._cond:
+            self._created_at[id(connection)] = time.time()
+            self._stats['created'] += 1
+        return connection
+
+    def _forget(self, connection, reason):
+        """Close a connection and free its slot for a new one"""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._created_at.pop(id(connection), None)
+            self._open -= 1
+            self._stats[reason] += 1
+            self._cond.notify()
+
+    def _is_usable(self, connection):
+        created_at = self._created_at.get(id(connection), 0)
+        if self.recycle and time.time() - created_at > self.recycle:
+            self._forget(connection, 'recycled')
+            return False
+        if self.pre_ping:
+            try:
+                connection.ping(reconnect=False)
+            except Exception:
+                self._forget(connection, 'discarded')
+                return False
+        return True
+
+    def acquire(self):
+        """Check out a connection, waiting up to `timeout` seconds for a free slot"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        while True:
+            connection = None
+            with self._cond:
+                while not self._idle and self._open >= self.size:
+                    if not waited:
+                        waited = True
+                        self._stats['waits'] += 1
+                        self._stats['exhausted'] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available after {self.timeout}s "
+                            f"(pool size {self.size})"
+                        )
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    connection, _ = self._idle.pop()
+                else:
+                    self._open += 1
+
+            if connection is None:
+                try:
+                    connection = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_usable(connection):
+                continue
+
+            with self._cond:
+                self._stats['checkouts'] += 1
+                if waited:
+                    self._stats['wait_time_total'] += time.monotonic() - started
+            return connection
+
+    def release(self, connection):
+        """Return a connection to the pool, discarding it if it is broken
+
+        A transaction the borrower left open is rolled back first, so its
+        locks and uncommitted writes never leak into the next borrower's
+        statements; if the rollback fails the connection is discarded.
+        """
+        rolled_back = False
+        try:
+            healthy = connection.is_connected()
+            if healthy and connection.unread_result:
+                connection.consume_results()
+            if healthy and connection.in_transaction:
+                connection.rollback()
+                rolled_back = True
+        except Exception:
+            healthy = False
+
+        if not healthy:
+            self._forget(connection, 'discarded')
+            return
+
+        with self._cond:
+            if rolled_back:
+                self._stats['rolled_back'] += 1
+            self._idle.append((connection, self._created_at.get(id(connection), time.time())))
+            self._cond.notify()
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown)"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for connection, _ in idle:
+            self._forget(connection, 'discarded')
+
+    def stats(self):
+        """Snapshot of pool usage and exhaustion metrics"""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+            })
+        return snapshot
@@ -0,0 +1,15 @@
+-- Group read state moves from messages.is_read to per-member cursors
+-- (group_members.last_read_message_id). Run once against an existing chat_app.
+USE chat_app;
+
+-- A deleted message must not reset a member's cursor to NULL
+ALTER TABLE group_members DROP FOREIGN KEY fk_last_read_message;
+
+-- Seed cursors from the old shared flag: everything up to the newest message
+-- already flagged as read in the group counts as read for every member
+UPDATE group_members gm
+SET gm.last_read_message_id = (
+    SELECT MAX(m.id) FROM messages m
+    WHERE m.group_id = gm.group_id AND m.is_read = TRUE
+)
+WHERE gm.last_read_message_id IS NULL;
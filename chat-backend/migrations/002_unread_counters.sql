@@ -0,0 +1,14 @@
+-- Materialized unread counters for chat-list badges. Run once against an
+-- existing chat_app, then fill the table with: flask rebuild-unread-counters
+USE chat_app;
+
+CREATE TABLE IF NOT EXISTS unread_counters (
+    user_id INT NOT NULL,
+    chat_key VARCHAR(64) NOT NULL,
+    unread_count INT NOT NULL DEFAULT 0,
+    last_message_id INT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, chat_key),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_chat_key (chat_key)
+);
@@ -0,0 +1,10 @@
+-- unread_counters doubles as the per-user chat list ordered by last activity.
+-- Run once against an existing chat_app, then: flask rebuild-unread-counters
+-- (the rebuild also creates rows for groups that have no messages yet).
+USE chat_app;
+
+UPDATE unread_counters SET last_message_id = 0 WHERE last_message_id IS NULL;
+
+ALTER TABLE unread_counters
+    MODIFY last_message_id INT NOT NULL DEFAULT 0,
+    ADD INDEX idx_user_activity (user_id, last_message_id, chat_key);
@@ -0,0 +1,17 @@
+-- Direct-conversation summary that used to back get_recent_chats. Superseded
+-- by 010_drop_conversations.sql, which drops the table again: there is nothing
+-- to fill (the rebuild-conversations command is gone); after applying the
+-- migrations in order, run: flask rebuild-unread-counters
+USE chat_app;
+
+CREATE TABLE IF NOT EXISTS conversations (
+    conversation_key VARCHAR(32) PRIMARY KEY,
+    user_low INT NOT NULL,
+    user_high INT NOT NULL,
+    last_message_id INT NOT NULL,
+    last_timestamp TIMESTAMP NOT NULL,
+    FOREIGN KEY (user_low) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_high) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_low_recent (user_low, last_timestamp),
+    INDEX idx_high_recent (user_high, last_timestamp)
+);
@@ -0,0 +1,6 @@
+-- Full-text index behind /chat/search. InnoDB maintains it on every INSERT and
+-- DELETE, so no application-side sync is needed. Building it on a large table
+-- takes a while; run during a quiet period.
+USE chat_app;
+
+ALTER TABLE messages ADD FULLTEXT INDEX ft_content (content);
@@ -0,0 +1,15 @@
+-- Composite indexes for the hot message paths:
+--   idx_direct_history  direct chat pages, one range per direction, ordered by (timestamp, id)
+--   idx_direct_unread   mark_messages_as_read (sender, receiver, unread only)
+--   idx_group_history   group chat pages ordered by (timestamp, id)
+-- idx_sender is a prefix of idx_direct_history and is dropped. idx_group stays:
+-- it is (group_id, id) internally and serves MAX(id) / id ranges for read cursors.
+-- Check the resulting plans with benchmarks/check_query_plans.py.
+USE chat_app;
+
+ALTER TABLE messages
+    ADD INDEX idx_direct_history (sender_id, receiver_id, timestamp, id),
+    ADD INDEX idx_direct_unread (sender_id, receiver_id, is_read),
+    ADD INDEX idx_group_history (group_id, timestamp, id);
+
+ALTER TABLE messages DROP INDEX idx_sender;
@@ -0,0 +1,16 @@
+-- Stored conversation key on direct messages ('a_b' with a < b, the same value
+-- as the socket chat_id and conversations.conversation_key) so a direct chat's
+-- history is one index range instead of an OR over both directions.
+-- New rows get the key from create_message; this backfills existing ones.
+-- On a large table run the UPDATE in id ranges during a quiet period.
+USE chat_app;
+
+ALTER TABLE messages ADD COLUMN conversation_key VARCHAR(32) NULL AFTER group_id;
+
+UPDATE messages
+SET conversation_key = CONCAT(LEAST(sender_id, receiver_id), '_', GREATEST(sender_id, receiver_id))
+WHERE group_id IS NULL AND conversation_key IS NULL;
+
+ALTER TABLE messages
+    ADD INDEX idx_conversation_history (conversation_key, timestamp, id),
+    DROP INDEX idx_direct_history;
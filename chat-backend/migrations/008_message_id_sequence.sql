@@ -0,0 +1,12 @@
+-- Id blocks for the optional write-behind message queue (MESSAGE_WRITE_BEHIND=true).
+-- The queue assigns message ids before inserting, reserving them here; the
+-- reservation never drops below MAX(messages.id) + 1.
+USE chat_app;
+
+CREATE TABLE message_id_sequence (
+    name VARCHAR(32) PRIMARY KEY,
+    next_id BIGINT NOT NULL
+);
+
+INSERT INTO message_id_sequence (name, next_id)
+SELECT 'messages', COALESCE(MAX(id), 0) + 1 FROM messages;
@@ -0,0 +1,25 @@
+-- Let the activity triggers be skipped per connection. With
+-- ACTIVITY_TRACKING=memory (the default) every pooled connection sets
+-- @skip_activity_triggers and models/activity.py writes users.last_active and
+-- groups_table.updated_at in periodic bulk UPDATEs instead.
+-- With ACTIVITY_TRACKING=trigger the variable is never set and nothing changes.
+USE chat_app;
+
+DROP TRIGGER IF EXISTS update_group_timestamp;
+DROP TRIGGER IF EXISTS update_user_activity;
+
+DELIMITER //
+
+CREATE TRIGGER update_group_timestamp AFTER INSERT ON messages FOR EACH ROW BEGIN
+    IF NEW.group_id IS NOT NULL AND @skip_activity_triggers IS NULL THEN
+        UPDATE groups_table SET updated_at = NOW() WHERE id = NEW.group_id;
+    END IF;
+END//
+
+CREATE TRIGGER update_user_activity AFTER INSERT ON messages FOR EACH ROW BEGIN
+    IF @skip_activity_triggers IS NULL THEN
+        UPDATE users SET last_active = NOW() WHERE id = NEW.sender_id;
+    END IF;
+END//
+
+DELIMITER ;
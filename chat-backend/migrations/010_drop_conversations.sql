@@ -0,0 +1,5 @@
+-- The conversations summary duplicated unread_counters (which serves the chat
+-- list and now get_recent_chats) and cost a second upsert per direct message.
+USE chat_app;
+
+DROP TABLE IF EXISTS conversations;
@@ -1,3 +1,4 @@
 from .user import *
 from .message import *
-from .group import *
\ No newline at end of file
+from .group import *
+from .unread import *
\ No newline at end of file
@@ -0,0 +1,113 @@
+from config import db_session, ACTIVITY_CONFIG
+from datetime import datetime
+import atexit
+import threading
+import time
+
+FLUSH_CHUNK = 500  # ids per bulk UPDATE
+
+class ActivityTracker:
+    """Collects users.last_active / groups_table.updated_at in memory
+
+    Replaces the update_user_activity and update_group_timestamp triggers,
+    which wrote the sender's and the group's row on every message INSERT and
+    serialized busy groups on that row lock. Touches only keep the newest
+    timestamp per id; a background thread writes them every `flush_interval`
+    seconds with one bulk UPDATE per table, in id order.
+
+    With ACTIVITY_TRACKING=trigger this is disabled and the triggers run as before.
+    """
+
+    def __init__(self, enabled=True, flush_interval=5.0):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self._users = {}   # {user_id: newest activity}
+        self._groups = {}  # {group_id: newest message time}
+        self._lock = threading.Lock()
+        self._runner = None
+        self._stats = {'touches': 0, 'flushes': 0, 'rows_written': 0, 'failures': 0}
+
+    def start(self):
+        with self._lock:
+            if self._runner is not None:
+                return
+            self._runner = threading.Thread(target=self._run, name='activity-flush', daemon=True)
+            self._runner.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def touch(self, user_id, group_id=None, when=None):
+        """Record that a user sent a message (to a group, if given)"""
+        if not self.enabled:
+            return
+        self.start()
+        when = when or datetime.now()
+        user_id, group_id = int(user_id), int(group_id) if group_id else None
+        with self._lock:
+            if when > self._users.get(user_id, when.min):
+                self._users[user_id] = when
+            if group_id and when > self._groups.get(group_id, when.min):
+                self._groups[group_id] = when
+            self._stats['touches'] += 1
+
+    def flush(self):
+        """Write pending timestamps; returns how many rows were updated"""
+        with self._lock:
+            users, self._users = self._users, {}
+            groups, self._groups = self._groups, {}
+        if not users and not groups:
+            return 0
+        try:
+            with db_session() as db:
+                cursor = db.cursor()
+                rows = self._bulk_update(cursor, 'users', 'last_active', users)
+                rows += self._bulk_update(cursor, 'groups_table', 'updated_at', groups)
+                db.commit()
+                cursor.close()
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats['rows_written'] += rows
+            return rows
+        except Exception as e:
+            print(f"Error flushing activity timestamps: {e}")
+            # Put them back unless a newer touch arrived meanwhile
+            with self._lock:
+                for pending, target in ((users, self._users), (groups, self._groups)):
+                    for key, when in pending.items():
+                        if when > target.get(key, when.min):
+                            target[key] = when
+                self._stats['failures'] += 1
+            return 0
+
+    @staticmethod
+    def _bulk_update(cursor, table, column, timestamps):
+        rows = 0
+        items = sorted(timestamps.items())  # fixed lock order across flushes
+        for start in range(0, len(items), FLUSH_CHUNK):
+            chunk = items[start:start + FLUSH_CHUNK]
+            cases = ' '.join(['WHEN %s THEN %s'] * len(chunk))
+            placeholders = ','.join(['%s'] * len(chunk))
+            params = [value for item in chunk for value in item] + [key for key, _ in chunk]
+            # GREATEST keeps newer values written directly (e.g. by a heartbeat)
+            cursor.execute(f"""
+                UPDATE {table}
+                SET {column} = GREATEST(COALESCE({column}, '1970-01-01'), CASE id {cases} END)
+                WHERE id IN ({placeholders})
+            """, params)
+            rows += cursor.rowcount
+        return rows
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                'enabled': self.enabled,
+                'pending_users': len(self._users),
+                'pending_groups': len(self._groups),
+            }
+
+activity_tracker = ActivityTracker(**ACTIVITY_CONFIG)
@@ -1,5 +1,188 @@
-from config import get_db
+from config import get_db, state_backend
+from models.unread import delete_unread_counters, ensure_unread_counter, group_chat_key
+from models.user_search import user_search_index
 from datetime import datetime
+import threading
+
+class MembershipIndex:
+    """In-memory group membership index: group -> {user: role} and user -> groups
+
+    Groups and users are loaded lazily from group_members on first lookup and
+    kept coherent by the write paths in this module, so authorization checks
+    become a dictionary lookup instead of a query.
+    """
+
+    def __init__(self):
+        self._members = {}       # {group_id: {user_id: role}} (only fully loaded groups)
+        self._user_groups = {}   # {user_id: set(group_ids)} (only fully loaded users)
+        self._versions = {}      # {group_id: int} bumped on every change to a group
+        self._version = 0        # bumped on every change to any group
+        self._lock = threading.RLock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def _load_group(self, group_id):
+        with self._lock:
+            version = self._versions.get(group_id, 0)
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT user_id, role FROM group_members WHERE group_id = %s
+        """, (group_id,))
+        members = {row['user_id']: row['role'] for row in cursor.fetchall()}
+        cursor.close()
+        with self._lock:
+            # A concurrent write may have changed the group while we were reading
+            if self._versions.get(group_id, 0) == version:
+                self._members[group_id] = members
+            return dict(members)
+
+    def _load_user(self, user_id, attempts=3):
+        for _ in range(attempts):
+            with self._lock:
+                version = self._version
+            db = get_db()
+            cursor = db.cursor()
+            cursor.execute("""
+                SELECT group_id FROM group_members WHERE user_id = %s
+            """, (user_id,))
+            group_ids = {row[0] for row in cursor.fetchall()}
+            cursor.close()
+            with self._lock:
+                # Any membership change while we were reading may be missing
+                # from the result (a group that is not loaded has no copy to
+                # fold in), so only a read no change overlapped is cached
+                if self._version == version:
+                    self._user_groups[user_id] = group_ids
+                    return set(group_ids)
+        return group_ids
+
+    def members(self, group_id):
+        """Return {user_id: role} for a group"""
+        group_id = int(group_id)
+        with self._lock:
+            members = self._members.get(group_id)
+            if members is not None:
+                self._stats['hits'] += 1
+                return dict(members)
+            self._stats['misses'] += 1
+        return self._load_group(group_id)
+
+    def role(self, group_id, user_id):
+        return self.members(group_id).get(int(user_id))
+
+    def is_member(self, group_id, user_id):
+        group_id, user_id = int(group_id), int(user_id)
+        with self._lock:
+            members = self._members.get(group_id)
+            if members is not None:
+                self._stats['hits'] += 1
+                return user_id in members
+            self._stats['misses'] += 1
+        return user_id in self._load_group(group_id)
+
+    def groups_of(self, user_id):
+        """Return the set of group ids a user belongs to"""
+        user_id = int(user_id)
+        with self._lock:
+            group_ids = self._user_groups.get(user_id)
+            if group_ids is not None:
+                self._stats['hits'] += 1
+                return set(group_ids)
+            self._stats['misses'] += 1
+        return self._load_user(user_id)
+
+    def set_member(self, group_id, user_id, role):
+        """Record a new member or a role change"""
+        group_id, user_id = int(group_id), int(user_id)
+        with self._lock:
+            self._versions[group_id] = self._versions.get(group_id, 0) + 1
+            self._version += 1
+            if group_id in self._members:
+                self._members[group_id][user_id] = role
+            if user_id in self._user_groups:
+                self._user_groups[user_id].add(group_id)
+
+    def create_group(self, group_id, creator_id):
+        group_id, creator_id = int(group_id), int(creator_id)
+        with self._lock:
+            self._versions[group_id] = self._versions.get(group_id, 0) + 1
+            self._version += 1
+            self._members[group_id] = {creator_id: 'admin'}
+            if creator_id in self._user_groups:
+                self._user_groups[creator_id].add(group_id)
+
+    def remove_member(self, group_id, user_id):
+        group_id, user_id = int(group_id), int(user_id)
+        with self._lock:
+            self._versions[group_id] = self._versions.get(group_id, 0) + 1
+            self._version += 1
+            if group_id in self._members:
+                self._members[group_id].pop(user_id, None)
+            if user_id in self._user_groups:
+                self._user_groups[user_id].discard(group_id)
+
+    def drop_group(self, group_id):
+        group_id = int(group_id)
+        with self._lock:
+            self._versions[group_id] = self._versions.get(group_id, 0) + 1
+            self._version += 1
+            self._members.pop(group_id, None)
+            for group_ids in self._user_groups.values():
+                group_ids.discard(group_id)
+
+    def drop_user(self, user_id):
+        user_id = int(user_id)
+        with self._lock:
+            self._version += 1
+            self._user_groups.pop(user_id, None)
+            for group_id, members in self._members.items():
+                if members.pop(user_id, None) is not None:
+                    self._versions[group_id] = self._versions.get(group_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._members.clear()
+            self._user_groups.clear()
+            self._versions.clear()
+            self._version += 1
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['groups'] = len(self._members)
+            snapshot['users'] = len(self._user_groups)
+        return snapshot
+
+membership_index = MembershipIndex()
+
+MEMBERSHIP_CHANGES = ('create_group', 'set_member', 'remove_member', 'drop_group')
+
+def change_membership(op, *args):
+    """Apply a committed membership change to the index of this and every other worker"""
+    getattr(membership_index, op)(*args)
+    state_backend.publish('membership', {'op': op, 'args': list(args)}, local=False)
+
+def _apply_membership_change(event):
+    if event['op'] in MEMBERSHIP_CHANGES:
+        getattr(membership_index, event['op'])(*event['args'])
+
+state_backend.subscribe('membership', _apply_membership_change)
+
+def get_group_member_ids(group_id):
+    """Get the ids of all members of a group from the membership index"""
+    try:
+        return set(membership_index.members(group_id))
+    except Exception as e:
+        print(f"Error getting group member ids: {e}")
+        return set()
+
+def get_user_group_ids(user_id):
+    """Get the ids of all groups a user belongs to from the membership index"""
+    try:
+        return membership_index.groups_of(user_id)
+    except Exception as e:
+        print(f"Error getting user group ids: {e}")
+        return set()
 
 def create_group(name, description, created_by, group_picture=None):
     """Create a new group and add creator as admin"""
@@ -20,9 +203,11 @@ def create_group(name, description, created_by, group_picture=None):
             INSERT INTO group_members (group_id, user_id, role) 
             VALUES (%s, %s, 'admin')
         """, (group_id, created_by))
+        ensure_unread_counter(cursor, created_by, group_chat_key(group_id))
         
         db.commit()
         cursor.close()
+        change_membership('create_group', group_id, created_by)
         return group_id
         
     except Exception as e:
@@ -45,13 +230,15 @@ def get_user_groups(user_id):
             SELECT g.*, gm.role, gm.joined_at,
                    u.name as creator_name,
                    (SELECT COUNT(*) FROM group_members WHERE group_id = g.id) as member_count,
-                   (SELECT COUNT(*) FROM messages WHERE group_id = g.id AND sender_id != %s AND is_read = FALSE) as unread_count
+                   COALESCE(uc.unread_count, 0) as unread_count
             FROM groups_table g
             JOIN group_members gm ON g.id = gm.group_id
             LEFT JOIN users u ON g.created_by = u.id
+            LEFT JOIN unread_counters uc ON uc.user_id = gm.user_id
+                                        AND uc.chat_key = CONCAT('group_', g.id)
             WHERE gm.user_id = %s
             ORDER BY g.updated_at DESC
-        """, (user_id, user_id))
+        """, (user_id,))
         
         result = cursor.fetchall()
         cursor.close()
@@ -63,6 +250,34 @@ def get_user_groups(user_id):
             cursor.close()
         return []
 
+def get_user_groups_by_ids(user_id, group_ids):
+    """Get the given groups of a user, with the user's role and member count"""
+    try:
+        if not group_ids:
+            return []
+        
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
+        
+        placeholders = ','.join(['%s'] * len(group_ids))
+        cursor.execute(f"""
+            SELECT g.*, gm.role, gm.joined_at,
+                   (SELECT COUNT(*) FROM group_members WHERE group_id = g.id) as member_count
+            FROM groups_table g
+            JOIN group_members gm ON g.id = gm.group_id
+            WHERE gm.user_id = %s AND g.id IN ({placeholders})
+        """, [user_id] + list(group_ids))
+        
+        result = cursor.fetchall()
+        cursor.close()
+        return result
+        
+    except Exception as e:
+        print(f"Error getting user groups by IDs: {e}")
+        if 'cursor' in locals():
+            cursor.close()
+        return []
+
 def get_group_members(group_id):
     """Get all members of a group"""
     try:
@@ -115,11 +330,13 @@ def add_group_member(group_id, user_id, added_by):
             cursor.close()
             return False  # User already in group
         
-        # Add member
+        # Add member; history from before joining starts out read
         cursor.execute("""
-            INSERT INTO group_members (group_id, user_id, role) 
-            VALUES (%s, %s, 'member')
-        """, (group_id, user_id))
+            INSERT INTO group_members (group_id, user_id, role, last_read_message_id) 
+            SELECT %s, %s, 'member', MAX(id) FROM messages WHERE group_id = %s
+        """, (group_id, user_id, group_id))
+        cursor.execute("SELECT MAX(id) as last_message_id FROM messages WHERE group_id = %s", (group_id,))
+        ensure_unread_counter(cursor, user_id, group_chat_key(group_id), cursor.fetchone()['last_message_id'])
         
         # Update group's updated_at timestamp
         cursor.execute("""
@@ -128,6 +345,7 @@ def add_group_member(group_id, user_id, added_by):
         
         db.commit()
         cursor.close()
+        change_membership('set_member', group_id, user_id, 'member')
         return True
         
     except Exception as e:
@@ -180,6 +398,8 @@ def remove_group_member(group_id, user_id, removed_by):
         
         db.commit()
         cursor.close()
+        change_membership('remove_member', group_id, user_id)
+        delete_unread_counters(group_chat_key(group_id), user_id)
         return True
         
     except Exception as e:
@@ -195,30 +415,10 @@ def remove_group_member(group_id, user_id, removed_by):
 def search_users_for_group(group_id, search_term=''):
     """Search users who are not in the group"""
     try:
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
-        
-        search_pattern = f"%{search_term}%"
-        
-        cursor.execute("""
-            SELECT u.id, u.name, u.username, u.profile_picture
-            FROM users u
-            WHERE u.id NOT IN (
-                SELECT user_id FROM group_members WHERE group_id = %s
-            )
-            AND (u.name LIKE %s OR u.username LIKE %s)
-            ORDER BY u.name ASC
-            LIMIT 20
-        """, (group_id, search_pattern, search_pattern))
-        
-        result = cursor.fetchall()
-        cursor.close()
-        return result
-        
+        member_ids = membership_index.members(group_id).keys()
+        return user_search_index.search(search_term, exclude_ids=member_ids, limit=20)
     except Exception as e:
         print(f"Error searching users for group: {e}")
-        if 'cursor' in locals():
-            cursor.close()
         return []
 
 def get_group_by_id(group_id):
@@ -321,6 +521,8 @@ def delete_group(group_id, user_id):
         
         db.commit()
         cursor.close()
+        change_membership('drop_group', group_id)
+        delete_unread_counters(group_chat_key(group_id))
         return True
         
     except Exception as e:
@@ -375,6 +577,7 @@ def promote_to_admin(group_id, user_id, promoted_by):
         
         db.commit()
         cursor.close()
+        change_membership('set_member', group_id, user_id, 'admin')
         return True
         
     except Exception as e:
@@ -439,6 +642,7 @@ def demote_from_admin(group_id, user_id, demoted_by):
         
         db.commit()
         cursor.close()
+        change_membership('set_member', group_id, user_id, 'member')
         return True
         
     except Exception as e:
@@ -454,45 +658,17 @@ def demote_from_admin(group_id, user_id, demoted_by):
 def get_user_role_in_group(group_id, user_id):
     """Get user's role in a specific group"""
     try:
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT role FROM group_members 
-            WHERE group_id = %s AND user_id = %s
-        """, (group_id, user_id))
-        
-        result = cursor.fetchone()
-        cursor.close()
-        
-        return result['role'] if result else None
-        
+        return membership_index.role(group_id, user_id)
     except Exception as e:
         print(f"Error getting user role in group: {e}")
-        if 'cursor' in locals():
-            cursor.close()
         return None
 
 def is_user_group_member(group_id, user_id):
     """Check if user is a member of the group"""
     try:
-        db = get_db()
-        cursor = db.cursor()
-        
-        cursor.execute("""
-            SELECT 1 FROM group_members 
-            WHERE group_id = %s AND user_id = %s
-        """, (group_id, user_id))
-        
-        result = cursor.fetchone()
-        cursor.close()
-        
-        return result is not None
-        
+        return membership_index.is_member(group_id, user_id)
     except Exception as e:
         print(f"Error checking group membership: {e}")
-        if 'cursor' in locals():
-            cursor.close()
         return False
 
 def get_group_admins(group_id):
@@ -1,29 +1,86 @@
-from config import get_db
+from config import get_db, db_session, MESSAGE_WRITE_BEHIND_CONFIG
+from models.user import get_user_by_id
+from models.unread import (
+    bump_unread_counters, consume_unread_counter, forget_unread_message, direct_chat_key,
+    group_chat_key, get_unread_counters
+)
+from models.group import get_user_group_ids
+from models.activity import activity_tracker
+from write_behind import MessageWriteBehind
 from datetime import datetime
+import re
 
-def save_message(sender_id, receiver_id=None, content=None, group_id=None):
-    """Save a new message to the database"""
+def create_message(sender_id, receiver_id=None, content=None, group_id=None):
+    """Insert a message and return the populated row without reading it back
+
+    The timestamp is generated here instead of by the column default so the row
+    is fully known after the INSERT, and sender fields come from the user
+    profile lookup rather than a JOIN on users. With MESSAGE_WRITE_BEHIND on,
+    the row is queued on message_writer and stored in the next batch.
+    """
     try:
-        db = get_db()
-        cursor = db.cursor()
+        timestamp = datetime.now().replace(microsecond=0)
         
-        if group_id:
-            # Group message
-            cursor.execute("""
-                INSERT INTO messages (sender_id, content, group_id, delivered_at) 
-                VALUES (%s, %s, %s, NOW())
-            """, (sender_id, content, group_id))
+        if message_writer.enabled:
+            # Foreign keys are only checked at flush time, so validate up front
+            if not group_id and not get_user_by_id(receiver_id):
+                return None
+            chat_key = group_chat_key(group_id) if group_id else direct_chat_key(sender_id, receiver_id)
+            message_id = message_writer.enqueue({
+                'sender_id': sender_id,
+                'receiver_id': None if group_id else receiver_id,
+                'group_id': group_id,
+                'conversation_key': None if group_id else chat_key,
+                'content': content,
+                'timestamp': timestamp
+            }, key=chat_key)
+            if message_id is None:
+                print("Error saving message: write-behind queue is full")
+                return None
         else:
-            # Direct message
-            cursor.execute("""
-                INSERT INTO messages (sender_id, receiver_id, content, delivered_at) 
-                VALUES (%s, %s, %s, NOW())
-            """, (sender_id, receiver_id, content))
+            db = get_db()
+            cursor = db.cursor()
+            
+            # The message and its unread counters are committed together
+            db.start_transaction()
+            
+            if group_id:
+                # Group message
+                cursor.execute("""
+                    INSERT INTO messages (sender_id, content, group_id, timestamp, delivered_at) 
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (sender_id, content, group_id, timestamp, timestamp))
+            else:
+                # Direct message
+                cursor.execute("""
+                    INSERT INTO messages (sender_id, receiver_id, conversation_key, content, timestamp, delivered_at) 
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, (sender_id, receiver_id, direct_chat_key(sender_id, receiver_id), content, timestamp, timestamp))
+            
+            message_id = cursor.lastrowid
+            bump_unread_counters(cursor, message_id, sender_id, receiver_id, group_id)
+            db.commit()
+            cursor.close()
         
-        message_id = cursor.lastrowid
-        db.commit()
-        cursor.close()
-        return message_id
+        activity_tracker.touch(sender_id, group_id, timestamp)
+        sender = get_user_by_id(sender_id) or {}
+        return {
+            'id': message_id,
+            'sender_id': sender_id,
+            'receiver_id': None if group_id else receiver_id,
+            'group_id': group_id,
+            'content': content,
+            'message_type': 'text',
+            'is_read': False,
+            'is_delivered': True,
+            'timestamp': timestamp,
+            'delivered_at': timestamp,
+            'read_at': None,
+            'sender_username': sender.get('username'),
+            'sender_name': sender.get('name'),
+            'sender_picture': sender.get('profile_picture'),
+            'status': 'delivered'
+        }
         
     except Exception as e:
         print(f"Error saving message: {e}")
@@ -35,89 +92,189 @@ def save_message(sender_id, receiver_id=None, content=None, group_id=None):
             cursor.close()
         return None
 
-def get_messages(sender_id=None, receiver_id=None, group_id=None, limit=100):
-    """Get messages for a chat or group"""
+def save_message(sender_id, receiver_id=None, content=None, group_id=None):
+    """Save a new message to the database"""
+    message = create_message(sender_id, receiver_id, content, group_id)
+    return message['id'] if message else None
+
+MESSAGE_PAGE_SIZE = 100
+MAX_MESSAGE_PAGE_SIZE = 200
+CURSOR_TIME_FORMAT = '%Y%m%d%H%M%S'
+
+def encode_message_cursor(message):
+    """Build an opaque (timestamp, id) keyset cursor for a message row"""
+    timestamp = message['timestamp']
+    if isinstance(timestamp, str):
+        timestamp = datetime.strptime(timestamp[:19], '%Y-%m-%d %H:%M:%S')
+    return f"{timestamp.strftime(CURSOR_TIME_FORMAT)}_{message['id']}"
+
+def decode_message_cursor(cursor):
+    """Parse a cursor produced by encode_message_cursor into (timestamp, id)"""
+    timestamp, message_id = cursor.split('_', 1)
+    return datetime.strptime(timestamp, CURSOR_TIME_FORMAT), int(message_id)
+
+def is_valid_message_cursor(cursor):
+    """True for a missing cursor or one decode_message_cursor accepts"""
+    if cursor is None:
+        return True
+    try:
+        decode_message_cursor(cursor)
+        return True
+    except (AttributeError, TypeError, ValueError):
+        return False
+
+def clamp_page_size(limit):
+    """Clamp a client supplied page size to a sane range"""
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return MESSAGE_PAGE_SIZE
+    return max(1, min(limit, MAX_MESSAGE_PAGE_SIZE))
+
+def get_message_page(sender_id=None, receiver_id=None, group_id=None, limit=MESSAGE_PAGE_SIZE,
+                     before=None, after=None):
+    """Get one page of chat history using keyset pagination on (timestamp, id)
+
+    Without a cursor the newest page is returned. `before` walks back into older
+    history and `after` walks forward to newer messages. Messages are always
+    returned in ascending order. A malformed cursor raises ValueError and
+    database errors are raised too, so callers never mistake a failure for
+    the end of the history.
+    """
+    limit = clamp_page_size(limit)
+    message_writer.sync(group_chat_key(group_id) if group_id else direct_chat_key(sender_id, receiver_id))
     try:
         db = get_db()
         cursor = db.cursor(dictionary=True)
-        
+
+        if after:
+            after_time, after_id = decode_message_cursor(after)
+            keyset = " AND (timestamp > %s OR (timestamp = %s AND id > %s))"
+            keyset_params = [after_time, after_time, after_id]
+            order = "ASC"
+        elif before:
+            before_time, before_id = decode_message_cursor(before)
+            keyset = " AND (timestamp < %s OR (timestamp = %s AND id < %s))"
+            keyset_params = [before_time, before_time, before_id]
+            order = "DESC"
+        else:
+            keyset, keyset_params, order = "", [], "DESC"
+        # Fetch one extra row to know whether another page exists
+        page = f" ORDER BY timestamp {order}, id {order} LIMIT %s"
+
         if group_id:
-            # Get group messages
-            cursor.execute("""
-                SELECT m.*, 
-                       s.username as sender_username,
-                       s.name as sender_name,
-                       s.profile_picture as sender_picture,
-                       CASE 
-                           WHEN m.read_at IS NOT NULL THEN 'read'
-                           WHEN m.delivered_at IS NOT NULL THEN 'delivered'
-                           ELSE 'sent'
-                       END as status
-                FROM messages m
-                LEFT JOIN users s ON m.sender_id = s.id
-                WHERE m.group_id = %s
-                ORDER BY m.timestamp ASC
-                LIMIT %s
-            """, (group_id, limit))
+            # Index range on idx_group_history (group_id, timestamp, id)
+            where, params = "group_id = %s", [group_id]
         else:
-            # Get direct messages
-            cursor.execute("""
-                SELECT m.*, 
-                       s.username as sender_username,
-                       s.name as sender_name,
-                       s.profile_picture as sender_picture,
-                       r.username as receiver_username,
-                       CASE 
-                           WHEN m.read_at IS NOT NULL THEN 'read'
-                           WHEN m.delivered_at IS NOT NULL THEN 'delivered'
-                           ELSE 'sent'
-                       END as status
-                FROM messages m
-                LEFT JOIN users s ON m.sender_id = s.id
-                LEFT JOIN users r ON m.receiver_id = r.id
-                WHERE (sender_id = %s AND receiver_id = %s)
-                   OR (sender_id = %s AND receiver_id = %s)
-                ORDER BY timestamp ASC
-                LIMIT %s
-            """, (sender_id, receiver_id, receiver_id, sender_id, limit))
-        
+            # Index range on idx_conversation_history (conversation_key, timestamp, id)
+            where, params = "conversation_key = %s", [direct_chat_key(sender_id, receiver_id)]
+        source = f"(SELECT * FROM messages WHERE {where}{keyset}{page})"
+        params += keyset_params + [limit + 1]
+
+        select = f"""
+            SELECT m.*, 
+                   s.username as sender_username,
+                   s.name as sender_name,
+                   s.profile_picture as sender_picture,
+                   r.username as receiver_username,
+                   CASE 
+                       WHEN m.read_at IS NOT NULL THEN 'read'
+                       WHEN m.delivered_at IS NOT NULL THEN 'delivered'
+                       ELSE 'sent'
+                   END as status
+            FROM {source} m
+            LEFT JOIN users s ON m.sender_id = s.id
+            LEFT JOIN users r ON m.receiver_id = r.id
+            ORDER BY m.timestamp {order}, m.id {order} LIMIT %s
+        """
+        params.append(limit + 1)
+
+        cursor.execute(select, params)
         messages = cursor.fetchall()
         cursor.close()
-        return messages
-        
+
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if order == "DESC":
+            messages.reverse()
+
+        return {
+            'messages': messages,
+            'has_more': has_more,
+            'before': encode_message_cursor(messages[0]) if messages else before,
+            'after': encode_message_cursor(messages[-1]) if messages else after
+        }
+
     except Exception as e:
         print(f"Error fetching messages: {e}")
         if 'cursor' in locals():
             cursor.close()
-        return []
+        raise
+
+def get_messages(sender_id=None, receiver_id=None, group_id=None, limit=MESSAGE_PAGE_SIZE,
+                 before=None, after=None):
+    """Get messages for a chat or group (newest page unless a cursor is given)"""
+    page = get_message_page(sender_id, receiver_id, group_id, limit, before, after)
+    return page['messages']
 
 def mark_group_messages_as_read(group_id, user_id):
-    """Mark all unread group messages as read for a user"""
+    """Advance a member's read cursor to the newest group message
+
+    The member's unread_counters row already holds how many messages are
+    unread and the newest message id of the group, so after locking it a
+    single UPDATE moves the cursor (group_members.last_read_message_id) and
+    clears the badge. Returns how many messages from other members became read.
+    """
+    message_writer.sync(group_chat_key(group_id))
     try:
         db = get_db()
         cursor = db.cursor()
+        chat_key = group_chat_key(group_id)
+        
+        # The lock holds back messages arriving meanwhile, so they stay unread
+        db.start_transaction()
         cursor.execute("""
-            UPDATE messages 
-            SET read_at = NOW(), is_read = TRUE
-            WHERE group_id = %s AND sender_id != %s AND is_read = FALSE
-        """, (group_id, user_id))
+            SELECT unread_count FROM unread_counters
+            WHERE user_id = %s AND chat_key = %s FOR UPDATE
+        """, (user_id, chat_key))
+        counter = cursor.fetchone()
+        if not counter or not counter[0]:
+            db.rollback()
+            cursor.close()
+            return 0
+        
+        cursor.execute("""
+            UPDATE group_members gm
+            JOIN unread_counters uc ON uc.user_id = gm.user_id AND uc.chat_key = %s
+            SET gm.last_read_message_id = GREATEST(COALESCE(gm.last_read_message_id, 0), uc.last_message_id),
+                uc.unread_count = 0
+            WHERE gm.group_id = %s AND gm.user_id = %s
+        """, (chat_key, group_id, user_id))
+        affected_rows = counter[0] if cursor.rowcount else 0
         
-        affected_rows = cursor.rowcount
         db.commit()
         cursor.close()
         return affected_rows
         
     except Exception as e:
         print(f"Error marking group messages as read: {e}")
+        try:
+            db.rollback()
+        except:
+            pass
         if 'cursor' in locals():
             cursor.close()
         return 0
 
 def mark_messages_as_read(sender_id, receiver_id, reader_id):
     """Mark messages as read in a direct chat"""
+    message_writer.sync(direct_chat_key(sender_id, reader_id))
     try:
         db = get_db()
         cursor = db.cursor()
+        
+        # The messages and the reader's badge change in one transaction
+        db.start_transaction()
         cursor.execute("""
             UPDATE messages 
             SET read_at = NOW(), is_read = TRUE
@@ -125,67 +282,43 @@ def mark_messages_as_read(sender_id, receiver_id, reader_id):
         """, (sender_id, reader_id))
         
         affected_rows = cursor.rowcount
+        if affected_rows:
+            consume_unread_counter(cursor, reader_id, direct_chat_key(sender_id, reader_id), affected_rows)
         db.commit()
         cursor.close()
         return affected_rows
         
     except Exception as e:
         print(f"Error marking messages as read: {e}")
+        try:
+            db.rollback()
+        except:
+            pass
         if 'cursor' in locals():
             cursor.close()
         return 0
 
 def get_unread_count(user_id):
-    """Get unread message count for a user"""
-    try:
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT sender_id, COUNT(*) as unread_count
-            FROM messages 
-            WHERE receiver_id = %s AND is_read = FALSE AND group_id IS NULL
-            GROUP BY sender_id
-        """, (user_id,))
-        
-        result = cursor.fetchall()
-        cursor.close()
-        
-        unread_dict = {row['sender_id']: row['unread_count'] for row in result}
-        return unread_dict
-        
-    except Exception as e:
-        print(f"Error getting unread count: {e}")
-        if 'cursor' in locals():
-            cursor.close()
-        return {}
+    """Get unread message count for a user's direct chats, keyed by the other user"""
+    unread_dict = {}
+    for chat_key, counter in get_unread_counters(user_id).items():
+        if chat_key.startswith('group_') or not counter['unread_count']:
+            continue
+        low, high = (int(x) for x in chat_key.split('_'))
+        unread_dict[high if low == int(user_id) else low] = counter['unread_count']
+    return unread_dict
 
 def get_group_unread_count(user_id):
     """Get unread message count for groups"""
-    try:
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT m.group_id, COUNT(*) as unread_count
-            FROM messages m
-            JOIN group_members gm ON m.group_id = gm.group_id
-            WHERE gm.user_id = %s AND m.sender_id != %s AND m.is_read = FALSE AND m.group_id IS NOT NULL
-            GROUP BY m.group_id
-        """, (user_id, user_id))
-        
-        result = cursor.fetchall()
-        cursor.close()
-        
-        unread_dict = {row['group_id']: row['unread_count'] for row in result}
-        return unread_dict
-        
-    except Exception as e:
-        print(f"Error getting group unread count: {e}")
-        if 'cursor' in locals():
-            cursor.close()
-        return {}
+    return {
+        int(chat_key.split('_')[1]): counter['unread_count']
+        for chat_key, counter in get_unread_counters(user_id).items()
+        if chat_key.startswith('group_') and counter['unread_count']
+    }
 
 def get_message_by_id(message_id):
     """Get a single message by ID"""
+    message_writer.sync(message_id=message_id)
     try:
         db = get_db()
         cursor = db.cursor(dictionary=True)
@@ -218,21 +351,26 @@ def get_message_by_id(message_id):
 
 def delete_message(message_id, user_id):
     """Delete a message (only by sender)"""
+    message_writer.sync(message_id=message_id)
     try:
         db = get_db()
         cursor = db.cursor()
         
         # Check if user is the sender
-        cursor.execute("SELECT sender_id FROM messages WHERE id = %s", (message_id,))
-        result = cursor.fetchone()
+        cursor.execute("""
+            SELECT id, sender_id, receiver_id, group_id, is_read FROM messages WHERE id = %s
+        """, (message_id,))
+        row = cursor.fetchone()
+        message = dict(zip(('id', 'sender_id', 'receiver_id', 'group_id', 'is_read'), row)) if row else None
         
-        if not result or result[0] != user_id:
+        if not message or message['sender_id'] != user_id:
             cursor.close()
             return False
         
-        # Delete the message
+        # Delete the message and fix the unread counters in one transaction
+        db.start_transaction()
         cursor.execute("DELETE FROM messages WHERE id = %s", (message_id,))
-        
+        forget_unread_message(cursor, message)
         db.commit()
         cursor.close()
         return True
@@ -247,38 +385,103 @@ def delete_message(message_id, user_id):
             cursor.close()
         return False
 
+def reserve_message_ids(count):
+    """Reserve a block of message ids for the write-behind queue
+
+    The sequence never falls below MAX(id) + 1, so it stays ahead of rows
+    inserted through AUTO_INCREMENT while write-behind was off. Runs on its
+    own connection, not the caller's request connection.
+    """
+    with db_session() as db:
+        cursor = db.cursor()
+        try:
+            cursor.execute("""
+                UPDATE message_id_sequence
+                SET next_id = LAST_INSERT_ID(
+                    GREATEST(next_id, (SELECT COALESCE(MAX(id), 0) + 1 FROM messages)) + %s)
+                WHERE name = 'messages'
+            """, (count,))
+            cursor.execute("SELECT LAST_INSERT_ID()")
+            end = cursor.fetchone()[0]
+            return range(end - count, end)
+        finally:
+            cursor.close()
+
+def insert_message_batch(rows):
+    """Store a write-behind batch in one transaction; returns how many rows were new
+
+    Rows whose id is already stored (journal replay, retried batch) are skipped,
+    so a batch can safely be persisted more than once.
+    """
+    with db_session() as db:
+        cursor = db.cursor()
+        try:
+            ids = [row['id'] for row in rows]
+            cursor.execute(f"SELECT id FROM messages WHERE id IN ({','.join(['%s'] * len(ids))})", ids)
+            stored = {row[0] for row in cursor.fetchall()}
+            rows = [row for row in rows if row['id'] not in stored]
+            if not rows:
+                return 0
+            
+            db.start_transaction()
+            # executemany sends a single multi-row INSERT
+            cursor.executemany("""
+                INSERT INTO messages (id, sender_id, receiver_id, group_id, conversation_key,
+                                      content, timestamp, delivered_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, [(row['id'], row['sender_id'], row['receiver_id'], row['group_id'],
+                   row['conversation_key'], row['content'], row['timestamp'], row['timestamp'])
+                  for row in rows])
+            
+            for row in rows:
+                bump_unread_counters(cursor, row['id'], row['sender_id'], row['receiver_id'], row['group_id'])
+            
+            db.commit()
+            return len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            cursor.close()
+
+message_writer = MessageWriteBehind(insert_message_batch, reserve_message_ids,
+                                    **MESSAGE_WRITE_BEHIND_CONFIG)
+
 def get_recent_chats(user_id, limit=20):
-    """Get recent chats for a user"""
+    """Get recent direct chats for a user
+
+    Reads the user's unread_counters rows (the same summary that serves the
+    chat list) newest first through idx_user_activity, then joins the other
+    user and the last message of only `limit` chats, so the cost does not
+    depend on how many messages exist.
+    """
     try:
         db = get_db()
         cursor = db.cursor(dictionary=True)
         
-        # Get recent direct messages
         cursor.execute("""
-            SELECT DISTINCT
-                CASE 
-                    WHEN m.sender_id = %s THEN m.receiver_id
-                    ELSE m.sender_id
-                END as other_user_id,
-                u.name as other_user_name,
-                u.username as other_user_username,
-                u.profile_picture as other_user_picture,
-                u.is_online as other_user_online,
-                MAX(m.timestamp) as last_message_time,
-                (SELECT content FROM messages WHERE 
-                    (sender_id = %s AND receiver_id = other_user_id) OR 
-                    (sender_id = other_user_id AND receiver_id = %s)
-                    ORDER BY timestamp DESC LIMIT 1) as last_message,
-                (SELECT COUNT(*) FROM messages WHERE 
-                    sender_id = other_user_id AND receiver_id = %s AND is_read = FALSE
-                ) as unread_count
-            FROM messages m
-            JOIN users u ON (u.id = CASE WHEN m.sender_id = %s THEN m.receiver_id ELSE m.sender_id END)
-            WHERE (m.sender_id = %s OR m.receiver_id = %s) AND m.group_id IS NULL
-            GROUP BY other_user_id, u.name, u.username, u.profile_picture, u.is_online
-            ORDER BY last_message_time DESC
-            LIMIT %s
-        """, (user_id, user_id, user_id, user_id, user_id, user_id, user_id, limit))
+            SELECT c.other_user_id,
+                   u.name as other_user_name,
+                   u.username as other_user_username,
+                   u.profile_picture as other_user_picture,
+                   u.is_online as other_user_online,
+                   m.timestamp as last_message_time,
+                   m.content as last_message,
+                   c.unread_count
+            FROM (
+                SELECT chat_key, unread_count, last_message_id,
+                       CAST(IF(SUBSTRING_INDEX(chat_key, '_', 1) = %s,
+                               SUBSTRING_INDEX(chat_key, '_', -1),
+                               SUBSTRING_INDEX(chat_key, '_', 1)) AS UNSIGNED) as other_user_id
+                FROM unread_counters
+                WHERE user_id = %s AND LEFT(chat_key, 6) != 'group_'
+                ORDER BY last_message_id DESC
+                LIMIT %s
+            ) c
+            JOIN users u ON u.id = c.other_user_id
+            LEFT JOIN messages m ON m.id = c.last_message_id
+            ORDER BY c.last_message_id DESC
+        """, (str(user_id), user_id, limit))
         
         result = cursor.fetchall()
         cursor.close()
@@ -290,16 +493,66 @@ def get_recent_chats(user_id, limit=20):
             cursor.close()
         return []
 
-def search_messages(user_id, search_term, limit=50):
-    """Search messages by content"""
+SEARCH_PAGE_SIZE = 20
+FULLTEXT_MIN_TOKEN = 3  # InnoDB innodb_ft_min_token_size default
+LIKE_SCAN_WINDOW = 50000  # newest messages scanned when no word is long enough for the index
+
+def build_fulltext_query(search_term):
+    """Turn free text into a BOOLEAN MODE query requiring every word as a prefix"""
+    words = re.findall(r"\w+", search_term.lower())
+    return ' '.join(f"+{word}*" for word in words if len(word) >= FULLTEXT_MIN_TOKEN)
+
+def short_search_words(search_term):
+    """Words of a query too short for the full-text index"""
+    return [word for word in re.findall(r"\w+", search_term.lower()) if len(word) < FULLTEXT_MIN_TOKEN]
+
+def search_messages(user_id, search_term, limit=SEARCH_PAGE_SIZE, offset=0):
+    """Search messages visible to a user, most relevant first
+
+    Uses the ft_content FULLTEXT index, which InnoDB keeps in sync on every
+    INSERT and DELETE. Visibility is restricted to the user's direct messages
+    and the groups they belong to (from the membership index). Words shorter
+    than the full-text token size are still required, as substrings of the
+    rows the index matched; a query made only of short words is a LIKE scan
+    limited to the newest LIKE_SCAN_WINDOW messages.
+    """
     try:
         db = get_db()
         cursor = db.cursor(dictionary=True)
         
-        search_pattern = f"%{search_term}%"
+        group_ids = sorted(get_user_group_ids(user_id))
+        visibility = "(m.sender_id = %s OR m.receiver_id = %s"
+        visibility_params = [user_id, user_id]
+        if group_ids:
+            visibility += f" OR m.group_id IN ({','.join(['%s'] * len(group_ids))})"
+            visibility_params += group_ids
+        visibility += ")"
         
-        cursor.execute("""
+        short_words = short_search_words(search_term)
+        substrings = ''.join(" AND m.content LIKE %s" for _ in short_words)
+        substring_params = ['%' + word.replace('_', '\\_') + '%' for word in short_words]  # _ is a LIKE wildcard
+        
+        fulltext_query = build_fulltext_query(search_term)
+        if fulltext_query:
+            match = "MATCH(m.content) AGAINST (%s IN BOOLEAN MODE)"
+            where = f"{match}{substrings} AND {visibility}"
+            relevance = match
+            # Placeholders in order: relevance column, WHERE match, short words, visibility
+            params = [fulltext_query, fulltext_query] + substring_params + visibility_params
+        elif short_words:
+            # Primary key range over the newest messages bounds the scan
+            cursor.execute("SELECT COALESCE(MAX(id), 0) as max_id FROM messages")
+            newest_id = cursor.fetchone()['max_id']
+            where = f"m.id > %s{substrings} AND {visibility}"
+            relevance = "0"
+            params = [newest_id - LIKE_SCAN_WINDOW] + substring_params + visibility_params
+        else:
+            cursor.close()
+            return {'messages': [], 'has_more': False, 'next_offset': None}
+        
+        cursor.execute(f"""
             SELECT m.*, 
+                   {relevance} as relevance,
                    s.name as sender_name,
                    s.username as sender_username,
                    s.profile_picture as sender_picture,
@@ -310,19 +563,21 @@ def search_messages(user_id, search_term, limit=50):
             LEFT JOIN users s ON m.sender_id = s.id
             LEFT JOIN users r ON m.receiver_id = r.id
             LEFT JOIN groups_table g ON m.group_id = g.id
-            WHERE m.content LIKE %s AND 
-                  (m.sender_id = %s OR m.receiver_id = %s OR 
-                   m.group_id IN (SELECT group_id FROM group_members WHERE user_id = %s))
-            ORDER BY m.timestamp DESC
-            LIMIT %s
-        """, (search_pattern, user_id, user_id, user_id, limit))
+            WHERE {where}
+            ORDER BY relevance DESC, m.id DESC
+            LIMIT %s OFFSET %s
+        """, params + [limit + 1, offset])
         
         result = cursor.fetchall()
         cursor.close()
-        return result
+        return {
+            'messages': result[:limit],
+            'has_more': len(result) > limit,
+            'next_offset': offset + limit if len(result) > limit else None
+        }
         
     except Exception as e:
         print(f"Error searching messages: {e}")
         if 'cursor' in locals():
             cursor.close()
-        return []
\ No newline at end of file
+        return {'messages': [], 'has_more': False, 'next_offset': None}
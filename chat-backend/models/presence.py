@@ -0,0 +1,214 @@
+from config import db_session, state_backend, PRESENCE_CONFIG
+from models.user import user_cache, share_user_change
+from datetime import datetime
+import atexit
+import threading
+import time
+
+FLUSH_CHUNK = 500  # users per bulk UPDATE
+
+class PresenceRegistry:
+    """Authoritative in-memory online state with debounced writes to users
+
+    connect/heartbeat/disconnect only change memory. Listeners are notified on
+    real transitions: a user whose last socket drops stays online for
+    `grace_period` seconds, so a quick reconnect produces no offline/online
+    pair. is_online/last_active reach the users table in coalesced bulk
+    UPDATEs every `flush_interval` seconds; heartbeats only refresh
+    last_active once it is `last_active_resolution` seconds old.
+
+    The online set and socket counts live in the state backend, so with
+    several workers a user is online while any worker holds one of their
+    sockets, and each transition is reported by exactly one worker (the one
+    whose mark_online/mark_offline changed the set). Grace timers stay local
+    to the worker that saw the last socket drop; users of a worker that died
+    are taken offline by whichever worker's sweep finds their entry lapsed.
+    """
+
+    def __init__(self, backend, grace_period=5.0, flush_interval=2.0, last_active_resolution=60.0, tick=0.5):
+        self.backend = backend
+        self.grace_period = grace_period
+        self.flush_interval = flush_interval
+        self.last_active_resolution = last_active_resolution
+        self.tick = tick
+
+        self._offline_at = {}         # {user_id: monotonic deadline} for users in their grace period
+        self._dirty = {}              # {user_id: (is_online, last_active)} waiting for the next flush
+        self._last_written = {}       # {user_id: last_active last queued for writing}
+        self._lock = threading.Lock()
+        self._runner = None
+        self.on_online = None         # on_online(user_id)
+        self.on_offline = None        # on_offline(user_id, reason)
+
+        self._stats = {
+            'went_online': 0,
+            'went_offline': 0,
+            'reconnects_absorbed': 0,
+            'flushes': 0,
+            'rows_written': 0,
+            'flush_failures': 0,
+        }
+
+    def set_listeners(self, on_online, on_offline):
+        self.on_online = on_online
+        self.on_offline = on_offline
+
+    def start(self, socketio):
+        """Run grace-period expiry and flushing as a Socket.IO background task"""
+        with self._lock:
+            if self._runner is None:
+                self._runner = socketio.start_background_task(self._run, socketio)
+                atexit.register(self.flush)
+
+    def _run(self, socketio):
+        last_flush = time.monotonic()
+        while True:
+            socketio.sleep(self.tick)
+            try:
+                self.expire()
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    last_flush = time.monotonic()
+                    self.sweep()
+                    self.flush()
+            except Exception as e:
+                print(f'❌ Presence task error: {e}')
+
+    def _queue_write(self, user_id, is_online, now):
+        self._dirty[user_id] = (is_online, now)
+        self._last_written[user_id] = now
+
+    def connect(self, user_id):
+        """A socket of the user connected; returns True if the user came online"""
+        user_id = int(user_id)
+        now = datetime.now()
+        with self._lock:
+            if self._offline_at.pop(user_id, None) is not None:
+                self._stats['reconnects_absorbed'] += 1
+        came_online = self.backend.mark_online(user_id)
+        if came_online:
+            with self._lock:
+                self._queue_write(user_id, True, now)
+                self._stats['went_online'] += 1
+        if came_online and self.on_online:
+            self.on_online(user_id)
+        return came_online
+
+    def heartbeat(self, user_id):
+        """Refresh last_active, written at most once per resolution window"""
+        user_id = int(user_id)
+        now = datetime.now()
+        if not self.backend.is_online(user_id):
+            return
+        with self._lock:
+            last = self._last_written.get(user_id)
+            if last is None or (now - last).total_seconds() >= self.last_active_resolution:
+                self._queue_write(user_id, True, now)
+
+    def disconnect(self, user_id, reason='disconnect', grace=True):
+        """The user's last socket went away (or they logged out with grace=False)"""
+        user_id = int(user_id)
+        if not self.backend.is_online(user_id):
+            return False
+        if grace and self.grace_period > 0:
+            with self._lock:
+                self._offline_at.setdefault(user_id, time.monotonic() + self.grace_period)
+            return False
+        return self._go_offline(user_id, reason)
+
+    def _go_offline(self, user_id, reason, deadline=None):
+        with self._lock:
+            if deadline is not None and self._offline_at.get(user_id) != deadline:
+                return False  # reconnected during the grace period
+            self._offline_at.pop(user_id, None)
+        # After a grace period the user stays online if they reconnected to
+        # another worker meanwhile; the backend checks and removes atomically
+        if not self.backend.mark_offline(user_id, if_idle=deadline is not None):
+            return False
+        self._went_offline(user_id, reason)
+        return True
+
+    def _went_offline(self, user_id, reason):
+        with self._lock:
+            self._dirty[user_id] = (False, datetime.now())
+            self._last_written.pop(user_id, None)
+            self._stats['went_offline'] += 1
+        if self.on_offline:
+            self.on_offline(user_id, reason)
+
+    def expire(self, now=None):
+        """Take users whose grace period ran out offline"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [(user_id, deadline) for user_id, deadline in self._offline_at.items() if deadline <= now]
+        return [user_id for user_id, deadline in expired
+                if self._go_offline(user_id, 'disconnect', deadline)]
+
+    def sweep(self):
+        """Take users left online by a worker that died offline"""
+        lapsed = self.backend.sweep_offline()
+        for user_id in lapsed:
+            with self._lock:
+                self._offline_at.pop(user_id, None)
+            self._went_offline(user_id, 'expired')
+        return lapsed
+
+    def is_online(self, user_id):
+        return self.backend.is_online(user_id)
+
+    def online_among(self, user_ids):
+        return self.backend.online_among(user_ids)
+
+    def online_users(self):
+        return self.backend.online_users()
+
+    def flush(self):
+        """Write queued presence changes; returns how many users were updated"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+        try:
+            rows = 0
+            items = sorted(dirty.items())
+            with db_session() as db:
+                cursor = db.cursor()
+                for start in range(0, len(items), FLUSH_CHUNK):
+                    chunk = items[start:start + FLUSH_CHUNK]
+                    cases = ' '.join(['WHEN %s THEN %s'] * len(chunk))
+                    online_params = [v for user_id, (is_online, _) in chunk for v in (user_id, is_online)]
+                    active_params = [v for user_id, (_, last_active) in chunk for v in (user_id, last_active)]
+                    cursor.execute(f"""
+                        UPDATE users
+                        SET is_online = CASE id {cases} END,
+                            last_active = GREATEST(COALESCE(last_active, '1970-01-01'), CASE id {cases} END)
+                        WHERE id IN ({','.join(['%s'] * len(chunk))})
+                    """, online_params + active_params + [user_id for user_id, _ in chunk])
+                    rows += cursor.rowcount
+                db.commit()
+                cursor.close()
+            for user_id, _ in items:
+                user_cache.invalidate(user_id)
+            share_user_change('invalidate', user_ids=[user_id for user_id, _ in items])
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats['rows_written'] += rows
+            return rows
+        except Exception as e:
+            print(f"Error flushing presence: {e}")
+            with self._lock:
+                for user_id, change in dirty.items():
+                    self._dirty.setdefault(user_id, change)  # a newer change wins
+                self._stats['flush_failures'] += 1
+            return 0
+
+    def stats(self):
+        online = self.backend.online_count()
+        with self._lock:
+            return {
+                **self._stats,
+                'online': online,
+                'in_grace_period': len(self._offline_at),
+                'pending_writes': len(self._dirty),
+            }
+
+presence = PresenceRegistry(state_backend, **PRESENCE_CONFIG)
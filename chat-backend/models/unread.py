@@ -0,0 +1,253 @@
+from config import get_db
+
+# Materialized unread counters: one row per (user, chat) holding the unread
+# badge and the newest message id, maintained on every write so chat lists
+# never aggregate the messages table.
+
+def direct_chat_key(user_a, user_b):
+    """Chat key of a direct conversation, same format as the normalized socket chat_id"""
+    low, high = sorted((int(user_a), int(user_b)))
+    return f"{low}_{high}"
+
+def group_chat_key(group_id):
+    """Chat key of a group conversation, same format as the socket chat_id"""
+    return f"group_{group_id}"
+
+def bump_unread_counters(cursor, message_id, sender_id, receiver_id=None, group_id=None):
+    """Count a new message for its recipients (runs inside the insert transaction)"""
+    if group_id:
+        cursor.execute("""
+            INSERT INTO unread_counters (user_id, chat_key, unread_count, last_message_id)
+            SELECT user_id, %s, IF(user_id = %s, 0, 1), %s
+            FROM group_members WHERE group_id = %s
+            ON DUPLICATE KEY UPDATE
+                unread_count = unread_count + VALUES(unread_count),
+                last_message_id = GREATEST(last_message_id, VALUES(last_message_id))
+        """, (group_chat_key(group_id), sender_id, message_id, group_id))
+    else:
+        chat_key = direct_chat_key(sender_id, receiver_id)
+        cursor.execute("""
+            INSERT INTO unread_counters (user_id, chat_key, unread_count, last_message_id)
+            VALUES (%s, %s, 1, %s), (%s, %s, 0, %s)
+            ON DUPLICATE KEY UPDATE
+                unread_count = unread_count + VALUES(unread_count),
+                last_message_id = GREATEST(last_message_id, VALUES(last_message_id))
+        """, (receiver_id, chat_key, message_id, sender_id, chat_key, message_id))
+
+def ensure_unread_counter(cursor, user_id, chat_key, last_message_id=0):
+    """Create an empty counter row so a chat shows up in the user's chat list"""
+    cursor.execute("""
+        INSERT INTO unread_counters (user_id, chat_key, unread_count, last_message_id)
+        VALUES (%s, %s, 0, %s)
+        ON DUPLICATE KEY UPDATE user_id = user_id
+    """, (user_id, chat_key, last_message_id or 0))
+
+def consume_unread_counter(cursor, user_id, chat_key, count):
+    """Take `count` messages that just became read off a user's badge
+
+    Runs inside the transaction that marked them, so messages counted
+    meanwhile stay on the badge.
+    """
+    cursor.execute("""
+        UPDATE unread_counters SET unread_count = GREATEST(unread_count - %s, 0)
+        WHERE user_id = %s AND chat_key = %s
+    """, (count, user_id, chat_key))
+
+def forget_unread_message(cursor, message):
+    """Undo a deleted message in its chat's counters (inside the delete transaction)
+
+    Takes it off the badge of every recipient who had not read it yet and
+    points counters whose newest message it was at the chat's new newest one.
+    """
+    if message['group_id']:
+        chat_key = group_chat_key(message['group_id'])
+        cursor.execute("""
+            UPDATE unread_counters uc
+            JOIN group_members gm ON gm.group_id = %s AND gm.user_id = uc.user_id
+            SET uc.unread_count = GREATEST(uc.unread_count - 1, 0)
+            WHERE uc.chat_key = %s AND uc.user_id != %s
+              AND COALESCE(gm.last_read_message_id, 0) < %s
+        """, (message['group_id'], chat_key, message['sender_id'], message['id']))
+        cursor.execute("""
+            SELECT id FROM messages WHERE group_id = %s
+            ORDER BY timestamp DESC, id DESC LIMIT 1
+        """, (message['group_id'],))
+    else:
+        chat_key = direct_chat_key(message['sender_id'], message['receiver_id'])
+        if not message['is_read']:
+            cursor.execute("""
+                UPDATE unread_counters SET unread_count = GREATEST(unread_count - 1, 0)
+                WHERE user_id = %s AND chat_key = %s
+            """, (message['receiver_id'], chat_key))
+        cursor.execute("""
+            SELECT id FROM messages WHERE conversation_key = %s
+            ORDER BY timestamp DESC, id DESC LIMIT 1
+        """, (chat_key,))
+    newest = cursor.fetchone()
+    cursor.execute("""
+        UPDATE unread_counters SET last_message_id = %s
+        WHERE chat_key = %s AND last_message_id = %s
+    """, (newest[0] if newest else 0, chat_key, message['id']))
+
+def delete_unread_counters(chat_key, user_id=None):
+    """Drop counters for a chat (a whole group, or one member leaving it)"""
+    try:
+        db = get_db()
+        cursor = db.cursor()
+        if user_id is None:
+            cursor.execute("DELETE FROM unread_counters WHERE chat_key = %s", (chat_key,))
+        else:
+            cursor.execute("""
+                DELETE FROM unread_counters WHERE chat_key = %s AND user_id = %s
+            """, (chat_key, user_id))
+        db.commit()
+        cursor.close()
+        return True
+    except Exception as e:
+        print(f"Error deleting unread counters: {e}")
+        if 'cursor' in locals():
+            cursor.close()
+        return False
+
+def get_unread_counters(user_id):
+    """Get {chat_key: {'unread_count', 'last_message_id'}} for every chat of a user"""
+    try:
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT chat_key, unread_count, last_message_id
+            FROM unread_counters WHERE user_id = %s
+        """, (user_id,))
+        result = cursor.fetchall()
+        cursor.close()
+        return {row['chat_key']: row for row in result}
+    except Exception as e:
+        print(f"Error getting unread counters: {e}")
+        if 'cursor' in locals():
+            cursor.close()
+        return {}
+
+def encode_chat_cursor(counter):
+    """Opaque (last_message_id, chat_key) keyset cursor for the chat list"""
+    return f"{counter['last_message_id']}:{counter['chat_key']}"
+
+def decode_chat_cursor(cursor):
+    last_message_id, chat_key = cursor.split(':', 1)
+    return int(last_message_id), chat_key
+
+def is_valid_chat_cursor(cursor):
+    """True for a missing cursor or one decode_chat_cursor accepts"""
+    if cursor is None:
+        return True
+    try:
+        decode_chat_cursor(cursor)
+        return True
+    except (AttributeError, TypeError, ValueError):
+        return False
+
+def get_chat_page(user_id, limit=50, cursor=None):
+    """Get a page of a user's conversations, most recently active first
+
+    Reads unread_counters through idx_user_activity and joins only the last
+    message of each chat for the preview, so the cost is O(page) regardless of
+    how many users or messages exist. A malformed cursor raises ValueError and
+    database errors are raised too, so a failure never looks like the end of
+    the list.
+    """
+    try:
+        db = get_db()
+        db_cursor = db.cursor(dictionary=True)
+        
+        query = """
+            SELECT uc.chat_key, uc.unread_count, uc.last_message_id,
+                   m.content as last_message,
+                   m.timestamp as last_message_time,
+                   m.sender_id as last_message_sender_id
+            FROM unread_counters uc
+            LEFT JOIN messages m ON m.id = uc.last_message_id
+            WHERE uc.user_id = %s
+        """
+        params = [user_id]
+        if cursor:
+            last_message_id, chat_key = decode_chat_cursor(cursor)
+            query += """
+              AND (uc.last_message_id < %s
+                   OR (uc.last_message_id = %s AND uc.chat_key < %s))
+            """
+            params += [last_message_id, last_message_id, chat_key]
+        query += " ORDER BY uc.last_message_id DESC, uc.chat_key DESC LIMIT %s"
+        params.append(limit + 1)
+        
+        db_cursor.execute(query, params)
+        rows = db_cursor.fetchall()
+        db_cursor.close()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            'chats': rows,
+            'has_more': has_more,
+            'next_cursor': encode_chat_cursor(rows[-1]) if has_more else None
+        }
+        
+    except Exception as e:
+        print(f"Error getting chat page: {e}")
+        if 'db_cursor' in locals():
+            db_cursor.close()
+        raise
+
+def rebuild_unread_counters():
+    """Recompute every counter from messages and group read cursors (repair tool)"""
+    try:
+        db = get_db()
+        cursor = db.cursor()
+        db.start_transaction()
+        cursor.execute("DELETE FROM unread_counters")
+
+        # Direct chats: receiver side carries the unread count
+        cursor.execute("""
+            INSERT INTO unread_counters (user_id, chat_key, unread_count, last_message_id)
+            SELECT receiver_id, conversation_key, SUM(is_read = FALSE), MAX(id)
+            FROM messages
+            WHERE group_id IS NULL
+            GROUP BY receiver_id, conversation_key
+        """)
+
+        # Direct chats: sender side only tracks the newest message
+        cursor.execute("""
+            INSERT INTO unread_counters (user_id, chat_key, unread_count, last_message_id)
+            SELECT sender_id, conversation_key, 0, MAX(id)
+            FROM messages
+            WHERE group_id IS NULL
+            GROUP BY sender_id, conversation_key
+            ON DUPLICATE KEY UPDATE
+                last_message_id = GREATEST(last_message_id, VALUES(last_message_id))
+        """)
+
+        # Groups: messages from others past each member's read cursor
+        cursor.execute("""
+            INSERT INTO unread_counters (user_id, chat_key, unread_count, last_message_id)
+            SELECT gm.user_id, CONCAT('group_', gm.group_id),
+                   COALESCE(SUM(m.sender_id != gm.user_id
+                                AND m.id > COALESCE(gm.last_read_message_id, 0)), 0),
+                   COALESCE(MAX(m.id), 0)
+            FROM group_members gm
+            LEFT JOIN messages m ON m.group_id = gm.group_id
+            GROUP BY gm.user_id, gm.group_id
+        """)
+
+        cursor.execute("SELECT COUNT(*) FROM unread_counters")
+        rows = cursor.fetchone()[0]
+        db.commit()
+        cursor.close()
+        return rows
+
+    except Exception as e:
+        print(f"Error rebuilding unread counters: {e}")
+        try:
+            db.rollback()
+        except:
+            pass
+        if 'cursor' in locals():
+            cursor.close()
+        return None
@@ -1,6 +1,92 @@
-from config import get_db
+from config import get_db, state_backend, USER_CACHE_CONFIG
+from models.group import membership_index
+from models.user_search import user_search_index
+from collections import OrderedDict
 from datetime import datetime
 import os
+import threading
+import time
+
+class UserCache:
+    """Size-bounded LRU cache of user rows (without password) with a TTL
+
+    Keys are normalized to int, so a client-supplied '5' and an
+    invalidate(5) from a write path refer to the same entry.
+    """
+
+    def __init__(self, max_size=10000, ttl=60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._rows = OrderedDict()  # {user_id: (expires_at, row)}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, user_id):
+        user_id = int(user_id)
+        with self._lock:
+            entry = self._rows.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._rows[user_id]
+                self._stats['misses'] += 1
+                return None
+            self._rows.move_to_end(user_id)
+            self._stats['hits'] += 1
+            return dict(entry[1])
+
+    def put(self, user_id, row):
+        user_id = int(user_id)
+        row = {key: value for key, value in row.items() if key != 'password'}
+        with self._lock:
+            self._rows[user_id] = (time.monotonic() + self.ttl, row)
+            self._rows.move_to_end(user_id)
+            while len(self._rows) > self.max_size:
+                self._rows.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, user_id):
+        user_id = int(user_id)
+        with self._lock:
+            if self._rows.pop(user_id, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['size'] = len(self._rows)
+            snapshot['max_size'] = self.max_size
+        lookups = snapshot['hits'] + snapshot['misses']
+        snapshot['hit_ratio'] = round(snapshot['hits'] / lookups, 4) if lookups else 0.0
+        return snapshot
+
+user_cache = UserCache(**USER_CACHE_CONFIG)
+
+def get_user_cache_stats():
+    """Hit/miss counters for sizing the user cache"""
+    return user_cache.stats()
+
+def share_user_change(op, **fields):
+    """Tell the other workers to apply a user change to their cache and search index"""
+    state_backend.publish('users', dict(fields, op=op), local=False)
+
+def _apply_user_change(event):
+    user_ids = event.get('user_ids') or [event['user_id']]
+    for user_id in user_ids:
+        user_cache.invalidate(user_id)
+    if event['op'] == 'add':
+        user_search_index.add(event['user_id'], event['name'], event['username'])
+    elif event['op'] == 'update':
+        user_search_index.update(event['user_id'], name=event.get('name'),
+                                 profile_picture=event.get('profile_picture'))
+    elif event['op'] == 'remove':
+        membership_index.drop_user(event['user_id'])
+        user_search_index.remove(event['user_id'])
+
+state_backend.subscribe('users', _apply_user_change)
 
 def update_user_profile(user_id, name=None, email=None, phone=None, profile_picture=None):
     """Update user profile with provided fields"""
@@ -36,6 +122,9 @@ def update_user_profile(user_id, name=None, email=None, phone=None, profile_pict
         
         db.commit()
         cursor.close()
+        user_cache.invalidate(user_id)
+        user_search_index.update(user_id, name=name, profile_picture=profile_picture)
+        share_user_change('update', user_id=user_id, name=name, profile_picture=profile_picture)
         return True
         
     except Exception as e:
@@ -75,14 +164,24 @@ def get_user_by_email(email):
         return None
 
 def get_user_by_id(user_id):
-    """Get user by ID"""
+    """Get user by ID (served from the user cache, never includes the password)"""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
     try:
         db = get_db()
         cursor = db.cursor(dictionary=True)
         cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
         result = cursor.fetchone()
         cursor.close()
-        return result
+        if result is None:
+            return None
+        user_cache.put(user_id, result)
+        return {key: value for key, value in result.items() if key != 'password'}
     except Exception as e:
         print(f"Error fetching user by ID: {e}")
         if 'cursor' in locals():
@@ -127,8 +226,11 @@ def create_user(name, username, email, password, phone=None):
         values = (name, username, email, password, phone)
         
         cursor.execute(query, values)
+        user_id = cursor.lastrowid
         db.commit()
         cursor.close()
+        user_search_index.add(user_id, name, username)
+        share_user_change('add', user_id=user_id, name=name, username=username)
         
         return True
         
@@ -156,6 +258,8 @@ def update_user_online_status(user_id, is_online, socket_id=None):
         
         db.commit()
         cursor.close()
+        user_cache.invalidate(user_id)
+        share_user_change('invalidate', user_id=user_id)
         return True
         
     except Exception as e:
@@ -175,7 +279,7 @@ def get_users_by_ids(user_ids):
         
         placeholders = ','.join(['%s'] * len(user_ids))
         cursor.execute(f"""
-            SELECT id, name, username, profile_picture, is_online
+            SELECT id, name, username, profile_picture, is_online, last_active
             FROM users 
             WHERE id IN ({placeholders})
         """, user_ids)
@@ -191,38 +295,12 @@ def get_users_by_ids(user_ids):
         return []
 
 def search_users(search_term, exclude_user_id=None):
-    """Search users by name or username"""
+    """Search users by name or username prefix (served from the in-process index)"""
     try:
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
-        
-        search_pattern = f"%{search_term}%"
-        
-        if exclude_user_id:
-            cursor.execute("""
-                SELECT id, name, username, profile_picture
-                FROM users 
-                WHERE (name LIKE %s OR username LIKE %s) AND id != %s
-                ORDER BY name ASC
-                LIMIT 20
-            """, (search_pattern, search_pattern, exclude_user_id))
-        else:
-            cursor.execute("""
-                SELECT id, name, username, profile_picture
-                FROM users 
-                WHERE name LIKE %s OR username LIKE %s
-                ORDER BY name ASC
-                LIMIT 20
-            """, (search_pattern, search_pattern))
-        
-        result = cursor.fetchall()
-        cursor.close()
-        return result
-        
+        exclude_ids = {exclude_user_id} if exclude_user_id else set()
+        return user_search_index.search(search_term, exclude_ids=exclude_ids, limit=20)
     except Exception as e:
         print(f"Error searching users: {e}")
-        if 'cursor' in locals():
-            cursor.close()
         return []
 
 def delete_user(user_id):
@@ -236,6 +314,10 @@ def delete_user(user_id):
         
         db.commit()
         cursor.close()
+        user_cache.invalidate(user_id)
+        membership_index.drop_user(user_id)
+        user_search_index.remove(user_id)
+        share_user_change('remove', user_id=user_id)
         return True
         
     except Exception as e:
@@ -0,0 +1,151 @@
+from config import get_db
+from bisect import bisect_left, insort
+import heapq
+import re
+import threading
+
+def _tokens(*values):
+    """Lower-cased words of a name/username used as prefix keys"""
+    tokens = set()
+    for value in values:
+        if value:
+            value = value.lower()
+            tokens.add(value)
+            tokens.update(re.findall(r"\w+", value))
+    return tokens
+
+class UserSearchIndex:
+    """In-process prefix index over usernames and display names for typeahead
+
+    Keeps a sorted list of (token, user_id) pairs so every word prefix lookup is
+    a bisect plus a contiguous scan. Loaded from the users table on first use and
+    updated incrementally by create_user, update_user_profile and delete_user.
+    """
+
+    def __init__(self):
+        self._entries = []   # sorted [(token, user_id)]
+        self._users = {}     # {user_id: {'id', 'name', 'username', 'profile_picture'}}
+        self._user_tokens = {}  # {user_id: set(tokens)}
+        self._by_name = []   # sorted [(lower-cased name, user_id)] for result ordering
+        self._loaded = False
+        self._loading = 0    # loads reading the users table right now
+        self._missed = []    # [(method, args)] changes made while a load was reading
+        self._lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            self._loading += 1
+        try:
+            db = get_db()
+            cursor = db.cursor(dictionary=True)
+            cursor.execute("SELECT id, name, username, profile_picture FROM users")
+            rows = cursor.fetchall()
+            cursor.close()
+        except Exception:
+            with self._lock:
+                self._loading -= 1
+                if not self._loading:
+                    self._missed = []  # the next load reads them from the table
+            raise
+        with self._lock:
+            self._loading -= 1
+            if self._loaded:
+                return
+            for row in rows:
+                self._users[row['id']] = row
+                self._user_tokens[row['id']] = _tokens(row['name'], row['username'])
+            self._entries = sorted(
+                (token, user_id) for user_id, tokens in self._user_tokens.items() for token in tokens
+            )
+            self._by_name = sorted((row['name'].lower(), row['id']) for row in rows)
+            self._loaded = True
+            # The read may predate changes made while it ran; replay them in order
+            missed, self._missed = self._missed, []
+            for method, args in missed:
+                getattr(self, method)(*args)
+
+    def _index(self, user):
+        insort(self._by_name, (user['name'].lower(), user['id']))
+        self._user_tokens[user['id']] = _tokens(user['name'], user['username'])
+        for token in self._user_tokens[user['id']]:
+            insort(self._entries, (token, user['id']))
+
+    def _unindex(self, user):
+        position = bisect_left(self._by_name, (user['name'].lower(), user['id']))
+        if position < len(self._by_name) and self._by_name[position][1] == user['id']:
+            del self._by_name[position]
+        for token in self._user_tokens.pop(user['id'], ()):
+            position = bisect_left(self._entries, (token, user['id']))
+            if position < len(self._entries) and self._entries[position] == (token, user['id']):
+                del self._entries[position]
+
+    def add(self, user_id, name, username, profile_picture=None):
+        with self._lock:
+            if not self._loaded:
+                if self._loading:
+                    self._missed.append(('add', (user_id, name, username, profile_picture)))
+                return
+            self.remove(user_id)
+            user = {'id': user_id, 'name': name, 'username': username, 'profile_picture': profile_picture}
+            self._users[user_id] = user
+            self._index(user)
+
+    def update(self, user_id, name=None, profile_picture=None):
+        with self._lock:
+            if not self._loaded:
+                if self._loading:
+                    self._missed.append(('update', (user_id, name, profile_picture)))
+                return
+            user = self._users.get(user_id)
+            if user is None:
+                return
+            self.add(user_id, name or user['name'], user['username'],
+                     profile_picture or user['profile_picture'])
+
+    def remove(self, user_id):
+        with self._lock:
+            if not self._loaded and self._loading:
+                self._missed.append(('remove', (user_id,)))
+            user = self._users.pop(user_id, None)
+            if user is not None:
+                self._unindex(user)
+
+    def _prefix_range(self, prefix):
+        """Slice bounds of the entries whose token starts with prefix"""
+        return (bisect_left(self._entries, (prefix,)),
+                bisect_left(self._entries, (prefix + '\uffff',)))
+
+    def search(self, search_term, exclude_ids=(), limit=20):
+        """Users whose name or username has a word starting with every query word"""
+        self._ensure_loaded()
+        words = set(re.findall(r"\w+", search_term.lower()))
+        exclude_ids = set(exclude_ids)
+
+        with self._lock:
+            if not words:
+                # Empty query (e.g. the add-member dialog opening): first users by name
+                results = []
+                for _, user_id in self._by_name:
+                    if user_id not in exclude_ids:
+                        results.append(dict(self._users[user_id]))
+                        if len(results) >= limit:
+                            break
+                return results
+
+            # Scan the smallest prefix range, check the other words per candidate
+            ranges = {word: self._prefix_range(word) for word in words}
+            narrowest = min(words, key=lambda word: ranges[word][1] - ranges[word][0])
+            start, end = ranges[narrowest]
+            others = words - {narrowest}
+            candidates = [self._users[user_id] for user_id in {user_id for _, user_id in self._entries[start:end]}
+                          if user_id not in exclude_ids and self._matches(user_id, others)]
+
+        return [dict(user) for user in heapq.nsmallest(limit, candidates, key=lambda user: user['name'].lower())]
+
+    def _matches(self, user_id, words):
+        tokens = self._user_tokens[user_id]
+        return all(any(token.startswith(word) for token in tokens) for word in words)
+
+user_search_index = UserSearchIndex()
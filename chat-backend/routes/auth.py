@@ -1,6 +1,8 @@
 # backend/routes/auth.py - ADDED LOGOUT ENDPOINT
 from flask import Blueprint, request, jsonify
-from models.user import get_user_by_username, create_user, get_user_by_email, update_user_online_status
+from models.user import get_user_by_username, create_user, get_user_by_email
+from models.presence import presence
+from async_mode import run_blocking
 import bcrypt
 
 auth_bp = Blueprint('auth', __name__)
@@ -26,7 +28,7 @@ def signup():
             return jsonify({'success': False, 'message': 'Email already exists'}), 400
             
         # Hash password
-        hashed_pw = bcrypt.hashpw(data['password'].encode(), bcrypt.gensalt())
+        hashed_pw = run_blocking(bcrypt.hashpw, data['password'].encode(), bcrypt.gensalt())
         
         # Create user
         success = create_user(
@@ -56,9 +58,9 @@ def login():
             
         user = get_user_by_username(data['username'])
         
-        if user and bcrypt.checkpw(data['password'].encode(), user['password'].encode()):
-            # ✅ Update user to online status on login
-            update_user_online_status(user['id'], True)
+        if user and run_blocking(bcrypt.checkpw, data['password'].encode(), user['password'].encode()):
+            # Online status follows the socket the client opens next, so a
+            # login that never connects does not leave the user online
             return jsonify({'success': True, 'token': str(user['id'])})
         
         return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
@@ -77,14 +79,10 @@ def logout():
         if not user_id:
             return jsonify({'success': False, 'message': 'User ID required'}), 400
         
-        # Update user to offline status
-        success = update_user_online_status(user_id, False)
-        
-        if success:
-            print(f"🚪 User {user_id} logged out - status set to offline")
-            return jsonify({'success': True, 'message': 'Logged out successfully'})
-        else:
-            return jsonify({'success': False, 'message': 'Failed to update logout status'}), 500
+        # Update user to offline status (persisted in the next presence flush)
+        presence.disconnect(user_id, reason='logout', grace=False)
+        print(f"🚪 User {user_id} logged out - status set to offline")
+        return jsonify({'success': True, 'message': 'Logged out successfully'})
         
     except Exception as e:
         print(f"Logout error: {e}")
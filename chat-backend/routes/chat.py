@@ -1,14 +1,40 @@
 from flask import Blueprint, request, jsonify
-from models.message import get_messages, save_message, mark_messages_as_read
+from models.message import (
+    MESSAGE_PAGE_SIZE, SEARCH_PAGE_SIZE, get_message_page, save_message, mark_messages_as_read,
+    search_messages, is_valid_message_cursor
+)
 
 chat_bp = Blueprint('chat', __name__)
 
+def paging_info(page):
+    """Cursor metadata returned next to a page of messages"""
+    return {
+        'before': page['before'],
+        'after': page['after'],
+        'has_more': page['has_more']
+    }
+
+def invalid_cursor_response(before, after):
+    """400 response if a before/after paging cursor is malformed, else None"""
+    if is_valid_message_cursor(before) and is_valid_message_cursor(after):
+        return None
+    return jsonify({'success': False, 'message': 'Invalid paging cursor'}), 400
+
 @chat_bp.route('/messages', methods=['POST'])
 def fetch_messages():
     try:
         data = request.json
-        messages = get_messages(data['sender_id'], data['receiver_id'])
-        return jsonify({'success': True, 'data': messages})
+        invalid = invalid_cursor_response(data.get('before'), data.get('after'))
+        if invalid:
+            return invalid
+        page = get_message_page(
+            data['sender_id'],
+            data['receiver_id'],
+            limit=data.get('limit', MESSAGE_PAGE_SIZE),
+            before=data.get('before'),
+            after=data.get('after')
+        )
+        return jsonify({'success': True, 'data': page['messages'], 'paging': paging_info(page)})
     except Exception as e:
         print(f"Fetch messages error: {e}")
         return jsonify({'success': False, 'message': 'Failed to fetch messages'}), 500
@@ -18,8 +44,17 @@ def get_chat_messages(chat_id):
     try:
         user_ids = chat_id.split('_')
         if len(user_ids) == 2:
-            messages = get_messages(int(user_ids[0]), int(user_ids[1]))
-            return jsonify({'success': True, 'data': messages})
+            invalid = invalid_cursor_response(request.args.get('before'), request.args.get('after'))
+            if invalid:
+                return invalid
+            page = get_message_page(
+                int(user_ids[0]),
+                int(user_ids[1]),
+                limit=request.args.get('limit', MESSAGE_PAGE_SIZE),
+                before=request.args.get('before'),
+                after=request.args.get('after')
+            )
+            return jsonify({'success': True, 'data': page['messages'], 'paging': paging_info(page)})
         return jsonify({'success': False, 'message': 'Invalid chat ID'}), 400
     except Exception as e:
         print(f"Chat messages error: {e}")
@@ -69,4 +104,24 @@ def mark_messages_read():
         })
     except Exception as e:
         print(f"Mark read error: {e}")
-        return jsonify({'success': False, 'message': 'Failed to mark messages as read'}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'message': 'Failed to mark messages as read'}), 500
+
+@chat_bp.route('/search', methods=['GET'])
+def search_chat_messages():
+    try:
+        user_id = request.args.get('user_id', type=int)
+        search_term = request.args.get('q', '').strip()
+        if not user_id or not search_term:
+            return jsonify({'success': False, 'message': 'user_id and q are required'}), 400
+        
+        limit = max(1, min(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), 100))
+        offset = max(0, request.args.get('offset', 0, type=int))
+        results = search_messages(user_id, search_term, limit=limit, offset=offset)
+        return jsonify({
+            'success': True,
+            'data': results['messages'],
+            'paging': {'has_more': results['has_more'], 'next_offset': results['next_offset']}
+        })
+    except Exception as e:
+        print(f"Search messages error: {e}")
+        return jsonify({'success': False, 'message': 'Failed to search messages'}), 500
@@ -4,7 +4,9 @@ from models.group import (
     add_group_member, remove_group_member, get_group_by_id,
     search_users_for_group
 )
-from models.message import get_messages, mark_group_messages_as_read
+from models.message import MESSAGE_PAGE_SIZE, get_message_page, mark_group_messages_as_read
+from routes.chat import paging_info, invalid_cursor_response
+from sockets.chat_socket import sync_group_notify_room
 
 group_bp = Blueprint('group', __name__)
 
@@ -20,6 +22,7 @@ def create_new_group():
         )
         
         if group_id:
+            sync_group_notify_room(group_id, data['created_by'], True)
             return jsonify({'success': True, 'group_id': group_id})
         else:
             return jsonify({'success': False, 'message': 'Failed to create group'}), 500
@@ -49,8 +52,16 @@ def get_group_member_list(group_id):
 @group_bp.route('/<group_id>/messages', methods=['GET'])
 def get_group_messages(group_id):
     try:
-        messages = get_messages(group_id=int(group_id))
-        return jsonify({'success': True, 'data': messages})
+        invalid = invalid_cursor_response(request.args.get('before'), request.args.get('after'))
+        if invalid:
+            return invalid
+        page = get_message_page(
+            group_id=int(group_id),
+            limit=request.args.get('limit', MESSAGE_PAGE_SIZE),
+            before=request.args.get('before'),
+            after=request.args.get('after')
+        )
+        return jsonify({'success': True, 'data': page['messages'], 'paging': paging_info(page)})
     except Exception as e:
         print(f"Get group messages error: {e}")
         return jsonify({'success': False, 'message': 'Failed to get messages'}), 500
@@ -66,6 +77,7 @@ def add_member_to_group(group_id):
         )
         
         if success:
+            sync_group_notify_room(int(group_id), data['user_id'], True)
             return jsonify({'success': True, 'message': 'Member added successfully'})
         else:
             return jsonify({'success': False, 'message': 'Failed to add member'}), 400
@@ -85,6 +97,7 @@ def remove_member_from_group(group_id):
         )
         
         if success:
+            sync_group_notify_room(int(group_id), data['user_id'], False)
             return jsonify({'success': True, 'message': 'Member removed successfully'})
         else:
             return jsonify({'success': False, 'message': 'Failed to remove member'}), 400
@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify, current_app
-from models.user import get_user_by_id, get_all_users_except, update_user_profile
-from models.message import get_unread_count
-from models.group import get_user_groups
+from models.user import get_user_by_id, get_users_by_ids, search_users, update_user_profile
+from models.group import get_user_groups_by_ids
+from models.unread import get_chat_page, is_valid_chat_cursor
+from datetime import datetime
 import os
 import base64
 import uuid
@@ -10,6 +11,8 @@ from werkzeug.utils import secure_filename
 user_bp = Blueprint('user', __name__)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+CHAT_PAGE_SIZE = 50
+MAX_CHAT_PAGE_SIZE = 200
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -89,78 +92,110 @@ def update_profile(user_id):
         print(f"Update profile error: {e}")
         return jsonify({'success': False, 'message': 'Failed to update profile'}), 500
 
+def format_last_seen(user_data):
+    """Human readable presence text for a chat list entry"""
+    if user_data.get('is_online'):
+        return 'Online'
+    if not user_data.get('last_active'):
+        return 'Offline'
+    
+    now = datetime.now()
+    if isinstance(user_data['last_active'], str):
+        try:
+            last_active = datetime.strptime(user_data['last_active'], '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            last_active = datetime.strptime(user_data['last_active'][:19], '%Y-%m-%d %H:%M:%S')
+    else:
+        last_active = user_data['last_active']
+    
+    diff = now - last_active
+    if diff.days > 0:
+        return f"Last seen {diff.days} days ago"
+    elif diff.seconds > 3600:
+        hours = diff.seconds // 3600
+        return f"Last seen {hours} hours ago"
+    elif diff.seconds > 60:
+        minutes = diff.seconds // 60
+        return f"Last seen {minutes} minutes ago"
+    return "Last seen just now"
+
 @user_bp.route('/chats/<user_id>', methods=['GET'])
 def get_user_chats(user_id):
+    """Chats the user actually has, most recently active first, paginated by cursor"""
     try:
+        user_id = int(user_id)
+        try:
+            limit = int(request.args.get('limit', CHAT_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'success': False, 'message': 'limit must be an integer'}), 400
+        limit = max(1, min(limit, MAX_CHAT_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        if not is_valid_chat_cursor(cursor):
+            return jsonify({'success': False, 'message': 'Invalid paging cursor'}), 400
+        
         # Get current user's info first
-        current_user = get_user_by_id(int(user_id))
+        current_user = get_user_by_id(user_id)
         
-        # Get direct chats
-        users = get_all_users_except(int(user_id))
-        unread_counts = get_unread_count(int(user_id))
+        page = get_chat_page(user_id, limit=limit, cursor=cursor)
         
-        # Get group chats
-        groups = get_user_groups(int(user_id))
+        # Resolve only the users and groups that appear on this page
+        other_user_ids = []
+        group_ids = []
+        for entry in page['chats']:
+            if entry['chat_key'].startswith('group_'):
+                group_ids.append(int(entry['chat_key'].split('_')[1]))
+            else:
+                low, high = (int(x) for x in entry['chat_key'].split('_'))
+                other_user_ids.append(high if low == user_id else low)
+        users = {u['id']: u for u in get_users_by_ids(other_user_ids)}
+        groups = {g['id']: g for g in get_user_groups_by_ids(user_id, group_ids)}
         
         chats = []
-        
-        # Add direct chats
-        for user_data in users:
-            online_status = user_data.get('is_online', False) or user_data.get('status') == 'online'
-            status_text = 'Online' if online_status else 'Offline'
-            
-            if not online_status and user_data.get('last_active'):
-                from datetime import datetime
-                now = datetime.now()
-                if isinstance(user_data['last_active'], str):
-                    try:
-                        last_active = datetime.strptime(user_data['last_active'], '%Y-%m-%d %H:%M:%S')
-                    except ValueError:
-                        last_active = datetime.strptime(user_data['last_active'][:19], '%Y-%m-%d %H:%M:%S')
-                else:
-                    last_active = user_data['last_active']
-                
-                diff = now - last_active
-                if diff.days > 0:
-                    status_text = f"Last seen {diff.days} days ago"
-                elif diff.seconds > 3600:
-                    hours = diff.seconds // 3600
-                    status_text = f"Last seen {hours} hours ago"
-                elif diff.seconds > 60:
-                    minutes = diff.seconds // 60
-                    status_text = f"Last seen {minutes} minutes ago"
-                else:
-                    status_text = "Last seen just now"
+        for entry in page['chats']:
+            preview = {
+                'unread_count': entry['unread_count'],
+                'last_message': entry.get('last_message'),
+                'last_message_time': str(entry['last_message_time']) if entry.get('last_message_time') else None,
+                'last_message_sender_id': entry.get('last_message_sender_id')
+            }
             
-            chats.append({
-                'id': f"{user_id}_{user_data['id']}",
-                'type': 'direct',
-                'user': user_data['name'],
-                'username': user_data['username'],
-                'user_id': user_data['id'],
-                'profile_picture': user_data.get('profile_picture'),
-                'online': online_status,
-                'status': status_text,
-                'unread_count': unread_counts.get(user_data['id'], 0)
-            })
-        
-        # Add group chats
-        for group in groups:
-            chats.append({
-                'id': f"group_{group['id']}",
-                'type': 'group',
-                'user': group['name'],
-                'description': group.get('description', ''),
-                'group_id': group['id'],
-                'profile_picture': group.get('group_picture'),
-                'member_count': group.get('member_count', 0),
-                'role': group.get('role', 'member'),
-                'unread_count': group.get('unread_count', 0)
-            })
+            if entry['chat_key'].startswith('group_'):
+                group = groups.get(int(entry['chat_key'].split('_')[1]))
+                if not group:
+                    continue
+                chats.append({
+                    'id': f"group_{group['id']}",
+                    'type': 'group',
+                    'user': group['name'],
+                    'description': group.get('description', ''),
+                    'group_id': group['id'],
+                    'profile_picture': group.get('group_picture'),
+                    'member_count': group.get('member_count', 0),
+                    'role': group.get('role', 'member'),
+                    **preview
+                })
+            else:
+                low, high = (int(x) for x in entry['chat_key'].split('_'))
+                user_data = users.get(high if low == user_id else low)
+                if not user_data:
+                    continue
+                chats.append({
+                    'id': f"{user_id}_{user_data['id']}",
+                    'type': 'direct',
+                    'user': user_data['name'],
+                    'username': user_data['username'],
+                    'user_id': user_data['id'],
+                    'profile_picture': user_data.get('profile_picture'),
+                    'online': bool(user_data.get('is_online')),
+                    'status': format_last_seen(user_data),
+                    **preview
+                })
         
         # Add current user info for header display
         response_data = {
             'chats': chats,
+            'next_cursor': page['next_cursor'],
+            'has_more': page['has_more'],
             'current_user': {
                 'id': current_user['id'],
                 'name': current_user['name'],
@@ -172,4 +207,16 @@ def get_user_chats(user_id):
         return jsonify({'success': True, 'data': response_data})
     except Exception as e:
         print(f"Chats error: {e}")
-        return jsonify({'success': False, 'message': 'Failed to get chats'}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'message': 'Failed to get chats'}), 500
+
+@user_bp.route('/search', methods=['GET'])
+def search_user_directory():
+    """Find people to start a new conversation with"""
+    try:
+        search_term = request.args.get('search', '')
+        exclude_user_id = request.args.get('user_id', type=int)
+        users = search_users(search_term, exclude_user_id) if search_term else []
+        return jsonify({'success': True, 'data': users})
+    except Exception as e:
+        print(f"Search users error: {e}")
+        return jsonify({'success': False, 'message': 'Failed to search users'}), 500
@@ -0,0 +1,122 @@
+import random
+import threading
+import time
+from sockets.db_executor import LatencyHistogram
+
+
+class TokenBucketLimiter:
+    """Token bucket per key (client IP or user id): `rate` per second, up to `burst`
+
+    Only keys seen recently are kept; when there are more than `max_keys`,
+    the buckets that have refilled completely (idle keys) are dropped.
+    """
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}  # {key: (tokens, updated_at)}
+        self._lock = threading.Lock()
+
+    def take(self, key, now=None):
+        """Spend one token; returns 0 if allowed, else seconds until a token is available"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed = True
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed = False
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return 0 if allowed else (1 - tokens) / self.rate
+
+    def _prune(self, now):
+        full_after = self.burst / self.rate
+        for key in [key for key, (_, updated_at) in self._buckets.items() if now - updated_at >= full_after]:
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class ConnectAdmission:
+    """Admission control for Socket.IO connects, so reconnect storms queue instead of stampeding
+
+    A connect is refused if its client IP or user is over their token
+    bucket, or if `max_concurrent` connects are already being handled and
+    no slot frees up within `queue_timeout` seconds. A refused client gets
+    a retry_after hint: the wait its bucket needs (if any) plus a random
+    share of `retry_jitter` seconds, so the clients refused together come
+    back spread out instead of as the next wave.
+    """
+
+    def __init__(self, enabled=True, ip_rate=5.0, ip_burst=20, user_rate=1.0, user_burst=5,
+                 max_concurrent=50, queue_timeout=2.0, retry_jitter=10.0):
+        self.enabled = enabled
+        self.ip_limiter = TokenBucketLimiter(ip_rate, ip_burst)
+        self.user_limiter = TokenBucketLimiter(user_rate, user_burst)
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self.retry_jitter = retry_jitter
+
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._in_progress = 0
+        self._stats = {'admitted': 0, 'refused_ip': 0, 'refused_user': 0, 'refused_busy': 0,
+                       'queued': 0, 'peak_in_progress': 0}
+        self._wait = LatencyHistogram()
+        self._handling = LatencyHistogram()
+
+    def _refuse(self, reason, wait=0.0):
+        with self._lock:
+            self._stats[reason] += 1
+        return round(wait + random.uniform(0, self.retry_jitter), 2)
+
+    def admit(self, ip, user_id):
+        """Returns None and holds a slot if the connect may proceed, else a retry_after hint (seconds)"""
+        if not self.enabled:
+            return None
+        wait = self.ip_limiter.take(ip) if ip else 0
+        if wait:
+            return self._refuse('refused_ip', wait)
+        wait = self.user_limiter.take(user_id) if user_id is not None else 0
+        if wait:
+            return self._refuse('refused_user', wait)
+
+        started = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['queued'] += 1
+            if not self._slots.acquire(timeout=self.queue_timeout):
+                return self._refuse('refused_busy')
+        with self._lock:
+            self._wait.record((time.monotonic() - started) * 1000)
+            self._in_progress += 1
+            self._stats['admitted'] += 1
+            self._stats['peak_in_progress'] = max(self._stats['peak_in_progress'], self._in_progress)
+        return None
+
+    def release(self, started_at):
+        """End an admitted connect (started_at is its time.monotonic() start)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._in_progress -= 1
+            self._handling.record((time.monotonic() - started_at) * 1000)
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                'enabled': self.enabled,
+                'in_progress': self._in_progress,
+                'tracked_ips': len(self.ip_limiter),
+                'tracked_users': len(self.user_limiter),
+                'queue_wait_ms': self._wait.snapshot(),
+                'connect_ms': self._handling.snapshot(),
+            }
@@ -1,47 +1,119 @@
 # backend/sockets/chat_socket.py - ENHANCED WITH LOGOUT HANDLER
-from flask_socketio import emit, join_room, leave_room, disconnect
+from flask_socketio import emit, join_room, leave_room, disconnect, ConnectionRefusedError
 from flask import request
-from models.message import save_message, mark_messages_as_read, get_message_by_id, mark_group_messages_as_read
-from models.user import update_user_online_status, get_user_by_id
-from models.group import get_group_members, is_user_group_member
+from models.message import create_message, mark_messages_as_read, mark_group_messages_as_read
+from models.user import get_user_by_id
+from models.presence import presence
+from models.group import get_user_group_ids, is_user_group_member
+from models.unread import get_unread_counters
+from sockets.typing import TypingScheduler
+from sockets.presence_fanout import PresenceSubscriptions
+from sockets.db_executor import SocketDBExecutor
+from sockets.session_registry import SessionRegistry
+from sockets.admission import ConnectAdmission
+from config import (state_backend, PRESENCE_FANOUT_CONFIG, SOCKET_EXECUTOR_CONFIG,
+                    CONNECT_ADMISSION_CONFIG, TRUST_FORWARDED_FOR, TRUSTED_PROXIES)
 import time
-from threading import Timer
 
-# Store user sessions and state
-active_users = {}  # {socket_id: user_id}
-user_sockets = {}  # {user_id: [socket_ids]}
-user_rooms = {}    # {user_id: [room_ids]}
-typing_users = {}  # {room_id: {user_id: timestamp}}
-typing_timers = {} # {room_id: {user_id: Timer}}
+# Sockets connected to this worker; the state backend knows the sockets of every worker
+sessions = SessionRegistry()
+admission = ConnectAdmission(**CONNECT_ADMISSION_CONFIG)
+typing_scheduler = None  # TypingScheduler owning {room_id: {user_id: deadline}}, set by socketio_init
+presence_subscriptions = None  # PresenceSubscriptions (who watches whose presence), set by socketio_init
+db_executor = None  # SocketDBExecutor running the handlers' database work, set by socketio_init
+
+def group_notify_room(group_id):
+    """Room joined by the personal sockets of every member of a group"""
+    return f"group_notify_{group_id}"
+
+def sync_group_notify_room(group_id, user_id, is_member):
+    """Add or remove all of a user's connected sockets to a group's notify room
+
+    Called from REST routes when membership changes. The user's sockets may be
+    connected to any worker, so every worker updates its own sockets.
+    """
+    state_backend.publish('group_notify', {'group_id': group_id, 'user_id': user_id, 'is_member': is_member})
+
+def client_ip():
+    """Address of the client of the current request, None if only proxies are known
+
+    With TRUST_FORWARDED_FOR the direct peer is the proxy that set
+    X-Forwarded-For, and the chain is walked from the nearest hop to the
+    first address that is not a trusted proxy (the leftmost entries are
+    whatever the client chose to send).
+    """
+    addresses = request.access_route if TRUST_FORWARDED_FOR else [request.remote_addr]
+    for ip in reversed(addresses):
+        if ip and ip not in TRUSTED_PROXIES:
+            return ip
+    return None
+
+def direct_chat_partner(chat_id, user_id):
+    """Other participant of a direct chat id, or None for groups and malformed ids"""
+    if chat_id.startswith('group_'):
+        return None
+    user_ids = [int(x) for x in chat_id.split('_') if x.isdigit()]
+    if len(user_ids) != 2 or user_id not in user_ids:
+        return None
+    return user_ids[0] if user_ids[1] == user_id else user_ids[1]
+
+def presence_snapshot(user_ids):
+    """Current state of some users, in the same shape as a presence diff"""
+    snapshot = {'online': [], 'offline': []}
+    user_ids = list(user_ids)
+    online = presence.online_among(user_ids)
+    for user_id in user_ids:
+        snapshot['online' if user_id in online else 'offline'].append(user_id)
+    return snapshot
+
+def get_db_executor_stats():
+    """Queue depths, shedding counters and latency histograms of the socket DB executor"""
+    return db_executor.stats() if db_executor else {}
 
 def socketio_init(socketio):
     """Initialize all socket event handlers"""
+    global typing_scheduler, presence_subscriptions, db_executor
+    
+    db_executor = SocketDBExecutor(**SOCKET_EXECUTOR_CONFIG)
+    db_executor.start(socketio)
     
     @socketio.on('connect')
     def handle_connect(auth):
-        """Handle new socket connection"""
+        """Handle new socket connection (refused with a retry hint during connect storms)"""
+        token = auth.get('token') if auth else None
+        user_id = int(token) if token and str(token).isdigit() else None
+        started_at = time.monotonic()
+        retry_after = admission.admit(client_ip(), user_id)
+        if retry_after is not None:
+            raise ConnectionRefusedError('Server busy, retry later', {'retry_after': retry_after})
+        try:
+            accept_connection(user_id)
+        finally:
+            admission.release(started_at)
+
+    def accept_connection(user_id):
         print(f'🔌 Client connected: {request.sid}')
         try:
-            token = auth.get('token') if auth else None
-            if token:
-                user_id = int(token)
-                
+            if user_id:
                 # Store user session
-                active_users[request.sid] = user_id
-                if user_id not in user_sockets:
-                    user_sockets[user_id] = []
-                if request.sid not in user_sockets[user_id]:
-                    user_sockets[user_id].append(request.sid)
-                
-                # Update online status IMMEDIATELY
-                update_user_online_status(user_id, True)
+                sessions.add(request.sid, user_id)
+                state_backend.add_socket(user_id, request.sid)
                 
                 # Join user to their personal room for notifications
                 join_room(f"user_{user_id}")
+
+                # Join the notify room of every group so group messages fan out with one emit
+                for group_id in get_user_group_ids(user_id):
+                    join_room(group_notify_room(group_id))
                 
-                # ✅ FIXED: Emit online status to ALL users immediately
-                online_data = {'user_id': user_id, 'timestamp': time.time()}
-                socketio.emit('user_online', online_data)
+                # Presence registry records a transition only if the user was offline
+                presence.connect(user_id)
+                
+                # Watch the presence of everyone in the user's chat list and
+                # send this socket the current state of all watched users
+                contacts = [direct_chat_partner(chat_key, user_id) for chat_key in get_unread_counters(user_id)]
+                presence_subscriptions.subscribe(user_id, [c for c in contacts if c], 'contacts')
+                emit('presence_diff', presence_snapshot(presence_subscriptions.watched(user_id)))
                 
                 print(f'✅ User {user_id} connected with socket {request.sid}')
                 
@@ -56,28 +128,22 @@ def socketio_init(socketio):
         """Handle socket disconnection"""
         print(f'🔌 Client disconnected: {request.sid}')
         try:
-            if request.sid in active_users:
-                user_id = active_users[request.sid]
-                
-                # Clean up typing timers for this user
-                cleanup_user_typing(user_id)
-                
-                # Remove from active sessions
-                del active_users[request.sid]
-                if user_id in user_sockets and request.sid in user_sockets[user_id]:
-                    user_sockets[user_id].remove(request.sid)
-                    if not user_sockets[user_id]:  # No more active sessions
-                        del user_sockets[user_id]
-                        # Update offline status IMMEDIATELY
-                        update_user_online_status(user_id, False)
-                        # ✅ FIXED: Emit offline status to ALL users immediately
-                        offline_data = {'user_id': user_id, 'timestamp': time.time()}
-                        socketio.emit('user_offline', offline_data)
-                        print(f'🔴 User {user_id} went offline (disconnect)')
+            # Remove from active sessions (with the socket's rooms)
+            rooms = sessions.rooms_of(request.sid)
+            user_id, remaining = sessions.remove(request.sid)
+            if user_id is not None:
+                if remaining == 0:  # No more sessions on this worker
+                    cleanup_user_typing(user_id)
+                    presence_subscriptions.drop_watcher(user_id)
+                else:
+                    # Other devices of the user may still be typing elsewhere
+                    for chat_id in rooms:
+                        cleanup_typing_for_room(chat_id, user_id)
                 
-                # Clean up user rooms
-                if user_id in user_rooms:
-                    del user_rooms[user_id]
+                if state_backend.remove_socket(user_id, request.sid) == 0:
+                    # Goes offline after the grace period unless the user reconnects
+                    presence.disconnect(user_id)
+                    print(f'🟡 User {user_id} has no sockets left (disconnect)')
                 
                 print(f'✅ User {user_id} disconnected')
                 
@@ -90,7 +156,7 @@ def socketio_init(socketio):
         """Handle user logout event"""
         try:
             user_id = data.get('user_id')
-            socket_user_id = active_users.get(request.sid)
+            socket_user_id = sessions.user_of(request.sid)
             
             print(f'🚪 Logout event received for user {user_id}')
             
@@ -99,28 +165,11 @@ def socketio_init(socketio):
                 # Clean up typing timers for this user
                 cleanup_user_typing(user_id)
                 
-                # Update database status to offline IMMEDIATELY
-                update_user_online_status(user_id, False)
-                
-                # Emit offline status to ALL users
-                offline_data = {'user_id': user_id, 'timestamp': time.time(), 'reason': 'logout'}
-                socketio.emit('user_offline', offline_data)
+                # Logout skips the reconnect grace period
+                presence.disconnect(user_id, reason='logout', grace=False)
                 
-                # Clean up user sessions
-                if user_id in user_sockets:
-                    # Get all sockets for this user
-                    user_socket_list = user_sockets[user_id].copy()
-                    
-                    # Remove all sockets for this user
-                    for socket_id in user_socket_list:
-                        if socket_id in active_users:
-                            del active_users[socket_id]
-                    
-                    del user_sockets[user_id]
-                
-                # Clean up user rooms
-                if user_id in user_rooms:
-                    del user_rooms[user_id]
+                # Clean up user sessions on every worker
+                state_backend.publish('logout', {'user_id': user_id})
                 
                 print(f'🔴 User {user_id} logged out successfully - status set to offline')
                 
@@ -138,7 +187,7 @@ def socketio_init(socketio):
         """Handle user joining a chat room"""
         try:
             chat_id = data['chat_id']
-            user_id = active_users.get(request.sid)
+            user_id = sessions.user_of(request.sid)
             
             if not user_id:
                 emit('error', {'message': 'User not authenticated'})
@@ -174,11 +223,15 @@ def socketio_init(socketio):
             # Join the room
             join_room(chat_id)
             
-            # Track user rooms
-            if user_id not in user_rooms:
-                user_rooms[user_id] = []
-            if chat_id not in user_rooms[user_id]:
-                user_rooms[user_id].append(chat_id)
+            # Track the socket's rooms
+            sessions.join(request.sid, chat_id)
+            
+            # An open direct chat shows the partner's presence
+            partner_id = direct_chat_partner(chat_id, user_id)
+            if partner_id:
+                added = presence_subscriptions.subscribe(user_id, [partner_id], 'chat')
+                if added:
+                    emit('presence_diff', presence_snapshot(added))
             
             print(f'✅ User {user_id} successfully joined room: {chat_id}')
             
@@ -194,16 +247,19 @@ def socketio_init(socketio):
         """Handle user leaving a chat room"""
         try:
             chat_id = data['chat_id']
-            user_id = active_users.get(request.sid)
+            user_id = sessions.user_of(request.sid)
             
             leave_room(chat_id)
             
             # Clean up typing status when leaving
             cleanup_typing_for_room(chat_id, user_id)
             
-            # Remove from user rooms tracking
-            if user_id and user_id in user_rooms and chat_id in user_rooms[user_id]:
-                user_rooms[user_id].remove(chat_id)
+            # Remove from the socket's rooms
+            sessions.leave(request.sid, chat_id)
+            
+            partner_id = direct_chat_partner(chat_id, user_id) if user_id else None
+            if partner_id:
+                presence_subscriptions.unsubscribe(user_id, 'chat', [partner_id])
             
             print(f'🚪 User {user_id} left room: {chat_id}')
             
@@ -212,9 +268,10 @@ def socketio_init(socketio):
 
     @socketio.on('send_message')
     def handle_send_message(data):
-        """Handle sending messages"""
+        """Handle sending messages (stored and fanned out by the DB executor)"""
         try:
-            user_id = active_users.get(request.sid)
+            sid = request.sid
+            user_id = sessions.user_of(sid)
             if not user_id:
                 emit('error', {'message': 'User not authenticated'})
                 return
@@ -223,6 +280,14 @@ def socketio_init(socketio):
                 emit('error', {'message': 'Message content cannot be empty'})
                 return
 
+            db_executor.submit('send_message', lambda: send_message(sid, user_id, data), key=sid,
+                               on_reject=lambda: socketio.emit('error', {'message': 'Server busy, message not sent'}, to=sid))
+        except Exception as e:
+            print(f"❌ Send message error: {e}")
+            emit('error', {'message': str(e)})
+
+    def send_message(sid, user_id, data):
+        try:
             chat_id = data['chat_id']
 
             # Normalize direct chat ID
@@ -232,29 +297,26 @@ def socketio_init(socketio):
                     user_ids.sort()
                     chat_id = f"{user_ids[0]}_{user_ids[1]}"
 
-            # Save the message
+            # Save the message; the inserted row comes back fully populated
             if data.get('group_id'):
-                message_id = save_message(
+                message_data = create_message(
                     sender_id=data['sender_id'],
                     content=data['content'],
                     group_id=data['group_id']
                 )
             else:
-                message_id = save_message(
+                message_data = create_message(
                     sender_id=data['sender_id'],
                     receiver_id=data['receiver_id'],
                     content=data['content']
                 )
 
-            if not message_id:
-                emit('error', {'message': 'Failed to save message'})
-                return
-
-            message_data = get_message_by_id(message_id)
             if not message_data:
-                emit('error', {'message': 'Failed to retrieve message'})
+                socketio.emit('error', {'message': 'Failed to save message'}, to=sid)
                 return
 
+            message_id = message_data['id']
+
             message_payload = {
                 'id': message_data['id'],
                 'sender_id': message_data['sender_id'],
@@ -285,12 +347,11 @@ def socketio_init(socketio):
             }
 
             if message_data.get('group_id'):
-                # Group chat notifications
-                members = get_group_members(message_data['group_id'])
-                for member in members:
-                    if member['id'] != user_id:
-                        socketio.emit('new_message_notification', notification_payload, room=f"user_{member['id']}")
-                        print(f'📢 Sent group notification to user {member["id"]}')
+                # Group chat notifications: serialized and emitted once for all members
+                socketio.emit('new_message_notification', notification_payload,
+                              room=group_notify_room(message_data['group_id']),
+                              skip_sid=sessions.sockets_of(user_id))
+                print(f'📢 Sent group notification to group {message_data["group_id"]}')
             else:
                 # Direct chat notifications for ChatList
                 receiver_id = message_data.get('receiver_id')
@@ -302,23 +363,29 @@ def socketio_init(socketio):
                     # Also send to sender for their own chat list update
                     socketio.emit('new_message_notification', notification_payload, room=f"user_{user_id}")
                     print(f'📢 Sent chat list update to sender {user_id}')
+                    
+                    # A first message turns the two users into contacts
+                    presence_subscriptions.subscribe(user_id, [receiver_id], 'contacts')
+                    state_backend.publish('contact_added', {'watcher_id': int(receiver_id), 'user_id': user_id})
 
             # Send delivery confirmation to sender
-            emit('message_delivered', {'message_id': message_id, 'chat_id': chat_id})
+            socketio.emit('message_delivered', {'message_id': message_id, 'chat_id': chat_id}, to=sid)
             print(f'✅ Message {message_id} sent successfully')
 
         except Exception as e:
             print(f"❌ Send message error: {e}")
-            emit('error', {'message': str(e)})
+            socketio.emit('error', {'message': str(e)}, to=sid)
 
     @socketio.on('mark_read')
     def handle_mark_read(data):
-        """Handle marking messages as read"""
+        """Handle marking messages as read (on the DB executor)"""
+        sid = request.sid
+        user_id = sessions.user_of(sid)
+        if user_id:
+            db_executor.submit('mark_read', lambda: mark_read(user_id, data), key=sid)
+
+    def mark_read(user_id, data):
         try:
-            user_id = active_users.get(request.sid)
-            if not user_id:
-                return
-            
             print(f"🔵 MARK READ EVENT: {data}")
             
             if data.get('group_id'):
@@ -328,17 +395,15 @@ def socketio_init(socketio):
                 
                 affected_count = mark_group_messages_as_read(data['group_id'], data['reader_id'])
                 
-                # Notify all group members
+                # Notify all group members except the reader
                 try:
-                    members = get_group_members(data['group_id'])
-                    for member in members:
-                        if member['id'] != data['reader_id']:
-                            socketio.emit('messages_read', {
-                                'reader_id': data['reader_id'],
-                                'group_id': data['group_id'],
-                                'count': affected_count,
-                                'type': 'group_read'
-                            }, room=f"user_{member['id']}")
+                    socketio.emit('messages_read', {
+                        'reader_id': data['reader_id'],
+                        'group_id': data['group_id'],
+                        'count': affected_count,
+                        'type': 'group_read'
+                    }, room=group_notify_room(data['group_id']),
+                       skip_sid=sessions.sockets_of(data['reader_id']))
                 except Exception as e:
                     print(f"❌ Error notifying group read status: {e}")
             else:
@@ -369,24 +434,11 @@ def socketio_init(socketio):
                     
                     print(f"🔵 SENDING BLUE TICK: {blue_tick_data}")
                     
-                    # Multiple delivery methods for blue tick
-                    # Method 1: Send to sender's personal room
+                    # Targeted delivery: every socket of the sender joins user_{id} on
+                    # connect, so one emit reaches each of their devices exactly once
                     socketio.emit('messages_read', blue_tick_data, room=f"user_{sender_id}")
                     print(f"🔵 Sent blue tick to user_{sender_id}")
                     
-                    # Method 2: Send to chat room
-                    socketio.emit('messages_read', blue_tick_data, room=chat_id)
-                    print(f"🔵 Sent blue tick to room {chat_id}")
-                    
-                    # Method 3: Send to all sender's active sockets directly
-                    if sender_id in user_sockets:
-                        for socket_id in user_sockets[sender_id]:
-                            socketio.emit('messages_read', blue_tick_data, room=socket_id)
-                            print(f"🔵 Sent blue tick to socket {socket_id}")
-                    
-                    # Method 4: Broadcast with sender filter (backup)
-                    socketio.emit('messages_read', blue_tick_data)
-                    
                     print(f'🔵 ✅ BLUE TICK SENT SUCCESSFULLY - {affected_count} messages marked read')
                 else:
                     print(f"🔵 ⚠️ No messages were marked as read")
@@ -396,14 +448,25 @@ def socketio_init(socketio):
 
     @socketio.on('typing')
     def handle_typing(data):
-        """Handle typing indicators"""
+        """Handle typing indicators (dropped first when the DB executor is overloaded)"""
+        try:
+            sid = request.sid
+            # Verify user is authenticated
+            if data.get('user_id') is None or data.get('user_id') != sessions.user_of(sid):
+                return
+            db_executor.submit('typing', lambda: update_typing(sid, data), key=sid)
+        except Exception as e:
+            print(f'❌ Error handling typing: {e}')
+
+    def update_typing(sid, data):
         try:
             chat_id = data['chat_id']
             user_id = data['user_id']
             is_typing = data['is_typing']
-            
-            # Verify user is authenticated
-            if user_id != active_users.get(request.sid):
+
+            # The socket disconnected while the job was queued; its typing
+            # state was already cleared and must not come back
+            if sessions.user_of(sid) != user_id:
                 return
             
             # For direct chats, normalize the chat_id
@@ -435,155 +498,142 @@ def socketio_init(socketio):
         except Exception as e:
             print(f'❌ Error handling typing: {e}')
 
-    # Optimized typing functions
-    def start_typing(chat_id, user_id):
-        """Start typing indicator for user in chat"""
+    # Typing indicators: one scheduler task expires every session
+    def emit_typing(chat_id, user_id, is_typing):
+        """Send one typing update to everyone in the chat except the typist"""
         try:
-            if chat_id not in typing_users:
-                typing_users[chat_id] = {}
-            if chat_id not in typing_timers:
-                typing_timers[chat_id] = {}
-            
-            # Cancel existing timer if any
-            if user_id in typing_timers.get(chat_id, {}):
-                typing_timers[chat_id][user_id].cancel()
-            
-            # Mark user as typing
-            typing_users[chat_id][user_id] = time.time()
-            
-            # Set auto-stop timer (3 seconds)
-            timer = Timer(3.0, lambda: stop_typing(chat_id, user_id))
-            typing_timers[chat_id][user_id] = timer
-            timer.start()
-            
-            # Emit typing status
             typing_event = {
                 'user_id': user_id,
-                'is_typing': True,
+                'is_typing': is_typing,
                 'chat_id': chat_id,
                 'timestamp': time.time()
             }
             
-            # Send to chat room (exclude sender)
-            socketio.emit('user_typing', typing_event, room=chat_id, include_self=False)
-            
-            # For direct chats, ensure delivery to both users
+            # Chat room plus, for direct chats, the other user's personal room;
+            # a room list is de-duplicated so each socket gets the event once
+            rooms = [chat_id]
             if not chat_id.startswith('group_'):
-                try:
-                    user_ids = [int(x) for x in chat_id.split('_') if x.isdigit()]
-                    for uid in user_ids:
-                        if uid != user_id:  # Don't send to self
-                            socketio.emit('user_typing', typing_event, room=f"user_{uid}")
-                except (ValueError, IndexError):
-                    pass
+                rooms += [f"user_{uid}" for uid in (int(x) for x in chat_id.split('_') if x.isdigit())
+                          if uid != user_id]
+            
+            socketio.emit('user_typing', typing_event, room=rooms,
+                          skip_sid=sessions.sockets_of(user_id))
             
         except Exception as e:
-            print(f'❌ Error starting typing: {e}')
+            print(f'❌ Error emitting typing status: {e}')
 
-    def stop_typing(chat_id, user_id):
-        """Stop typing indicator for user in chat"""
+    # Presence: transitions are batched into per-watcher presence_diff events.
+    # Each worker tracks the subscriptions of its own sockets and sends the
+    # diff to those sockets only, so a watcher connected to two workers still
+    # gets every diff once.
+    def emit_presence_diff(watcher_id, diff):
+        socket_ids = sessions.sockets_of(watcher_id)
+        if socket_ids:
+            socketio.emit('presence_diff', diff, room=socket_ids)
+
+    def record_user_online(user_id):
+        state_backend.publish('presence', {'user_id': user_id, 'online': True})
+        print(f'🟢 User {user_id} came online')
+
+    def record_user_offline(user_id, reason):
+        state_backend.publish('presence', {'user_id': user_id, 'online': False})
+        print(f'🔴 User {user_id} went offline ({reason})')
+
+    presence_subscriptions = PresenceSubscriptions(emit_presence_diff, **PRESENCE_FANOUT_CONFIG)
+    presence_subscriptions.start(socketio)
+    presence.set_listeners(record_user_online, record_user_offline)
+    presence.start(socketio)
+
+    # Events published by any worker (this one included) through the state backend
+    def on_presence_event(event):
+        presence_subscriptions.record(event['user_id'], event['online'])
+
+    def on_contact_added(event):
+        watcher_id = event['watcher_id']
+        if sessions.has_user(watcher_id):
+            added = presence_subscriptions.subscribe(watcher_id, [event['user_id']], 'contacts')
+            if added:
+                emit_presence_diff(watcher_id, presence_snapshot(added))
+
+    def on_group_notify(event):
+        # Runs outside any request context, so it goes through the server directly
+        room = group_notify_room(event['group_id'])
+        for socket_id in sessions.sockets_of(int(event['user_id'])):
+            if event['is_member']:
+                socketio.server.enter_room(socket_id, room, namespace='/')
+            else:
+                socketio.server.leave_room(socket_id, room, namespace='/')
+
+    def on_logout(event):
+        user_id = event['user_id']
+        cleanup_user_typing(user_id)
+        presence_subscriptions.drop_watcher(user_id)
+        for socket_id in sessions.remove_user(user_id):
+            state_backend.remove_socket(user_id, socket_id)
+
+    state_backend.subscribe('presence', on_presence_event)
+    state_backend.subscribe('contact_added', on_contact_added)
+    state_backend.subscribe('group_notify', on_group_notify)
+    state_backend.subscribe('logout', on_logout)
+
+    @socketio.on('subscribe_presence')
+    def handle_subscribe_presence(data):
+        """Watch extra users (e.g. a contact list screen); replies with their current state"""
         try:
-            # Remove from typing users
-            if chat_id in typing_users and user_id in typing_users[chat_id]:
-                del typing_users[chat_id][user_id]
-                if not typing_users[chat_id]:
-                    del typing_users[chat_id]
-            
-            # Cancel and remove timer
-            if chat_id in typing_timers and user_id in typing_timers[chat_id]:
-                typing_timers[chat_id][user_id].cancel()
-                del typing_timers[chat_id][user_id]
-                if not typing_timers[chat_id]:
-                    del typing_timers[chat_id]
-            
-            # Emit stop typing status
-            typing_event = {
-                'user_id': user_id,
-                'is_typing': False,
-                'chat_id': chat_id,
-                'timestamp': time.time()
-            }
-            
-            # Send to chat room (exclude sender)
-            socketio.emit('user_typing', typing_event, room=chat_id, include_self=False)
-            
-            # For direct chats, ensure delivery to both users
-            if not chat_id.startswith('group_'):
-                try:
-                    user_ids = [int(x) for x in chat_id.split('_') if x.isdigit()]
-                    for uid in user_ids:
-                        if uid != user_id:  # Don't send to self
-                            socketio.emit('user_typing', typing_event, room=f"user_{uid}")
-                except (ValueError, IndexError):
-                    pass
-            
+            user_id = sessions.user_of(request.sid)
+            if not user_id:
+                return
+            user_ids = [int(uid) for uid in data.get('user_ids', [])]
+            presence_subscriptions.subscribe(user_id, user_ids, 'client')
+            watched = presence_subscriptions.watched(user_id)
+            emit('presence_diff', presence_snapshot(
+                [uid for uid in user_ids if uid in watched]))
         except Exception as e:
-            print(f'❌ Error stopping typing: {e}')
+            print(f'❌ Presence subscribe error: {e}')
 
-    def cleanup_typing_for_room(chat_id, user_id):
-        """Clean up typing status for user in specific room"""
+    @socketio.on('unsubscribe_presence')
+    def handle_unsubscribe_presence(data):
+        """Stop watching users that were subscribed by the client"""
         try:
-            if user_id and chat_id in typing_users and user_id in typing_users[chat_id]:
-                del typing_users[chat_id][user_id]
-                if not typing_users[chat_id]:
-                    del typing_users[chat_id]
-            
-            if user_id and chat_id in typing_timers and user_id in typing_timers[chat_id]:
-                typing_timers[chat_id][user_id].cancel()
-                del typing_timers[chat_id][user_id]
-                if not typing_timers[chat_id]:
-                    del typing_timers[chat_id]
-            
-            # Emit stop typing
+            user_id = sessions.user_of(request.sid)
             if user_id:
-                typing_event = {
-                    'user_id': user_id,
-                    'is_typing': False,
-                    'chat_id': chat_id,
-                    'timestamp': time.time()
-                }
-                socketio.emit('user_typing', typing_event, room=chat_id, include_self=False)
-            
+                presence_subscriptions.unsubscribe(user_id, 'client', data.get('user_ids'))
         except Exception as e:
-            print(f'❌ Error cleaning up typing for room: {e}')
+            print(f'❌ Presence unsubscribe error: {e}')
+
+    typing_scheduler = TypingScheduler(
+        on_start=lambda chat_id, user_id: emit_typing(chat_id, user_id, True),
+        on_stop=lambda chat_id, user_id: emit_typing(chat_id, user_id, False)
+    )
+    typing_scheduler.start(socketio)
+
+    def start_typing(chat_id, user_id):
+        """Start or extend the typing indicator for user in chat"""
+        typing_scheduler.touch(chat_id, user_id)
+
+    def stop_typing(chat_id, user_id):
+        """Stop typing indicator for user in chat"""
+        typing_scheduler.stop(chat_id, user_id)
+
+    def cleanup_typing_for_room(chat_id, user_id):
+        """Clean up typing status for user in specific room"""
+        if user_id:
+            typing_scheduler.stop(chat_id, user_id)
 
     def cleanup_user_typing(user_id):
-        """Clean up all typing timers for a user"""
-        try:
-            # Clean up typing status
-            rooms_to_clean = []
-            for chat_id in list(typing_users.keys()):
-                if user_id in typing_users[chat_id]:
-                    rooms_to_clean.append(chat_id)
-            
-            for chat_id in rooms_to_clean:
-                stop_typing(chat_id, user_id)
-            
-            # Clean up timers
-            timer_rooms_to_clean = []
-            for chat_id in list(typing_timers.keys()):
-                if user_id in typing_timers[chat_id]:
-                    timer_rooms_to_clean.append(chat_id)
-            
-            for chat_id in timer_rooms_to_clean:
-                if user_id in typing_timers[chat_id]:
-                    typing_timers[chat_id][user_id].cancel()
-                    del typing_timers[chat_id][user_id]
-                    if not typing_timers[chat_id]:
-                        del typing_timers[chat_id]
-                        
-        except Exception as e:
-            print(f'❌ Error cleaning up user typing: {e}')
+        """Clean up all typing sessions for a user"""
+        typing_scheduler.stop_user(user_id)
 
     # New: Heartbeat for faster online/offline detection
     @socketio.on('heartbeat')
     def handle_heartbeat(data):
         """Handle client heartbeat for faster online status"""
         try:
-            user_id = active_users.get(request.sid)
+            user_id = sessions.user_of(request.sid)
             if user_id:
-                # Update last activity
-                update_user_online_status(user_id, True)
+                # Update last activity (written in the next presence flush); the
+                # refresh may be shed under load, the ack is always sent
+                db_executor.submit('heartbeat', lambda: presence.heartbeat(user_id))
                 emit('heartbeat_ack', {'timestamp': time.time()})
         except Exception as e:
             print(f'❌ Heartbeat error: {e}')
@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import deque
+from config import close_db
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open
+LATENCY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# priority: lower runs first. shed: dropped under load instead of rejected.
+# max_wait: seconds after which a queued job is no longer worth running.
+DEFAULT_POLICIES = {
+    'send_message': {'priority': 0, 'shed': False, 'max_wait': None},
+    'mark_read':    {'priority': 1, 'shed': False, 'max_wait': None},
+    'typing':       {'priority': 2, 'shed': True, 'max_wait': 2.0},
+    'heartbeat':    {'priority': 2, 'shed': True, 'max_wait': 30.0},
+}
+
+SCAN_LIMIT = 64  # queued jobs a worker looks past to find one whose socket is not busy
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (milliseconds)"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0
+        self.max = 0.0
+
+    def record(self, ms):
+        index = 0
+        while index < len(LATENCY_BUCKETS) and ms > LATENCY_BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += 1
+        self.max = max(self.max, ms)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples"""
+        if not self.total:
+            return 0.0
+        target, seen = fraction * self.total, 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                bound = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.max
+                return round(min(bound, self.max), 2)
+        return round(self.max, 2)
+
+    def snapshot(self):
+        labels = [f"<={bound}" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}"]
+        return {
+            'count': self.total,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': round(self.max, 2),
+            'buckets': {label: count for label, count in zip(labels, self.counts) if count},
+        }
+
+
+class SocketDBExecutor:
+    """Bounded worker pool for the database work of Socket.IO handlers
+
+    Handlers validate in memory, then submit the rest as a job. Each event
+    type has its own queue of at most `queue_limit` jobs; workers take jobs
+    in priority order. Jobs with the same key (the socket id) run one at a
+    time and in submission order, so a user's messages keep their order.
+    A full queue rejects new jobs. Sheddable events (typing, heartbeat) are
+    also dropped once `shed_threshold` jobs are waiting in total, and they
+    are skipped if they waited longer than their max_wait. Slow storage
+    therefore builds bounded queues and drops cheap events, instead of
+    piling up handler threads.
+    """
+
+    def __init__(self, workers=10, queue_limit=1000, shed_threshold=200, policies=None):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.shed_threshold = shed_threshold
+        self.policies = policies or DEFAULT_POLICIES
+        self._order = sorted(self.policies, key=lambda event: self.policies[event]['priority'])
+
+        self._queues = {event: deque() for event in self.policies}  # deque of (func, key, enqueued_at)
+        self._queued = 0
+        self._active_keys = set()
+        self._busy = 0
+        self._cond = threading.Condition()
+        self._runners = None
+        self._stats = {event: {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'shed': 0,
+                               'expired': 0, 'max_depth': 0} for event in self.policies}
+        self._wait = {event: LatencyHistogram() for event in self.policies}
+        self._run_time = {event: LatencyHistogram() for event in self.policies}
+
+    def start(self, socketio):
+        """Start the workers as Socket.IO background tasks"""
+        with self._cond:
+            if self._runners is None:
+                self._runners = [socketio.start_background_task(self._run) for _ in range(self.workers)]
+
+    def submit(self, event, func, key=None, on_reject=None):
+        """Queue func() for a worker; returns False if it was rejected or shed"""
+        policy = self.policies[event]
+        with self._cond:
+            stats = self._stats[event]
+            queue = self._queues[event]
+            if policy['shed'] and self._queued >= self.shed_threshold:
+                stats['shed'] += 1
+                return False
+            if len(queue) >= self.queue_limit:
+                stats['shed' if policy['shed'] else 'rejected'] += 1
+                rejected = not policy['shed']
+            else:
+                queue.append((func, key, time.monotonic()))
+                self._queued += 1
+                stats['submitted'] += 1
+                stats['max_depth'] = max(stats['max_depth'], len(queue))
+                self._cond.notify()
+                return True
+        if rejected and on_reject:
+            on_reject()
+        return False
+
+    def _take(self):
+        """Next runnable job by priority, skipping sockets that already have one running"""
+        now = time.monotonic()
+        for event in self._order:
+            queue = self._queues[event]
+            max_wait = self.policies[event]['max_wait']
+            index = 0
+            while index < min(len(queue), SCAN_LIMIT):
+                func, key, enqueued_at = queue[index]
+                if max_wait is not None and now - enqueued_at > max_wait:
+                    del queue[index]
+                    self._queued -= 1
+                    self._stats[event]['expired'] += 1
+                    continue
+                if key is not None and key in self._active_keys:
+                    index += 1
+                    continue
+                del queue[index]
+                self._queued -= 1
+                if key is not None:
+                    self._active_keys.add(key)
+                self._wait[event].record((now - enqueued_at) * 1000)
+                return event, func, key
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                job = self._take()
+                while job is None:
+                    self._cond.wait()
+                    job = self._take()
+                self._busy += 1
+            event, func, key = job
+            started = time.monotonic()
+            failed = False
+            try:
+                func()
+            except Exception as e:
+                failed = True
+                print(f'❌ {event} job failed: {e}')
+            finally:
+                close_db()  # jobs borrow a pooled connection through get_db()
+                with self._cond:
+                    self._busy -= 1
+                    self._active_keys.discard(key)
+                    self._stats[event]['failed' if failed else 'completed'] += 1
+                    self._run_time[event].record((time.monotonic() - started) * 1000)
+                    self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'busy': self._busy,
+                'queued': self._queued,
+                'events': {
+                    event: {
+                        **self._stats[event],
+                        'depth': len(self._queues[event]),
+                        'wait_ms': self._wait[event].snapshot(),
+                        'run_ms': self._run_time[event].snapshot(),
+                    }
+                    for event in self.policies
+                },
+            }
@@ -0,0 +1,127 @@
+import threading
+
+class PresenceSubscriptions:
+    """Delivers presence changes only to the users watching them, as periodic diffs
+
+    A watcher follows a user for one or more reasons ("sources"): a contact
+    from their chat list, an open direct chat, or an explicit client request.
+    The user stays watched until every source is gone. Transitions recorded
+    between two ticks are coalesced per user (online then offline again is
+    no change) and sent as one {'online': [...], 'offline': [...]} diff per
+    watcher, so presence traffic is proportional to contacts, not to all users.
+    """
+
+    def __init__(self, emit_diff, interval=1.0, max_watched=1000):
+        self.emit_diff = emit_diff  # emit_diff(watcher_id, {'online': [...], 'offline': [...]})
+        self.interval = interval
+        self.max_watched = max_watched
+
+        self.watchers = {}  # {user_id: set(watcher_ids)}
+        self.watching = {}  # {watcher_id: {user_id: set(sources)}}
+        self._changes = {}  # {user_id: (online before this tick, online now)}
+        self._lock = threading.Lock()
+        self._runner = None
+        self._stats = {'diffs_sent': 0, 'entries_sent': 0, 'changes_coalesced': 0}
+
+    def start(self, socketio):
+        """Send diffs every `interval` seconds from a Socket.IO background task"""
+        with self._lock:
+            if self._runner is None:
+                self._runner = socketio.start_background_task(self._run, socketio)
+
+    def _run(self, socketio):
+        while True:
+            socketio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f'❌ Presence fan-out error: {e}')
+
+    def subscribe(self, watcher_id, user_ids, source):
+        """Watch users for a reason; returns the users that were not watched before"""
+        added = []
+        with self._lock:
+            watched = self.watching.setdefault(watcher_id, {})
+            for user_id in user_ids:
+                user_id = int(user_id)
+                if user_id == watcher_id:
+                    continue
+                if user_id not in watched:
+                    if len(watched) >= self.max_watched:
+                        break
+                    watched[user_id] = set()
+                    self.watchers.setdefault(user_id, set()).add(watcher_id)
+                    added.append(user_id)
+                watched[user_id].add(source)
+        return added
+
+    def unsubscribe(self, watcher_id, source, user_ids=None):
+        """Drop one reason for watching (for all users if user_ids is None)"""
+        with self._lock:
+            watched = self.watching.get(watcher_id)
+            if not watched:
+                return
+            targets = list(watched) if user_ids is None else [int(user_id) for user_id in user_ids]
+            for user_id in targets:
+                sources = watched.get(user_id)
+                if sources is None:
+                    continue
+                sources.discard(source)
+                if not sources:
+                    self._unwatch(watcher_id, user_id)
+
+    def _unwatch(self, watcher_id, user_id):
+        del self.watching[watcher_id][user_id]
+        if not self.watching[watcher_id]:
+            del self.watching[watcher_id]
+        watchers = self.watchers.get(user_id)
+        if watchers is not None:
+            watchers.discard(watcher_id)
+            if not watchers:
+                del self.watchers[user_id]
+
+    def watched(self, watcher_id):
+        """Copy of the set of users a watcher follows"""
+        with self._lock:
+            return set(self.watching.get(watcher_id, ()))
+
+    def drop_watcher(self, watcher_id):
+        """Forget every subscription of a user (their last socket is gone)"""
+        with self._lock:
+            for user_id in list(self.watching.get(watcher_id, {})):
+                self._unwatch(watcher_id, user_id)
+
+    def record(self, user_id, online):
+        """Note a presence transition; delivered with the next diff"""
+        user_id = int(user_id)
+        with self._lock:
+            before, _ = self._changes.get(user_id, (not online, None))
+            self._changes[user_id] = (before, online)
+
+    def flush(self):
+        """Send one diff to every watcher of a user whose presence changed"""
+        with self._lock:
+            changes, self._changes = self._changes, {}
+            diffs = {}
+            for user_id, (before, online) in changes.items():
+                if before == online:
+                    self._stats['changes_coalesced'] += 1
+                    continue
+                key = 'online' if online else 'offline'
+                for watcher_id in self.watchers.get(user_id, ()):
+                    diffs.setdefault(watcher_id, {'online': [], 'offline': []})[key].append(user_id)
+            self._stats['diffs_sent'] += len(diffs)
+            self._stats['entries_sent'] += sum(len(d['online']) + len(d['offline']) for d in diffs.values())
+
+        for watcher_id, diff in diffs.items():
+            self.emit_diff(watcher_id, diff)
+        return len(diffs)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                'watchers': len(self.watching),
+                'watched_users': len(self.watchers),
+                'pending_changes': len(self._changes),
+            }
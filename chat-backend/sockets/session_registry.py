@@ -0,0 +1,78 @@
+import threading
+
+class SessionRegistry:
+    """Sockets connected to this worker: socket -> user, user -> sockets, socket -> rooms
+
+    Every lookup and update is a dict/set operation under one lock, so
+    connect and disconnect cost O(1) plus the socket's own rooms, and
+    concurrent handler threads never see a half-updated entry. Readers get
+    copies and can iterate them without holding the lock.
+    """
+
+    def __init__(self):
+        self._user_of = {}    # {socket_id: user_id}
+        self._sockets = {}    # {user_id: set(socket_ids)}
+        self._rooms = {}      # {socket_id: set(room_ids)} chat rooms joined explicitly
+        self._lock = threading.Lock()
+
+    def add(self, socket_id, user_id):
+        """Register a socket; returns how many sockets the user has on this worker"""
+        with self._lock:
+            self._user_of[socket_id] = user_id
+            sockets = self._sockets.setdefault(user_id, set())
+            sockets.add(socket_id)
+            return len(sockets)
+
+    def remove(self, socket_id):
+        """Forget a socket; returns (user_id, sockets the user has left) or (None, 0)"""
+        with self._lock:
+            user_id = self._user_of.pop(socket_id, None)
+            self._rooms.pop(socket_id, None)
+            if user_id is None:
+                return None, 0
+            sockets = self._sockets.get(user_id, set())
+            sockets.discard(socket_id)
+            if not sockets:
+                self._sockets.pop(user_id, None)
+            return user_id, len(sockets)
+
+    def remove_user(self, user_id):
+        """Forget every socket of a user (logout); returns their socket ids"""
+        with self._lock:
+            sockets = self._sockets.pop(user_id, set())
+            for socket_id in sockets:
+                self._user_of.pop(socket_id, None)
+                self._rooms.pop(socket_id, None)
+            return list(sockets)
+
+    def user_of(self, socket_id):
+        return self._user_of.get(socket_id)
+
+    def sockets_of(self, user_id):
+        with self._lock:
+            return list(self._sockets.get(user_id, ()))
+
+    def has_user(self, user_id):
+        return user_id in self._sockets
+
+    def join(self, socket_id, room):
+        with self._lock:
+            if socket_id in self._user_of:
+                self._rooms.setdefault(socket_id, set()).add(room)
+
+    def leave(self, socket_id, room):
+        with self._lock:
+            rooms = self._rooms.get(socket_id)
+            if rooms is not None:
+                rooms.discard(room)
+                if not rooms:
+                    del self._rooms[socket_id]
+
+    def rooms_of(self, socket_id):
+        with self._lock:
+            return set(self._rooms.get(socket_id, ()))
+
+    def stats(self):
+        with self._lock:
+            return {'sockets': len(self._user_of), 'users': len(self._sockets),
+                    'sockets_in_rooms': len(self._rooms)}
@@ -0,0 +1,94 @@
+import heapq
+import threading
+import time
+
+class TypingScheduler:
+    """Tracks typing deadlines for every (chat, user) with one background task
+
+    Replaces a threading.Timer per keystroke. Repeated typing events only push
+    the deadline back, so a typing session produces exactly one start and one
+    stop notification no matter how many keystrokes it contains.
+    """
+
+    def __init__(self, on_start, on_stop, timeout=3.0, tick=0.25):
+        self.on_start = on_start
+        self.on_stop = on_stop
+        self.timeout = timeout
+        self.tick = tick
+
+        self.typing_users = {}  # {chat_id: {user_id: deadline}}
+        self._user_chats = {}   # {user_id: set(chat_ids)} reverse index for stop_user
+        self._heap = []         # [(deadline, chat_id, user_id)], stale entries skipped lazily
+        self._lock = threading.Lock()
+        self._runner = None
+
+    def start(self, socketio):
+        """Start the expiry loop as a Socket.IO background task"""
+        with self._lock:
+            if self._runner is None:
+                self._runner = socketio.start_background_task(self._run, socketio)
+
+    def _run(self, socketio):
+        while True:
+            socketio.sleep(self.tick)
+            try:
+                self.expire()
+            except Exception as e:
+                print(f'❌ Typing scheduler error: {e}')
+
+    def touch(self, chat_id, user_id):
+        """Record a typing event; returns True only when a new session starts"""
+        deadline = time.monotonic() + self.timeout
+        with self._lock:
+            chat_typing = self.typing_users.setdefault(chat_id, {})
+            started = user_id not in chat_typing
+            chat_typing[user_id] = deadline
+            self._user_chats.setdefault(user_id, set()).add(chat_id)
+            heapq.heappush(self._heap, (deadline, chat_id, user_id))
+        if started:
+            self.on_start(chat_id, user_id)
+        return started
+
+    def stop(self, chat_id, user_id, notify=True):
+        """End a typing session; returns True if the user was typing"""
+        with self._lock:
+            chat_typing = self.typing_users.get(chat_id)
+            if not chat_typing or user_id not in chat_typing:
+                return False
+            self._forget(chat_id, user_id)
+        if notify:
+            self.on_stop(chat_id, user_id)
+        return True
+
+    def _forget(self, chat_id, user_id):
+        """Remove a session from both indexes (caller holds the lock)"""
+        chat_typing = self.typing_users[chat_id]
+        del chat_typing[user_id]
+        if not chat_typing:
+            del self.typing_users[chat_id]
+        chats = self._user_chats[user_id]
+        chats.discard(chat_id)
+        if not chats:
+            del self._user_chats[user_id]
+
+    def stop_user(self, user_id, notify=True):
+        """End every typing session of a user; returns the affected chat ids"""
+        with self._lock:
+            chat_ids = list(self._user_chats.get(user_id, ()))
+        return [chat_id for chat_id in chat_ids if self.stop(chat_id, user_id, notify)]
+
+    def expire(self, now=None):
+        """Stop every session whose deadline has passed"""
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, chat_id, user_id = heapq.heappop(self._heap)
+                # Skip entries superseded by a later keystroke or an explicit stop
+                chat_typing = self.typing_users.get(chat_id)
+                if chat_typing and chat_typing.get(user_id) == deadline:
+                    self._forget(chat_id, user_id)
+                    expired.append((chat_id, user_id))
+        for chat_id, user_id in expired:
+            self.on_stop(chat_id, user_id)
+        return expired
@@ -0,0 +1,344 @@
+import json
+import math
+import threading
+import time
+import uuid
+
+
+class LocalHub:
+    """State shared by every LocalStateBackend attached to it"""
+
+    def __init__(self):
+        self.sockets = {}  # {user_id: set(socket_ids)}
+        self.online = set()
+        self.nodes = []
+        self.lock = threading.Lock()
+
+
+class LocalStateBackend:
+    """In-process state backend, the default for a single worker
+
+    Several instances attached to the same LocalHub behave like worker
+    processes sharing one Redis: events published by one are delivered to
+    the others (payloads go through a JSON round trip, as they would on the
+    wire). This is how cross-worker behaviour is exercised without a server.
+    """
+
+    def __init__(self, hub=None):
+        self.hub = hub if hub is not None else LocalHub()
+        self.node_id = uuid.uuid4().hex
+        self._handlers = {}  # {channel: [handler(payload)]}
+        self._lock = threading.Lock()
+        self._stats = {'published': 0, 'received': 0, 'handler_errors': 0}
+        with self.hub.lock:
+            self.hub.nodes.append(self)
+
+    def start(self):
+        pass
+
+    # Sockets of every user across all workers
+    def add_socket(self, user_id, socket_id):
+        """Register a socket; returns how many sockets the user has now"""
+        with self.hub.lock:
+            sockets = self.hub.sockets.setdefault(int(user_id), set())
+            sockets.add(socket_id)
+            return len(sockets)
+
+    def remove_socket(self, user_id, socket_id):
+        """Forget a socket; returns how many sockets the user has left"""
+        user_id = int(user_id)
+        with self.hub.lock:
+            sockets = self.hub.sockets.get(user_id, set())
+            sockets.discard(socket_id)
+            if not sockets:
+                self.hub.sockets.pop(user_id, None)
+            return len(sockets)
+
+    def socket_count(self, user_id):
+        with self.hub.lock:
+            return len(self.hub.sockets.get(int(user_id), ()))
+
+    # Online users (including users in their grace period)
+    def mark_online(self, user_id):
+        """Returns True if the user was not online before"""
+        with self.hub.lock:
+            if int(user_id) in self.hub.online:
+                return False
+            self.hub.online.add(int(user_id))
+            return True
+
+    def mark_offline(self, user_id, if_idle=False):
+        """Returns True if the user was online before
+
+        With if_idle=True the user is only taken offline if they have no
+        socket left, checked in the same step as the removal.
+        """
+        user_id = int(user_id)
+        with self.hub.lock:
+            if user_id not in self.hub.online:
+                return False
+            if if_idle and self.hub.sockets.get(user_id):
+                return False
+            self.hub.online.discard(user_id)
+            return True
+
+    def sweep_offline(self, limit=1000):
+        """Users whose online entry lapsed, now taken offline (none in-process)"""
+        return []
+
+    def is_online(self, user_id):
+        return int(user_id) in self.hub.online
+
+    def online_among(self, user_ids):
+        """The subset of user_ids that is online"""
+        with self.hub.lock:
+            return {int(user_id) for user_id in user_ids if int(user_id) in self.hub.online}
+
+    def online_users(self):
+        with self.hub.lock:
+            return set(self.hub.online)
+
+    def online_count(self):
+        return len(self.hub.online)
+
+    # Events between workers
+    def subscribe(self, channel, handler):
+        with self._lock:
+            self._handlers.setdefault(channel, []).append(handler)
+
+    def publish(self, channel, payload, local=True):
+        """Deliver an event to every worker (only to the others with local=False)"""
+        with self._lock:
+            self._stats['published'] += 1
+        with self.hub.lock:
+            nodes = list(self.hub.nodes)
+        for node in nodes:
+            if node is self and not local:
+                continue
+            node._dispatch(channel, json.loads(json.dumps(payload)))
+
+    def _dispatch(self, channel, payload):
+        with self._lock:
+            handlers = list(self._handlers.get(channel, ()))
+            self._stats['received'] += 1
+        for handler in handlers:
+            try:
+                handler(payload)
+            except Exception as e:
+                print(f"❌ State event handler error ({channel}): {e}")
+                with self._lock:
+                    self._stats['handler_errors'] += 1
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        with self.hub.lock:
+            snapshot.update(backend='local', workers=len(self.hub.nodes),
+                            online=len(self.hub.online), users_with_sockets=len(self.hub.sockets))
+        return snapshot
+
+
+class RedisStateBackend(LocalStateBackend):
+    """State shared by all workers through Redis
+
+    Each user's sockets are a sorted set scored by expiry time, and so is the
+    online set. Every worker re-touches its own sockets and their users'
+    online entries every socket_ttl/3 seconds, so the sockets of a worker
+    that died stop counting after socket_ttl and its users drop out of the
+    online set; sweep_offline hands those users to exactly one worker so
+    their offline transition is still reported. Events travel over one
+    pub/sub channel; a listener thread hands them to the handlers and skips
+    the ones this worker published itself.
+    """
+
+    # KEYS: online; ARGV: user_id, now, expires
+    MARK_ONLINE = """
+        local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+        redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+        if score and tonumber(score) > tonumber(ARGV[2]) then return 0 end
+        return 1
+    """
+    # KEYS: online, user's sockets; ARGV: user_id, now, if_idle
+    MARK_OFFLINE = """
+        if ARGV[3] == '1' and redis.call('ZCOUNT', KEYS[2], ARGV[2], '+inf') > 0 then return 0 end
+        return redis.call('ZREM', KEYS[1], ARGV[1])
+    """
+    # KEYS: online; ARGV: now, limit
+    SWEEP_OFFLINE = """
+        local lapsed = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+        if #lapsed > 0 then redis.call('ZREM', KEYS[1], unpack(lapsed)) end
+        return lapsed
+    """
+
+    def __init__(self, url, prefix='chat', socket_ttl=90.0):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("STATE_BACKEND_URL points at Redis but the redis package "
+                               "is not installed (pip install redis)")
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.socket_ttl = socket_ttl
+        self.node_id = uuid.uuid4().hex
+        self._handlers = {}
+        self._owned = {}  # {user_id: set(socket_ids)} connected to this worker
+        self._lock = threading.Lock()
+        self._threads = None
+        self._stats = {'published': 0, 'received': 0, 'handler_errors': 0, 'listener_errors': 0}
+        self._mark_online = self.redis.register_script(self.MARK_ONLINE)
+        self._mark_offline = self.redis.register_script(self.MARK_OFFLINE)
+        self._sweep_offline = self.redis.register_script(self.SWEEP_OFFLINE)
+
+    def _key(self, *parts):
+        return ':'.join([self.prefix, *map(str, parts)])
+
+    def start(self):
+        """Start the event listener and the socket keepalive threads"""
+        with self._lock:
+            if self._threads is not None:
+                return
+            self._threads = [
+                threading.Thread(target=self._listen, name='state-events', daemon=True),
+                threading.Thread(target=self._keepalive, name='state-keepalive', daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._key('events'))
+                for message in pubsub.listen():
+                    event = json.loads(message['data'])
+                    if event['origin'] != self.node_id:
+                        self._dispatch(event['channel'], event['payload'])
+            except Exception as e:
+                print(f"❌ State event listener error, resubscribing: {e}")
+                with self._lock:
+                    self._stats['listener_errors'] += 1
+                time.sleep(1)
+
+    def _keepalive(self):
+        while True:
+            time.sleep(self.socket_ttl / 3)
+            with self._lock:
+                owned = {user_id: set(sockets) for user_id, sockets in self._owned.items()}
+            if not owned:
+                continue
+            try:
+                expires = time.time() + self.socket_ttl
+                pipe = self.redis.pipeline(transaction=False)
+                for user_id, sockets in owned.items():
+                    pipe.zadd(self._key('sockets', user_id), {socket_id: expires for socket_id in sockets})
+                    pipe.expire(self._key('sockets', user_id), math.ceil(self.socket_ttl))
+                pipe.zadd(self._key('online_until'), {user_id: expires for user_id in owned}, xx=True)
+                pipe.execute()
+            except Exception as e:
+                print(f"❌ Socket keepalive failed: {e}")
+
+    def add_socket(self, user_id, socket_id):
+        self.start()
+        user_id = int(user_id)
+        with self._lock:
+            self._owned.setdefault(user_id, set()).add(socket_id)
+        key, now = self._key('sockets', user_id), time.time()
+        pipe = self.redis.pipeline()
+        pipe.zremrangebyscore(key, '-inf', now)
+        pipe.zadd(key, {socket_id: now + self.socket_ttl})
+        pipe.expire(key, math.ceil(self.socket_ttl))
+        pipe.zcard(key)
+        return pipe.execute()[-1]
+
+    def remove_socket(self, user_id, socket_id):
+        user_id = int(user_id)
+        with self._lock:
+            sockets = self._owned.get(user_id)
+            if sockets is not None:
+                sockets.discard(socket_id)
+                if not sockets:
+                    del self._owned[user_id]
+        key = self._key('sockets', user_id)
+        pipe = self.redis.pipeline()
+        pipe.zrem(key, socket_id)
+        pipe.zremrangebyscore(key, '-inf', time.time())
+        pipe.zcard(key)
+        return pipe.execute()[-1]
+
+    def socket_count(self, user_id):
+        return self.redis.zcount(self._key('sockets', int(user_id)), time.time(), '+inf')
+
+    def mark_online(self, user_id):
+        user_id, now = int(user_id), time.time()
+        return self._mark_online(keys=[self._key('online_until')],
+                                 args=[user_id, now, now + self.socket_ttl]) == 1
+
+    def mark_offline(self, user_id, if_idle=False):
+        user_id = int(user_id)
+        return self._mark_offline(keys=[self._key('online_until'), self._key('sockets', user_id)],
+                                  args=[user_id, time.time(), 1 if if_idle else 0]) == 1
+
+    def sweep_offline(self, limit=1000):
+        """Take users whose online entry nobody refreshed for socket_ttl offline
+
+        Those are users of a worker that died (or whose grace timer was lost
+        with it). Each lapsed user is returned to exactly one caller.
+        """
+        lapsed = self._sweep_offline(keys=[self._key('online_until')], args=[time.time(), limit])
+        return [int(user_id) for user_id in lapsed]
+
+    def is_online(self, user_id):
+        score = self.redis.zscore(self._key('online_until'), int(user_id))
+        return score is not None and score > time.time()
+
+    def online_among(self, user_ids):
+        user_ids = [int(user_id) for user_id in user_ids]
+        if not user_ids:
+            return set()
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.zscore(self._key('online_until'), user_id)
+        return {user_id for user_id, score in zip(user_ids, pipe.execute())
+                if score is not None and score > now}
+
+    def online_users(self):
+        return {int(user_id) for user_id in self.redis.zrangebyscore(self._key('online_until'), time.time(), '+inf')}
+
+    def online_count(self):
+        return self.redis.zcount(self._key('online_until'), time.time(), '+inf')
+
+    def subscribe(self, channel, handler):
+        super().subscribe(channel, handler)
+        self.start()
+
+    def publish(self, channel, payload, local=True):
+        with self._lock:
+            self._stats['published'] += 1
+        if local:
+            self._dispatch(channel, payload)
+        try:
+            self.redis.publish(self._key('events'), json.dumps(
+                {'origin': self.node_id, 'channel': channel, 'payload': payload}))
+        except Exception as e:
+            print(f"❌ Failed to publish {channel} event: {e}")
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['local_users_with_sockets'] = len(self._owned)
+        snapshot['backend'] = 'redis'
+        try:
+            snapshot['online'] = self.online_count()
+        except Exception as e:
+            snapshot['error'] = str(e)
+        return snapshot
+
+
+def create_state_backend(url='local', prefix='chat', socket_ttl=90.0):
+    """Local backend for 'local' (one worker), Redis for a redis:// URL"""
+    if not url or url == 'local':
+        return LocalStateBackend()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStateBackend(url, prefix=prefix, socket_ttl=socket_ttl)
+    raise ValueError(f"Unsupported STATE_BACKEND_URL: {url}")
@@ -0,0 +1,301 @@
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+import mysql.connector
+
+
+class MessageWriteBehind:
+    """Write-behind queue that persists messages in multi-row batches
+
+    enqueue() assigns the message id from a block reserved in the database,
+    appends the row to an on-disk journal and returns immediately, so the
+    caller can fan the message out before it is stored. A background thread
+    hands the queued rows to `persist` whenever `batch_size` rows are waiting
+    or every `flush_interval` seconds, in one transaction per batch, and
+    reserves the next id block before the current one runs out.
+
+    Ids follow send time only within one process, so the queue must not be
+    used by more than one backend process (config.py refuses that).
+
+    Durability: a row is acknowledged only after it is in the journal. Journal
+    segments are deleted once their rows are committed, and segments left
+    behind by a crash are replayed on the next start (`persist` must skip ids
+    that are already stored). With journal_fsync off the journal survives a
+    process crash but not a host crash.
+
+    Backpressure: at most `max_pending` rows may be queued or in flight;
+    enqueue() waits up to `enqueue_timeout` seconds for room and then gives up.
+    """
+
+    def __init__(self, persist, reserve_ids, enabled=False, batch_size=200, flush_interval=0.05,
+                 max_pending=10000, enqueue_timeout=2.0, journal_dir='message_journal',
+                 journal_fsync=False, id_block=1000):
+        self.persist = persist            # persist(rows) -> rows stored; raises on failure
+        self.reserve_ids = reserve_ids    # reserve_ids(count) -> range of fresh message ids
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.enqueue_timeout = enqueue_timeout
+        self.journal_dir = journal_dir
+        self.journal_fsync = journal_fsync
+        self.id_block = id_block
+
+        self._pending = []        # rows waiting for the next batch
+        self._inflight = []       # rows handed to persist() and not yet committed
+        self._admitting = 0       # rows past the capacity check, still being journaled
+        self._unwritten = {}      # {message_id: key} of pending and in-flight rows
+        self._unwritten_keys = {} # {key: pending and in-flight rows}
+        self._segment = None      # open journal file for the rows in _pending
+        self._segment_path = None
+        self._retained = []       # journal segments of rows that failed to persist
+        self._segment_seq = 0
+        self._next_id = 0
+        self._end_id = 0
+        self._spare_ids = None    # next id block, reserved ahead by the flush thread
+        self._cond = threading.Condition()
+        self._id_lock = threading.Lock()       # id blocks; never held together with _cond
+        self._journal_lock = threading.Lock()  # journal appends and segment rotation; taken before _cond
+        self._flush_lock = threading.Lock()
+        self._runner = None
+        self._retry_delay = 0     # seconds to back off after a failed batch
+
+        self._stats = {
+            'enqueued': 0,
+            'rejected': 0,
+            'batches': 0,
+            'rows_written': 0,
+            'failed_batches': 0,
+            'dead_lettered': 0,
+            'recovered': 0,
+            'last_batch_size': 0,
+            'last_batch_ms': 0.0,
+        }
+
+    def start(self):
+        """Replay leftover journal segments and start the flush thread"""
+        with self._cond:
+            if self._runner is not None:
+                return
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self._recover()
+            self._runner = threading.Thread(target=self._run, name='message-write-behind', daemon=True)
+            self._runner.start()
+            atexit.register(self.close)
+
+    def _recover(self):
+        segments = sorted(name for name in os.listdir(self.journal_dir) if name.endswith('.jsonl')
+                          and name != 'dead_letter.jsonl')
+        rows = []
+        for name in segments:
+            with open(os.path.join(self.journal_dir, name)) as segment:
+                for line in segment:
+                    try:
+                        rows.append(self._decode(line))
+                    except ValueError:
+                        # Torn final line from a crash mid-write; it was never acknowledged
+                        continue
+        if rows:
+            stored = self.persist(rows)
+            self._stats['recovered'] += stored
+            print(f"✅ Recovered {stored} of {len(rows)} journaled messages")
+        for name in segments:
+            os.remove(os.path.join(self.journal_dir, name))
+
+    @staticmethod
+    def _decode(line):
+        row = json.loads(line)
+        for key in ('timestamp', 'delivered_at'):
+            if row.get(key):
+                row[key] = datetime.fromisoformat(row[key])
+        return row
+
+    def _journal(self, row):
+        if self._segment is None:
+            self._segment_seq += 1
+            self._segment_path = os.path.join(
+                self.journal_dir, f"segment-{time.time_ns()}-{self._segment_seq:06d}.jsonl")
+            self._segment = open(self._segment_path, 'a')
+        self._segment.write(json.dumps(row, default=str) + '\n')
+        self._segment.flush()
+        if self.journal_fsync:
+            os.fsync(self._segment.fileno())
+
+    def _allocate_id(self):
+        with self._id_lock:
+            if self._next_id >= self._end_id:
+                block, self._spare_ids = self._spare_ids or self.reserve_ids(self.id_block), None
+                self._next_id, self._end_id = block.start, block.stop
+            message_id = self._next_id
+            self._next_id += 1
+            return message_id
+
+    def _reserve_ahead(self):
+        """Reserve the next id block once a quarter of the current one is left"""
+        with self._id_lock:
+            if self._spare_ids is not None or not self._end_id \
+                    or self._end_id - self._next_id > self.id_block // 4:
+                return
+        block = self.reserve_ids(self.id_block)
+        with self._id_lock:
+            if self._spare_ids is None:
+                self._spare_ids = block
+
+    def enqueue(self, row, key=None):
+        """Queue a message row; returns its id, or None if the queue stayed full
+
+        `key` (e.g. the chat key) lets sync() wait for just this chat's rows.
+        """
+        self.start()
+        deadline = time.monotonic() + self.enqueue_timeout
+        with self._cond:
+            while len(self._pending) + len(self._inflight) + self._admitting >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['rejected'] += 1
+                    return None
+                self._cond.wait(remaining)
+            self._admitting += 1
+
+        # The id reservation and the journal write (and fsync) happen outside
+        # _cond, so flushes, sync() and the capacity check never wait for them
+        try:
+            row['id'] = self._allocate_id()
+            with self._journal_lock:
+                self._journal(row)
+                with self._cond:
+                    self._admitting -= 1
+                    self._pending.append(row)
+                    self._unwritten[row['id']] = key
+                    if key is not None:
+                        self._unwritten_keys[key] = self._unwritten_keys.get(key, 0) + 1
+                    self._stats['enqueued'] += 1
+                    if len(self._pending) >= self.batch_size:
+                        self._cond.notify_all()
+        except Exception:
+            with self._cond:
+                self._admitting -= 1
+                self._cond.notify_all()
+            raise
+        return row['id']
+
+    def _forget_written(self, batch):
+        for row in batch:
+            key = self._unwritten.pop(row['id'], None)
+            if key is not None:
+                if self._unwritten_keys[key] > 1:
+                    self._unwritten_keys[key] -= 1
+                else:
+                    del self._unwritten_keys[key]
+
+    def sync(self, key=None, message_id=None):
+        """Read-your-writes barrier for one chat (key) or one message
+
+        Waits until the rows the caller can see are committed by the flush
+        thread, without flushing anything itself, so other rows keep their
+        batch. Returns False if they are still unwritten after
+        enqueue_timeout seconds. Only covers rows queued by this process.
+        """
+        if not self.enabled:
+            return True
+        deadline = time.monotonic() + self.enqueue_timeout
+        with self._cond:
+            while self._unwritten_keys.get(key) or message_id in self._unwritten:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def flush(self):
+        """Persist every queued row now; returns how many rows were written"""
+        with self._flush_lock:
+            with self._journal_lock, self._cond:
+                batch, self._pending = self._pending, []
+                if not batch:
+                    return 0
+                self._inflight = batch
+                segment_path = self._segment_path
+                if self._segment is not None:
+                    self._segment.close()
+                self._segment = self._segment_path = None
+
+            started = time.perf_counter()
+            try:
+                try:
+                    written = self.persist(batch)
+                except (mysql.connector.IntegrityError, mysql.connector.DataError) as e:
+                    # A bad row (e.g. a deleted receiver) must not block the rows behind it
+                    print(f"❌ Message batch rejected ({e}), writing rows one by one")
+                    written = self._persist_individually(batch)
+            except Exception as e:
+                print(f"❌ Message batch failed, will retry: {e}")
+                with self._cond:
+                    self._pending = batch + self._pending
+                    self._inflight = []
+                    if segment_path:
+                        self._retained.append(segment_path)
+                    self._retry_delay = min(max(self._retry_delay * 2, self.flush_interval), 2.0)
+                    self._stats['failed_batches'] += 1
+                    self._cond.notify_all()
+                return 0
+
+            with self._cond:
+                for path in self._retained + [segment_path]:
+                    if path and os.path.exists(path):
+                        os.remove(path)
+                self._retained = []
+                self._inflight = []
+                self._forget_written(batch)
+                self._retry_delay = 0
+                self._stats['batches'] += 1
+                self._stats['rows_written'] += written
+                self._stats['last_batch_size'] = len(batch)
+                self._stats['last_batch_ms'] = round((time.perf_counter() - started) * 1000, 2)
+                self._cond.notify_all()
+            return written
+
+    def _persist_individually(self, batch):
+        written = 0
+        for row in batch:
+            try:
+                written += self.persist([row])
+            except (mysql.connector.IntegrityError, mysql.connector.DataError) as e:
+                print(f"❌ Dropping message {row['id']} to the dead-letter file: {e}")
+                with open(os.path.join(self.journal_dir, 'dead_letter.jsonl'), 'a') as dead_letter:
+                    dead_letter.write(json.dumps(row, default=str) + '\n')
+                self._stats['dead_lettered'] += 1
+        return written
+
+    def _run(self):
+        while True:
+            if self._retry_delay:
+                time.sleep(self._retry_delay)
+            with self._cond:
+                if not self._retry_delay and len(self._pending) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+            try:
+                self.flush()
+                self._reserve_ahead()
+            except Exception as e:
+                print(f"❌ Message write-behind error: {e}")
+
+    def close(self):
+        """Flush what is queued (called at interpreter exit)"""
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"❌ Final message flush failed, rows stay in the journal: {e}")
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                'enabled': self.enabled,
+                'pending': len(self._pending),
+                'inflight': len(self._inflight),
+                'retained_segments': len(self._retained),
+            }
@@ -1,7 +1,7 @@
 // frontend/src/components/chat/ChatList.js - ENHANCED LOGOUT HANDLING
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { User, Settings, LogOut, Search, MessageCircle, Moon, Sun, Wifi, WifiOff, Users, Plus } from 'lucide-react';
+import { User, Settings, LogOut, Search, MessageCircle, Moon, Sun, Wifi, WifiOff, Users, Plus, UserPlus } from 'lucide-react';
 import { useAuth } from '../../context/AuthContext';
 import { useTheme } from '../../context/ThemeContext';
 import { api } from '../../services/api';
@@ -16,6 +16,11 @@ const ChatList = () => {
   const [onlineUsers, setOnlineUsers] = useState(new Set());
   const [socketConnected, setSocketConnected] = useState(false);
   const [loggingOut, setLoggingOut] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [hasMore, setHasMore] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [people, setPeople] = useState([]);
+  const searchInputRef = useRef(null);
   const { user, logout } = useAuth();
   const { isDark, toggleTheme } = useTheme();
   const navigate = useNavigate();
@@ -46,33 +51,28 @@ const ChatList = () => {
       setSocketConnected(false);
     });
 
-    // Enhanced online status with immediate updates
-    socket.on('user_online', (data) => {
-      console.log('🟢 User came online:', data);
-      setOnlineUsers(prev => new Set([...prev, data.user_id]));
-      
-      // Update chat list to reflect online status immediately
-      setChats(prev => prev.map(chat => 
-        chat.user_id === data.user_id 
-          ? { ...chat, online: true, status: 'Online' }
-          : chat
-      ));
-    });
-    
-    socket.on('user_offline', (data) => {
-      console.log('🔴 User went offline:', data);
+    // Presence of the users in this chat list, delivered as batched diffs
+    socket.on('presence_diff', (data) => {
+      console.log('🟢 Presence update:', data);
+      const online = new Set(data.online);
+      const offline = new Set(data.offline);
       setOnlineUsers(prev => {
         const newSet = new Set(prev);
-        newSet.delete(data.user_id);
+        online.forEach(id => newSet.add(id));
+        offline.forEach(id => newSet.delete(id));
         return newSet;
       });
       
-      // Update chat list to reflect offline status immediately
-      setChats(prev => prev.map(chat => 
-        chat.user_id === data.user_id 
-          ? { ...chat, online: false, status: 'Offline' }
-          : chat
-      ));
+      // Update chat list to reflect online status immediately
+      setChats(prev => prev.map(chat => {
+        if (online.has(chat.user_id)) {
+          return { ...chat, online: true, status: 'Online' };
+        }
+        if (offline.has(chat.user_id)) {
+          return { ...chat, online: false, status: 'Offline' };
+        }
+        return chat;
+      }));
     });
 
     // Enhanced new message notifications for ChatList
@@ -138,8 +138,7 @@ const ChatList = () => {
     return () => {
       socket.off('connect');
       socket.off('disconnect');
-      socket.off('user_online');
-      socket.off('user_offline');
+      socket.off('presence_diff');
       socket.off('new_message_notification');
       socket.off('receive_message');
     };
@@ -176,11 +175,13 @@ const ChatList = () => {
     try {
       const response = await api.getChats(user.id);
       if (response.success) {
-        setChats(response.data.chats || response.data);
+        setChats(response.data.chats);
         setCurrentUser(response.data.current_user || user);
+        setNextCursor(response.data.next_cursor);
+        setHasMore(response.data.has_more);
         
         const online = new Set(
-          (response.data.chats || response.data)
+          response.data.chats
             .filter(chat => chat.type === 'direct' && chat.online)
             .map(chat => chat.user_id)
         );
@@ -193,12 +194,78 @@ const ChatList = () => {
     }
   };
 
+  // The chat list is paginated by cursor; fetch the next page on scroll
+  const loadMoreChats = async () => {
+    if (!user || !hasMore || loadingMore) return;
+    
+    setLoadingMore(true);
+    try {
+      const response = await api.getChats(user.id, nextCursor);
+      if (response.success) {
+        setChats(prev => {
+          const known = new Set(prev.map(chat => chat.id));
+          return [...prev, ...response.data.chats.filter(chat => !known.has(chat.id))];
+        });
+        setNextCursor(response.data.next_cursor);
+        setHasMore(response.data.has_more);
+        setOnlineUsers(prev => {
+          const newSet = new Set(prev);
+          response.data.chats
+            .filter(chat => chat.type === 'direct' && chat.online)
+            .forEach(chat => newSet.add(chat.user_id));
+          return newSet;
+        });
+      }
+    } catch (error) {
+      console.error('Failed to load more chats:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const handleScroll = (e) => {
+    const { scrollTop, scrollHeight, clientHeight } = e.target;
+    if (scrollHeight - scrollTop - clientHeight < 200) {
+      loadMoreChats();
+    }
+  };
+
+  // People to start a new chat with, from the user directory
+  useEffect(() => {
+    const term = searchTerm.trim();
+    if (!user || !term) {
+      setPeople([]);
+      return;
+    }
+    
+    const timer = setTimeout(async () => {
+      try {
+        const response = await api.searchUsers(term, user.id);
+        if (response.success) {
+          setPeople(response.data);
+        }
+      } catch (error) {
+        console.error('Failed to search users:', error);
+      }
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm, user]);
+
   const filteredChats = chats.filter(chat => 
     chat.user.toLowerCase().includes(searchTerm.toLowerCase()) ||
     (chat.username && chat.username.toLowerCase().includes(searchTerm.toLowerCase())) ||
     (chat.description && chat.description.toLowerCase().includes(searchTerm.toLowerCase()))
   );
 
+  const directChatUserIds = new Set(
+    chats.filter(chat => chat.type === 'direct').map(chat => chat.user_id)
+  );
+  const newPeople = people.filter(person => !directChatUserIds.has(person.id));
+
+  const startChat = (person) => {
+    navigate(`/chat/${user.id}_${person.id}`);
+  };
+
   const openChat = (chat) => {
     // Reset unread count when opening chat
     setChats(prev => prev.map(c => 
@@ -410,6 +477,14 @@ const ChatList = () => {
             </div>
           </div>
           <div className="flex items-center space-x-2">
+            <button 
+              onClick={() => searchInputRef.current && searchInputRef.current.focus()}
+              className="p-2 text-gray-600 dark:text-gray-400 hover:bg-gray-100 dark:hover:bg-gray-700 rounded-lg transition"
+              title="New Chat"
+              disabled={loggingOut}
+            >
+              <UserPlus size={20} />
+            </button>
             <button 
               onClick={() => setShowGroupModal(true)}
               className="p-2 text-gray-600 dark:text-gray-400 hover:bg-gray-100 dark:hover:bg-gray-700 rounded-lg transition"
@@ -453,8 +528,9 @@ const ChatList = () => {
         <div className="relative">
           <Search className="absolute left-3 top-1/2 transform -translate-y-1/2 text-gray-400" size={20} />
           <input
+            ref={searchInputRef}
             type="text"
-            placeholder="Search conversations..."
+            placeholder="Search conversations or people..."
             value={searchTerm}
             onChange={(e) => setSearchTerm(e.target.value)}
             className="w-full pl-10 pr-4 py-2 border border-gray-300 dark:border-gray-600 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent bg-white dark:bg-gray-700 text-gray-900 dark:text-gray-100"
@@ -464,14 +540,15 @@ const ChatList = () => {
       </div>
 
       {/* Chat List */}
-      <div className="flex-1 overflow-y-auto">
-        {filteredChats.length === 0 ? (
+      <div className="flex-1 overflow-y-auto" onScroll={handleScroll}>
+        {filteredChats.length === 0 && newPeople.length === 0 ? (
           <div className="flex flex-col items-center justify-center h-full text-gray-500 dark:text-gray-400">
             <MessageCircle size={48} className="mb-4" />
-            <p className="text-lg font-medium">No conversations yet</p>
-            <p className="text-sm">Start a new chat or create a group</p>
+            <p className="text-lg font-medium">{searchTerm ? 'No matches' : 'No conversations yet'}</p>
+            <p className="text-sm">Search for people above to start a chat, or create a group</p>
           </div>
         ) : (
+          <>
           <div className="divide-y divide-gray-200 dark:divide-gray-700">
             {filteredChats.map((chat) => (
               <div
@@ -536,6 +613,40 @@ const ChatList = () => {
               </div>
             ))}
           </div>
+
+          {newPeople.length > 0 && (
+            <div>
+              <p className="px-6 pt-4 pb-2 text-xs font-semibold uppercase text-gray-500 dark:text-gray-400">
+                People
+              </p>
+              <div className="divide-y divide-gray-200 dark:divide-gray-700">
+                {newPeople.map((person) => (
+                  <div
+                    key={`person_${person.id}`}
+                    onClick={() => !loggingOut && startChat(person)}
+                    className="px-6 py-4 hover:bg-gray-50 dark:hover:bg-gray-800 cursor-pointer transition"
+                  >
+                    <div className="flex items-center space-x-3">
+                      {getAvatar({ type: 'direct', user: person.name, profile_picture: person.profile_picture })}
+                      <div className="flex-1 min-w-0">
+                        <h3 className="text-sm font-semibold text-gray-900 dark:text-gray-100 truncate">
+                          {person.name}
+                        </h3>
+                        <p className="text-sm text-gray-600 dark:text-gray-400 truncate">@{person.username}</p>
+                      </div>
+                    </div>
+                  </div>
+                ))}
+              </div>
+            </div>
+          )}
+
+          {loadingMore && (
+            <div className="py-4 flex justify-center">
+              <div className="animate-spin rounded-full h-6 w-6 border-b-2 border-blue-600"></div>
+            </div>
+          )}
+          </>
         )}
       </div>
 
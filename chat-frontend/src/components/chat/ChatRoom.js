@@ -81,8 +81,7 @@ const ChatRoom = () => {
         socketRef.current.off('message_delivered');
         socketRef.current.off('messages_read');
         socketRef.current.off('user_typing');
-        socketRef.current.off('user_online');
-        socketRef.current.off('user_offline');
+        socketRef.current.off('presence_diff');
         socketRef.current.off('room_joined');
         socketRef.current.off('connection_confirmed');
         socketRef.current.off('heartbeat_ack');
@@ -322,18 +321,14 @@ const ChatRoom = () => {
       }
     });
 
-    // ✅ ENHANCED: Handle online status changes with immediate updates
-    socketRef.current.on('user_online', (data) => {
-      console.log('🟢 User online:', data);
-      if (!isGroupChat && currentChat?.user_id === data.user_id) {
+    // ✅ ENHANCED: Presence of the chat partner arrives as batched diffs
+    socketRef.current.on('presence_diff', (data) => {
+      console.log('🟢 Presence update:', data);
+      if (isGroupChat || !currentChat) return;
+      if (data.online.includes(currentChat.user_id)) {
         setOnlineStatus(true);
         setCurrentChat(prev => prev ? { ...prev, online: true } : prev);
-      }
-    });
-
-    socketRef.current.on('user_offline', (data) => {
-      console.log('🔴 User offline:', data);
-      if (!isGroupChat && currentChat?.user_id === data.user_id) {
+      } else if (data.offline.includes(currentChat.user_id)) {
         setOnlineStatus(false);
         setCurrentChat(prev => prev ? { ...prev, online: false } : prev);
       }
@@ -85,9 +85,10 @@ export const api = {
     }
   },
 
-  getChats: async (userId) => {
+  getChats: async (userId, cursor = null) => {
     try {
-      const response = await fetch(`${API_BASE}/user/chats/${userId}`);
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`${API_BASE}/user/chats/${userId}${query}`);
       const data = await response.json();
       if (!response.ok) throw new Error(data.message || 'Failed to get chats');
       return data;
@@ -97,6 +98,18 @@ export const api = {
     }
   },
 
+  searchUsers: async (searchTerm, userId) => {
+    try {
+      const response = await fetch(`${API_BASE}/user/search?search=${encodeURIComponent(searchTerm)}&user_id=${userId}`);
+      const data = await response.json();
+      if (!response.ok) throw new Error(data.message || 'Failed to search users');
+      return data;
+    } catch (error) {
+      console.error('API: Search users error:', error);
+      throw error;
+    }
+  },
+
   // Chat endpoints
   getMessages: async (chatId) => {
     try {
@@ -2,6 +2,7 @@
 import { io } from 'socket.io-client';
 
 let socket = null;
+let admissionRetry = null; // pending reconnect after the server refused a connect
 
 export const initSocket = () => {
   if (!socket || socket.disconnected) {
@@ -11,7 +12,8 @@ export const initSocket = () => {
       reconnection: true,
       reconnectionAttempts: 10,
       reconnectionDelay: 1000,
-      reconnectionDelayMax: 5000,
+      reconnectionDelayMax: 30000,
+      randomizationFactor: 0.5, // spread reconnects after a server restart
       timeout: 20000,
       forceNew: false,
       upgrade: true,
@@ -32,6 +34,17 @@ export const initSocket = () => {
 
     socket.on('connect_error', (error) => {
       console.error('❌ Socket connection error:', error);
+      // A connect refused during a reconnect storm is not retried automatically;
+      // come back after the server's jittered hint
+      const retryAfter = error?.data?.retry_after;
+      if (retryAfter && !admissionRetry) {
+        admissionRetry = setTimeout(() => {
+          admissionRetry = null;
+          if (socket && !socket.connected) {
+            socket.connect();
+          }
+        }, retryAfter * 1000);
+      }
     });
 
     socket.on('reconnect', (attemptNumber) => {
@@ -80,6 +93,8 @@ export const disconnectSocket = () => {
     
     // Remove all listeners to prevent memory leaks
     socket.removeAllListeners();
+    clearTimeout(admissionRetry);
+    admissionRetry = null;
     
     // Disconnect the socket
     socket.disconnect();